@@ -4,16 +4,53 @@ Provides API endpoints for administrative operations.
 Routes:
 - GET /admin/users: Retrieves a list of all users. Requires admin authorization.
 - POST /admin/users/<user_id>/<action>: Activates or deactivates a user account. `action` must be 'activate' or 'deactivate'. Requires admin authorization.
+- GET /admin/judge-cache: Retrieves the judge result cache size and hit rate. Requires admin authorization.
+- POST /admin/problems/<problem_id>/rejudge: Re-judges all, or the passed or failed, submissions of a problem in bulk, only running the new or modified cases unless full is set. Requires admin authorization.
+- GET /admin/rejudge/<job_id>: Retrieves the progress of a re-judge. Requires admin authorization.
+- GET /admin/docker-metrics: Retrieves the time spent in each Docker API call of the judge. Requires admin authorization.
+- POST /admin/calibrate: Calibrates the time limits of all, or some, problems on their reference solution. Requires admin authorization.
+- GET /admin/calibrate: Retrieves the progress and the limits of the calibrations. Requires admin authorization.
 """
 
-from flask_restx import Namespace, Resource
-from flask import request, abort
+from flask_restx import Namespace, Resource, fields
+from flask import request, abort, current_app
 from config import db
 from tables import *
 from apis.header import auth_parser
+from apis.judge_cache import cache_stats
+from apis.docker_client import get_docker
+from apis.rejudge import select_submissions, start_rejudge, get_job
+from apis.calibration import start_calibration, get_calibrations
 
 api = Namespace("admin", description="Admin operations")
 
+# which submissions of the problem to re-judge
+rejudge_model = api.model(
+    "Rejudge",
+    {
+        "result": fields.String(
+            required=False, description="all (default), passed or failed"
+        ),
+        "user_id": fields.Integer(
+            required=False, description="Only the submissions of this user"
+        ),
+        "full": fields.Boolean(
+            required=False,
+            description="Run every case again, not only the new or modified ones",
+        ),
+    },
+)
+
+# the problems to calibrate, all of them by default
+calibrate_model = api.model(
+    "Calibrate",
+    {
+        "problem_ids": fields.List(
+            fields.Integer, required=False, description="Only these problems"
+        ),
+    },
+)
+
 
 # admin get all users into a list
 @api.route("/users")
@@ -65,3 +102,137 @@ class ActivateResource(Resource):
         user.is_activate = action == "activate"
         db.session.commit()
         return {}, 200
+
+
+# admin can check how often the judge result cache is used
+@api.route("/judge-cache")
+class JudgeCacheResource(Resource):
+    @api.expect(auth_parser)
+    @api.response(200, "Success")
+    @api.response(403, "Unauthorized")
+    def get(self):
+        """Get the judge cache entries, hits, misses and hit rate, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        return cache_stats(), 200
+
+
+# admin can check the time the judge spends in the Docker daemon
+@api.route("/docker-metrics")
+class DockerMetricsResource(Resource):
+    @api.expect(auth_parser)
+    @api.response(200, "Success")
+    @api.response(403, "Unauthorized")
+    def get(self):
+        """Get the count, errors and time of each Docker API call, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        return get_docker(current_app.config).stats(), 200
+
+
+# admin re-judges the submissions of a problem, e.g. after the testcase.py changed
+@api.route("/problems/<int:problem_id>/rejudge")
+class RejudgeResource(Resource):
+    @api.expect(auth_parser, rejudge_model)
+    @api.response(202, "Re-judge started")
+    @api.response(403, "Unauthorized")
+    @api.response(404, "Problem not found")
+    @api.response(400, "Bad request")
+    def post(self, problem_id):
+        """Re-judge the submissions of a problem in bulk, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        if Problem.query.get(problem_id) is None:
+            abort(404, "Problem not found")
+
+        data = request.get_json(silent=True) or {}
+        result = data.get("result") or "all"
+        if result not in ["all", "passed", "failed"]:
+            abort(400, "result must be all, passed or failed")
+
+        submission_ids = select_submissions(problem_id, result, data.get("user_id"))
+        job = start_rejudge(
+            current_app.extensions["judge_queue"],
+            problem_id,
+            submission_ids,
+            incremental=not data.get("full", False),
+        )
+
+        # poll GET /admin/rejudge/<job_id> for the progress
+        return job.to_dict(), 202
+
+
+@api.route("/rejudge/<string:job_id>")
+class RejudgeProgressResource(Resource):
+    @api.expect(auth_parser)
+    @api.response(200, "Success")
+    @api.response(403, "Unauthorized")
+    @api.response(404, "Re-judge not found")
+    def get(self, job_id):
+        """Get the progress of a re-judge, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        job = get_job(job_id)
+        if job is None:
+            abort(404, "Re-judge not found")
+
+        return job.to_dict(), 200
+
+
+# admin calibrates the time limits of the problems on their solution.py
+@api.route("/calibrate")
+class CalibrateResource(Resource):
+    @api.expect(auth_parser, calibrate_model)
+    @api.response(202, "Calibration started")
+    @api.response(403, "Unauthorized")
+    @api.response(404, "Problem not found")
+    def post(self):
+        """Calibrate the time limits of the problems, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        data = request.get_json(silent=True) or {}
+        problem_ids = data.get("problem_ids")
+        if problem_ids is None:
+            problem_ids = [p.problem_id for p in Problem.query.all()]
+        elif Problem.query.filter(Problem.problem_id.in_(problem_ids)).count() != len(
+            set(problem_ids)
+        ):
+            abort(404, "Problem not found")
+
+        statuses = start_calibration(current_app.extensions["judge_queue"], problem_ids)
+
+        # poll GET /admin/calibrate for the progress
+        return statuses, 202
+
+    @api.expect(auth_parser)
+    @api.response(200, "Success")
+    @api.response(403, "Unauthorized")
+    def get(self):
+        """Get the progress and the limits of the calibrations, only admin can access"""
+
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if not user or user.role != UserEnum.admin:
+            abort(403, "Unauthorized")
+
+        return get_calibrations(), 200
@@ -50,16 +50,19 @@ class SubmissionCountAndAICountInTimeRange(Resource):
             while current_time < end_date:
                 next_time = current_time + timedelta(hours=2)
 
+                # the judged submissions only, a pending or cancelled one has no verdict
                 pass_count = Submission.query.filter(
                     Submission.created_at >= current_time,
                     Submission.created_at < next_time,
                     Submission.is_pass == True,
+                    Submission.status == SubmissionStatusEnum.finished,
                 ).count()
 
                 fail_count = Submission.query.filter(
                     Submission.created_at >= current_time,
                     Submission.created_at < next_time,
                     Submission.is_pass == False,
+                    Submission.status == SubmissionStatusEnum.finished,
                 ).count()
 
                 total_count = pass_count + fail_count
@@ -117,7 +120,8 @@ class SubmissionCountAndAICountInTimeRange(Resource):
         else:
             abort(400, "Invalid timeframe")
 
-        # for each day in the range, get the submission count
+        # for each day in the range, get the submission count,
+        # of the judged submissions only: a pending or cancelled one has no verdict
         results = []
         current_date = start_date
 
@@ -128,12 +132,14 @@ class SubmissionCountAndAICountInTimeRange(Resource):
                 Submission.created_at >= current_date,
                 Submission.created_at < next_date,
                 Submission.is_pass == True,
+                Submission.status == SubmissionStatusEnum.finished,
             ).count()
 
             fail_count = Submission.query.filter(
                 Submission.created_at >= current_date,
                 Submission.created_at < next_date,
                 Submission.is_pass == False,
+                Submission.status == SubmissionStatusEnum.finished,
             ).count()
 
             total_count = pass_count + fail_count
@@ -186,9 +192,11 @@ class ExecutionSummary(Resource):
         if not problem:
             abort(404, "Problem not found")
 
-        # get correct submissions with valid timing and memory
+        # get correct submissions with valid timing and memory, in the current units
         submissions = (
-            Submission.query.filter_by(problem_id=problem_id, is_pass=True)
+            Submission.query.filter_by(
+                problem_id=problem_id, is_pass=True, metrics_version=METRICS_VERSION
+            )
             .filter(Submission.real_time.isnot(None), Submission.ram.isnot(None))
             .all()
         )
@@ -0,0 +1,157 @@
+"""
+Calibrates the time limits of a problem on its reference solution (solution.py).
+
+- The reference runs CALIBRATION_RUNS times in one sandbox (run_batch in
+  judge/run.py), on a judge slot like the submissions, with the policy "all" and
+  without the calibrated limits, so every case is timed.
+- The reference time of a case is the fastest of the runs, the least noisy one.
+- The limit of a case is CALIBRATION_FACTOR x reference + CALIBRATION_FLOOR seconds,
+  never above the timeout of the problem.
+- The reference times and the limits are stored in the judge.json of the problem by
+  the hash of each case, the runner enforces the limits instead of the timeout. A
+  case added or changed since the calibration runs under the timeout.
+- The progress of the calibrations is kept in memory, see GET /admin/calibrate.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+
+from flask import current_app
+
+from tables import *
+from apis.sandbox import get_executor, testcase_path
+from apis.judge_cache import invalidate
+
+calibrations = {}
+calibrations_lock = threading.Lock()
+
+
+def derive_limits(reference, timeout, factor=4, floor=0.2):
+    """The limit of each case from its reference time, in seconds"""
+
+    return [round(min(timeout, factor * seconds + floor), 3) for seconds in reference]
+
+
+def judge_settings_path(problem):
+    return os.path.join(os.path.dirname(testcase_path(problem)), "judge.json")
+
+
+def calibrate_problem(problem, slot=None):
+    """Time the reference solution of the problem and store its limits in the
+    judge.json, return the settings, raise ValueError if the reference does not pass.
+    The cached results of the problem are removed, the caller commits."""
+
+    config = current_app.config
+    folder = os.path.dirname(testcase_path(problem))
+
+    with open(os.path.join(folder, "solution.py"), "r") as f:
+        solution = f.read()
+
+    settings = {}
+    settings_url = judge_settings_path(problem)
+    if os.path.exists(settings_url):
+        with open(settings_url, "r") as f:
+            settings = json.load(f)
+
+    # time every case one after another, under the timeout only
+    run_settings = {
+        key: value
+        for key, value in settings.items()
+        if key not in ["limits", "reference", "budget", "policy", "parallel"]
+    }
+
+    runs = config.get("CALIBRATION_RUNS", 3)
+    is_success, reports = get_executor(config).judge_batch(
+        {f"run{i}": solution for i in range(runs)},
+        testcase_path(problem),
+        slot.cpus if slot else None,
+        slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g"),
+        run_settings,
+    )
+    if not is_success:
+        raise ValueError(reports)
+
+    timings, hashes = [], []
+    for report in reports.values():
+        cases = report["cases"]
+        if not cases or any(case["status"] != "passed" for case in cases):
+            raise ValueError(
+                f"The reference solution does not pass: {report['results']}"
+            )
+        timings.append([case["time"] for case in cases])
+        hashes = [case["hash"] for case in cases]
+
+    reference = [round(min(times), 6) for times in zip(*timings)]
+    limits = derive_limits(
+        reference,
+        settings.get("timeout", 5),
+        config.get("CALIBRATION_FACTOR", 4),
+        config.get("CALIBRATION_FLOOR", 0.2),
+    )
+    # by the hash of each case, so a changed or moved case never gets the limit
+    # of another one when testcase.py is replaced
+    settings["reference"] = dict(zip(hashes, reference))
+    settings["limits"] = dict(zip(hashes, limits))
+
+    # a judge running meanwhile reads the old or the new file, never half of one
+    fd, temporary = tempfile.mkstemp(dir=folder, suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(settings, f, indent=4)
+        os.replace(temporary, settings_url)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+    # the cached results were judged under the old limits
+    invalidate(problem.problem_id)
+    return settings
+
+
+def set_status(problem_id, **status):
+    with calibrations_lock:
+        calibrations[problem_id] = {"problem_id": problem_id, **status}
+
+
+def get_calibrations():
+    with calibrations_lock:
+        return [calibrations[key] for key in sorted(calibrations)]
+
+
+def start_calibration(judge_queue, problem_ids):
+    """Queue the calibration of the problems, one task per problem"""
+
+    for problem_id in problem_ids:
+        set_status(problem_id, status="queued")
+        judge_queue.submit_task(partial(calibrate_task, problem_id))
+
+    with calibrations_lock:
+        return [calibrations[problem_id] for problem_id in problem_ids]
+
+
+def calibrate_task(problem_id, slot=None):
+    """Calibrate a problem on a judge slot and record the outcome, inside an app context"""
+
+    set_status(problem_id, status="running")
+    start = time.time()
+
+    try:
+        settings = calibrate_problem(Problem.query.get(problem_id), slot)
+        # the removed cache entries, the session is dropped after the task
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        set_status(problem_id, status="error", error=str(e))
+        return
+
+    set_status(
+        problem_id,
+        status="finished",
+        reference=settings["reference"],
+        limits=settings["limits"],
+        elapsed=round(time.time() - start, 2),
+    )
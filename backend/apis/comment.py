@@ -11,6 +11,7 @@ Routes:
 
 from flask_restx import Namespace, Resource, fields
 from flask import request, abort
+from sqlalchemy.orm import joinedload, selectinload
 from config import db
 from tables import Comment, Problem, User
 from apis.header import auth_parser
@@ -71,12 +72,16 @@ class AddComment(Resource):
         if not problem:
             abort(404, "Problem not found")
 
-        # get comments, each comment also attach the user object
-        comments = Comment.query.filter_by(problem_id=problem_id).all()
+        # get comments, each comment also attach the user object,
+        # joined in the same query
+        comments = (
+            Comment.query.filter_by(problem_id=problem_id)
+            .options(joinedload(Comment.user))
+            .all()
+        )
         results = []
         for comment in comments:
-            user = User.query.get(comment.user_id)
-            user_dict = user.to_dict()
+            user_dict = comment.user.to_dict()
             comment_dict = comment.to_dict()
 
             result = {
@@ -158,14 +163,17 @@ class GetUserComments(Resource):
         if not user:
             abort(404, "User not found")
 
-        # get comments
-        comments = Comment.query.filter_by(user_id=user_id).all()
+        # get comments, with their problems in one more query
+        comments = (
+            Comment.query.filter_by(user_id=user_id)
+            .options(selectinload(Comment.problem))
+            .all()
+        )
 
-        # for each comment, add the user object
+        # for each comment, add the problem object
         results = []
         for comment in comments:
-            problem = Problem.query.get(comment.problem_id)
-            problem_dict = problem.to_dict()
+            problem_dict = comment.problem.to_dict()
             comment_dict = comment.to_dict()
 
             result = {
@@ -0,0 +1,152 @@
+"""
+Estimates the time and space complexity of the passed submissions, next to the
+reference solution of the problem.
+
+- Only for the problems whose testcase.py declares generators: the runner times the
+  submission and solution.py on the first generator at the growing input sizes of
+  the "ladder" (run_analysis in judge/run.py), within ANALYSIS_BUDGET seconds.
+- The growth is the median slope of log(value) over log(n), each class of CLASSES
+  covers a range of slopes. It is an estimate: on the small sizes of the ladder,
+  O(n) and O(n log n) are hard to tell apart.
+- The analysis runs in the background, on an idle judge slot only, after the verdict
+  is stored, see JudgeQueue.submit_background. It never delays a verdict, and is
+  dropped when ANALYSIS_QUEUE_SIZE analyses are waiting already.
+- The estimate is stored in Submission.complexity.
+"""
+
+import math
+from functools import partial
+
+from flask import current_app
+
+from config import db
+from tables import *
+from apis.sandbox import declares_generators, get_executor, testcase_path
+
+# the class of a growth slope (log value over log n) below each bound. The bounds
+# sit above the slope of each class: on CPython the caches add 0.1 to 0.2 to the
+# slope of a linear loop on these sizes, so n and n log n are hard to tell apart
+CLASSES = [
+    ("O(1)", 0.15),
+    ("O(log n)", 0.5),
+    ("O(n)", 1.3),
+    ("O(n log n)", 1.6),
+    ("O(n^2)", 2.4),
+    ("O(n^3)", math.inf),
+]
+
+# fewer points can not tell the classes apart
+MIN_POINTS = 3
+
+# below these, the growth is measurement noise: seconds, bytes (tracemalloc)
+NOISE = {"time": 0.0005, "memory": 4096}
+
+
+def growth_slope(sizes, values):
+    """Median slope of log(value) over log(n) between every two sizes (Theil-Sen),
+    one noisy measurement barely moves it"""
+
+    slopes = sorted(
+        math.log(values[j] / values[i]) / math.log(sizes[j] / sizes[i])
+        for i in range(len(sizes))
+        for j in range(i + 1, len(sizes))
+    )
+    middle = len(slopes) // 2
+    if len(slopes) % 2:
+        return slopes[middle]
+    return (slopes[middle - 1] + slopes[middle]) / 2
+
+
+def fit_class(sizes, values, noise=0.0):
+    """The complexity class of the values measured at the sizes, None if unknown.
+    The class is the one whose growth over the sizes is the closest to the measured one.
+    """
+
+    if len(sizes) < MIN_POINTS:
+        return None
+
+    if max(values) - min(values) <= noise:
+        return "O(1)"
+
+    # the small sizes below the noise only say the value is small
+    points = [(n, value) for n, value in zip(sizes, values) if value > noise]
+    if len(points) < MIN_POINTS:
+        return None
+    sizes, values = [n for n, _ in points], [value for _, value in points]
+
+    slope = growth_slope(sizes, values)
+    for name, bound in CLASSES:
+        if slope < bound:
+            return name
+
+
+def estimate(points):
+    """The classes of the submission and of the reference from the analysis points"""
+
+    sizes = [point["n"] for point in points]
+    result = {"points": points}
+
+    for prefix in ["", "reference_"]:
+        result[prefix + "time"] = fit_class(
+            sizes, [point[prefix + "time"] for point in points], NOISE["time"]
+        )
+        result[prefix + "space"] = fit_class(
+            sizes, [point[prefix + "memory"] for point in points], NOISE["memory"]
+        )
+
+    return result
+
+
+def queue_analysis(submission, problem):
+    """Analyse a passed submission in the background, the caller commits.
+    The same code analysed before for the problem is not analysed again."""
+
+    config = current_app.config
+    if not config.get("COMPLEXITY_ANALYSIS") or not submission.is_pass:
+        return
+
+    with open(testcase_path(problem), "r") as f:
+        if not declares_generators(f.read()):
+            return
+
+    analysed = (
+        Submission.query.filter(
+            Submission.problem_id == problem.problem_id,
+            Submission.code == submission.code,
+            Submission.complexity.isnot(None),
+        )
+        .order_by(Submission.submission_id.desc())
+        .first()
+    )
+    if analysed is not None:
+        submission.complexity = analysed.complexity
+        return
+
+    current_app.extensions["judge_queue"].submit_background(
+        partial(analyse_submission, submission.submission_id)
+    )
+
+
+def analyse_submission(submission_id, slot=None):
+    """Run the analysis of a submission and store the estimate, inside an app context"""
+
+    config = current_app.config
+    submission = Submission.query.get(submission_id)
+    problem = Problem.query.get(submission.problem_id)
+
+    try:
+        is_success, points = get_executor(config).analyse(
+            submission.code,
+            testcase_path(problem),
+            slot.cpus if slot else None,
+            slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g"),
+            config.get("ANALYSIS_BUDGET", 10),
+        )
+    except Exception as e:
+        is_success, points = False, str(e)
+
+    if is_success:
+        submission.complexity = estimate(points)
+    else:
+        submission.complexity = {"error": points}
+    db.session.commit()
@@ -0,0 +1,147 @@
+"""
+Process-wide client of the Docker daemon, shared by the judge.
+
+- One docker.DockerClient for the whole process: the HTTP session over the unix
+  socket keeps its connections alive (up to DOCKER_MAX_POOL_SIZE of them, one per
+  judge thread), and the API version is negotiated once, not per submission.
+- The daemon is pinged when the client was idle for DOCKER_HEALTH_INTERVAL seconds,
+  a client that lost its connection is replaced on the next call.
+- Every Docker API call of the judge is timed by name (create, start, wait, logs,
+  remove...), see GET /admin/docker-metrics.
+"""
+
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import docker
+import requests
+
+
+class DockerMetrics:
+    """Number, errors and seconds of the Docker API calls, by name"""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, failed=False):
+        with self.lock:
+            stats = self.calls.setdefault(
+                name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0}
+            )
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                name: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "total": round(stats["total"], 4),
+                    "mean": round(stats["total"] / stats["count"], 4),
+                    "max": round(stats["max"], 4),
+                }
+                for name, stats in sorted(self.calls.items())
+            }
+
+
+class DockerClientManager:
+    def __init__(self, max_pool_size=10, health_interval=30, version="auto"):
+        self.max_pool_size = max_pool_size
+        self.health_interval = health_interval
+        self.version = version
+        self.metrics = DockerMetrics()
+        self.connections = 0
+        self.last_check = 0.0
+        self._client = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.call("connect"):
+            client = docker.from_env(
+                version=self.version, max_pool_size=self.max_pool_size
+            )
+        self._client = client
+        self.connections += 1
+        self.last_check = time.monotonic()
+
+    def client(self):
+        """The shared client, connected again if the daemon stopped answering"""
+
+        with self.lock:
+            if self._client is None:
+                self.connect()
+            elif time.monotonic() - self.last_check > self.health_interval:
+                try:
+                    with self.call("ping"):
+                        self._client.ping()
+                    self.last_check = time.monotonic()
+                except Exception:
+                    self.reset_locked()
+                    self.connect()
+
+            return self._client
+
+    def reset_locked(self):
+        try:
+            self._client.close()
+        except Exception:
+            pass
+        self._client = None
+
+    @contextmanager
+    def call(self, name):
+        """Time a Docker API call, a lost connection is replaced on the next call"""
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except requests.exceptions.ConnectionError:
+            failed = True
+            # an API error (e.g. 404) keeps the connection, a broken socket does
+            # not: ping the daemon on the next call
+            self.last_check = 0.0
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.record(name, time.perf_counter() - start, failed)
+
+    def stats(self):
+        return {
+            "connected": self._client is not None,
+            "reconnects": max(0, self.connections - 1),
+            "calls": self.metrics.to_dict(),
+        }
+
+    def close(self):
+        with self.lock:
+            if self._client is not None:
+                self.reset_locked()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_docker(config=None):
+    """The process-wide client manager, created on first use"""
+
+    global _manager
+    config = config or {}
+    with _manager_lock:
+        if _manager is None:
+            _manager = DockerClientManager(
+                max_pool_size=config.get("DOCKER_MAX_POOL_SIZE", 10),
+                health_interval=config.get("DOCKER_HEALTH_INTERVAL", 30),
+                version=config.get("DOCKER_API_VERSION", "auto"),
+            )
+            atexit.register(_manager.close)
+    return _manager
@@ -0,0 +1,138 @@
+"""
+Caches the judge results, so the same code submitted again for a problem is not
+run in the sandbox again.
+
+- The key is a hash of what the result depends on: the problem files sent to the
+  sandbox (testcase.py, judge.json, solution.py for the generated cases) with the runner, and the code without its
+  comments and formatting (ast.dump of the parsed code).
+- Only finished results are cached, never a sandbox error, nor a result with a
+  case that timed out, raised or crashed: it may pass on a less loaded host.
+- A hit is a verdict, its time and memory are those of another run: a passed hit
+  is not ranked until it is measured again in the background, see
+  measure_submission in apis/judge_queue.py.
+- The entries of a problem are removed when its testcase.py, judge.json or
+  solution.py is replaced.
+- The hits and misses since the backend started are reported by GET /admin/judge-cache.
+"""
+
+import ast
+import hashlib
+import threading
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from tables import *
+from apis.sandbox import problem_files, run_script, testcase_path
+
+# the case statuses of the results that are not cached
+UNCACHED = ["timeout", "error", "crashed"]
+
+counters = {"hits": 0, "misses": 0}
+counters_lock = threading.Lock()
+
+
+def count(name):
+    with counters_lock:
+        counters[name] += 1
+
+
+def code_hash(code):
+    """Hash of the code, the same for code that only differs in comments or formatting"""
+
+    try:
+        # line numbers are not part of the dump
+        normalized = ast.dump(ast.parse(code))
+    except SyntaxError:
+        normalized = code
+
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def testcase_hash(problem):
+    """Hash of the problem files and the runner, the judge result depends on them"""
+
+    digest = hashlib.sha256(run_script.encode("utf-8"))
+    for name, content in sorted(problem_files(testcase_path(problem)).items()):
+        digest.update(f"\0{name}\0{content}".encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def cache_key(problem, code):
+    return testcase_hash(problem), code_hash(code)
+
+
+def apply_cached_result(submission, problem):
+    """Fill the submission with the cached result, return False on a miss"""
+
+    testcase_key, code_key = cache_key(problem, submission.code)
+    entry = JudgeCache.query.filter_by(
+        testcase_hash=testcase_key, code_hash=code_key
+    ).first()
+
+    if entry is None:
+        count("misses")
+        return False
+
+    count("hits")
+    entry.hits += 1
+
+    submission.results = entry.results
+    submission.case_results = entry.case_results
+    submission.is_pass = entry.is_pass
+    submission.real_time = entry.real_time
+    submission.ram = entry.ram
+    # the numbers of the run cached, the key holds the runner so they are in the
+    # current units, but only the numbers of its own run rank a passed submission
+    submission.metrics_version = None if entry.is_pass else METRICS_VERSION
+    submission.status = SubmissionStatusEnum.finished
+    return True
+
+
+def store_result(key, submission):
+    """Cache the result of a finished submission, key is from cache_key before the run"""
+
+    if any(case.get("status") in UNCACHED for case in submission.case_results or []):
+        return
+
+    testcase_key, code_key = key
+    entry = JudgeCache(
+        problem_id=submission.problem_id,
+        testcase_hash=testcase_key,
+        code_hash=code_key,
+        results=submission.results,
+        case_results=submission.case_results,
+        is_pass=submission.is_pass,
+        real_time=submission.real_time,
+        ram=submission.ram,
+    )
+
+    # another worker may have judged the same code at the same time
+    try:
+        db.session.add(entry)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+def invalidate(problem_id):
+    """Remove the entries of a problem, when its test cases change"""
+
+    JudgeCache.query.filter_by(problem_id=problem_id).delete()
+
+
+def cache_stats():
+    with counters_lock:
+        hits, misses = counters["hits"], counters["misses"]
+
+    lookups = hits + misses
+    return {
+        "entries": JudgeCache.query.count(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        # every hit since the entries were created, across restarts
+        "total_hits": db.session.query(func.sum(JudgeCache.hits)).scalar() or 0,
+    }
@@ -0,0 +1,431 @@
+"""
+Judges the submissions in the background, so a slow submission never blocks the API.
+
+- POST /submission/<problem_id> saves the submission as pending and returns straight away.
+- Worker threads pick the pending submissions up, run the sandbox and store the result.
+- The queue state is the Submission.status column in the database, so the
+  submissions left pending or running by a restart are picked up again.
+- Each worker owns a judge slot: its own cpuset and memory limit. There are never
+  more slots than dedicated cores, so parallel sandboxes do not skew the
+  real_time and ram numbers of each other.
+- A sample run (POST /submission/run) is queued ahead of the submissions, the
+  request waits for it on its slot, see JudgeQueue.run_task.
+- The background tasks, e.g. the complexity analysis (apis/complexity.py) and the
+  line profile (apis/profiling.py), only run on a slot with no submission waiting,
+  on at most ANALYSIS_WORKERS slots.
+- The cases are relayed while the submission is judged, and a running submission
+  can be cancelled, see apis/judge_stream.py.
+- The best result of the user on the problem is updated in the transaction of the
+  verdict, see apis/user_best.py.
+"""
+
+import itertools
+import os
+import queue
+import threading
+
+from functools import partial
+
+from docker.utils import parse_bytes
+from flask import current_app
+
+from config import db
+from tables import *
+from apis.sandbox import sandbox_eval
+from apis.docker_client import get_docker
+from apis.judge_cache import cache_key, store_result
+from apis.complexity import queue_analysis
+from apis.profiling import queue_profile
+from apis.judge_stream import close_stream, open_stream
+from apis.user_best import record_metrics, record_result
+from apis.sandbox_staging import remove_stale_jobs
+
+# the order of the judge queue: the sample runs a request waits for, then the
+# submissions and the tasks in the order they were queued
+URGENT, NORMAL = 0, 1
+
+
+class JudgeSlot:
+    """One sandbox at a time, pinned to cpus (e.g. "3" or "2,3") with its own memory limit"""
+
+    def __init__(self, cpus=None, mem_limit="1g"):
+        self.cpus = cpus
+        self.mem_limit = mem_limit
+
+    def __repr__(self):
+        return f"JudgeSlot(cpus={self.cpus}, mem_limit={self.mem_limit})"
+
+
+def plan_slots(config):
+    """Admission control: one slot per dedicated core, within the docker host memory"""
+
+    workers = config.get("JUDGE_WORKERS", 1)
+    mem_limit = config.get("JUDGE_SLOT_MEMORY", "1g")
+
+    if not config.get("JUDGE_PIN_CPUS", True):
+        return [JudgeSlot(None, mem_limit) for _ in range(workers)]
+
+    # the docker sandboxes run on the docker host, which may not be this machine
+    try:
+        if config.get("SANDBOX_EXECUTOR", "docker") == "local":
+            ncpu = os.cpu_count() or 1
+            mem_total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        else:
+            manager = get_docker(config)
+            with manager.call("info"):
+                info = manager.client().info()
+            ncpu, mem_total = info["NCPU"], info["MemTotal"]
+    except Exception:
+        ncpu, mem_total = os.cpu_count() or 1, None
+
+    # keep some cores for the backend itself
+    reserved = config.get("JUDGE_RESERVED_CPUS", 1)
+    cpus = list(range(ncpu))[reserved:] or list(range(ncpu))
+
+    # several cores per slot for the problems with parallel cases, see judge/run.py
+    per_slot = max(1, min(config.get("JUDGE_SLOT_CPUS", 1), len(cpus)))
+    groups = [
+        cpus[i : i + per_slot] for i in range(0, len(cpus) - per_slot + 1, per_slot)
+    ]
+
+    count = min(workers, len(groups))
+    if mem_total:
+        count = min(count, max(1, mem_total // parse_bytes(mem_limit)))
+
+    return [
+        JudgeSlot(",".join(str(cpu) for cpu in groups[i]), mem_limit)
+        for i in range(count)
+    ]
+
+
+def apply_report(submission, is_success, report):
+    """Store the sandbox outcome in the submission, the caller commits"""
+
+    if not is_success:
+        # keep the error so the user can see why the submission was not judged
+        submission.status = SubmissionStatusEnum.error
+        submission.results = [f"Error {report}"]
+        submission.is_pass = False
+        return
+
+    submission.results = report["results"]
+    submission.case_results = report["cases"]
+    submission.real_time = report["real_time"]
+    submission.ram = report["ram"]
+    submission.metrics_version = METRICS_VERSION
+
+    # passed when every case passed
+    cases = report["cases"]
+    submission.is_pass = len(cases) > 0 and all(c["status"] == "passed" for c in cases)
+    submission.status = SubmissionStatusEnum.finished
+
+
+def cancel_submission(submission):
+    """Mark the submission cancelled, the caller commits"""
+
+    submission.status = SubmissionStatusEnum.cancelled
+    submission.results = ["Cancelled"]
+    submission.is_pass = False
+
+
+def fail_submission(submission_id):
+    """Mark a submission the worker failed on as an error, unless its verdict is stored"""
+
+    submission = db.session.get(Submission, submission_id)
+    if submission is None or submission.status != SubmissionStatusEnum.running:
+        return
+
+    submission.status = SubmissionStatusEnum.error
+    submission.results = ["Error The judge failed"]
+    submission.is_pass = False
+    record_result(submission)
+    db.session.commit()
+
+
+def judge_submission(submission_id, slot=None):
+    """Run the sandbox for one submission and store the result, inside an app context"""
+
+    # claim the submission, another worker may have picked it up already
+    claimed = Submission.query.filter_by(
+        submission_id=submission_id, status=SubmissionStatusEnum.pending
+    ).update({"status": SubmissionStatusEnum.running})
+    db.session.commit()
+    if not claimed:
+        return
+
+    submission = Submission.query.get(submission_id)
+
+    # the key of the files judged, in case the problem is updated in the meantime
+    key = None
+    if current_app.config.get("JUDGE_CACHE"):
+        key = cache_key(Problem.query.get(submission.problem_id), submission.code)
+
+    # the cancel endpoint signals this stream, even before the sandbox starts
+    stream = open_stream(submission_id)
+    try:
+        try:
+            is_success, report = sandbox_eval(submission_id, slot, stream)
+        except Exception as e:
+            is_success, report = False, str(e)
+
+        if stream.cancelled.is_set():
+            cancel_submission(submission)
+            db.session.commit()
+            return
+
+        # the verdict and the best result of the user are stored together
+        apply_report(submission, is_success, report)
+        record_result(submission)
+        db.session.commit()
+    finally:
+        close_stream(submission_id)
+
+    if key is not None and submission.status == SubmissionStatusEnum.finished:
+        store_result(key, submission)
+
+    # after the verdict, never before
+    problem = Problem.query.get(submission.problem_id)
+    queue_analysis(submission, problem)
+    queue_profile(submission, problem)
+    db.session.commit()
+
+
+def queue_measure(submission):
+    """Measure a passed judge cache hit in the background, the caller commits"""
+
+    if submission.is_pass and submission.metrics_version != METRICS_VERSION:
+        current_app.extensions["judge_queue"].submit_background(
+            partial(measure_submission, submission.submission_id)
+        )
+
+
+def measure_submission(submission_id, slot=None):
+    """Judge a judge cache hit again for its own time and memory, inside an app
+    context. The verdict of the cache is kept, a run that does not pass again
+    (e.g. a timeout on a loaded host) leaves the submission unranked."""
+
+    try:
+        is_success, report = sandbox_eval(submission_id, slot)
+    except Exception as e:
+        is_success, report = False, str(e)
+
+    cases = report["cases"] if is_success else []
+    if not cases or any(case["status"] != "passed" for case in cases):
+        return
+
+    submission = db.session.get(Submission, submission_id)
+    submission.case_results = cases
+    submission.real_time = report["real_time"]
+    submission.ram = report["ram"]
+    submission.metrics_version = METRICS_VERSION
+    record_metrics(submission)
+    db.session.commit()
+
+
+# seconds an idle worker waits for a submission before it looks at the background tasks
+BACKGROUND_POLL = 0.2
+
+
+class QueuedTask:
+    """task(slot) queued for a request that waits for its result, see run_task"""
+
+    def __init__(self, task):
+        self.task = task
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+    def __call__(self, slot):
+        with self.lock:
+            if self.cancelled:
+                return
+            self.started.set()
+
+        try:
+            self.result = self.task(slot)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def cancel(self):
+        """Drop the task unless a slot started it, return whether it was dropped"""
+
+        with self.lock:
+            self.cancelled = not self.started.is_set()
+            return self.cancelled
+
+
+class JudgeQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.background = None
+        self.background_slots = None
+        self.threads = []
+        self.slots = []
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["judge_queue"] = self
+
+        self.background = queue.Queue(
+            maxsize=app.config.get("ANALYSIS_QUEUE_SIZE", 100)
+        )
+        self.background_slots = threading.Semaphore(
+            app.config.get("ANALYSIS_WORKERS", 1)
+        )
+
+    def start(self):
+        """Start the workers on first use, and pick up the unfinished submissions"""
+
+        with self.lock:
+            if self.threads:
+                return
+
+            with self.app.app_context():
+                # the running ones were interrupted by a restart, judge them again
+                Submission.query.filter_by(status=SubmissionStatusEnum.running).update(
+                    {"status": SubmissionStatusEnum.pending}
+                )
+                db.session.commit()
+
+                pending = (
+                    Submission.query.filter_by(status=SubmissionStatusEnum.pending)
+                    .order_by(Submission.submission_id)
+                    .all()
+                )
+                for submission in pending:
+                    self.put(submission.submission_id)
+                db.session.remove()
+
+            # the job folders of a crashed process are not needed any more
+            remove_stale_jobs(self.app.config.get("SANDBOX_STAGING_DIR"))
+
+            # one worker per slot, so at most one sandbox per slot
+            self.slots = plan_slots(self.app.config)
+            for slot in self.slots:
+                thread = threading.Thread(target=self.worker, args=(slot,), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def put(self, item, priority=NORMAL):
+        # the count keeps the order of the same priority, the items are not compared
+        self.queue.put((priority, next(self.order), item))
+
+    def submit(self, submission_id):
+        # a submission queued twice is only judged once, see judge_submission
+        self.start()
+        self.put(submission_id)
+
+    def submit_task(self, task):
+        """Queue task(slot), e.g. a batch of submissions, it runs on a judge slot
+        like the submissions, so it never shares a core with them"""
+
+        self.start()
+        self.put(task)
+
+    def run_task(self, task, wait):
+        """Run task(slot) on a judge slot ahead of the queued submissions, e.g. a
+        sample run, and return its result. Raise TimeoutError if no slot started it
+        within wait seconds, it is dropped then."""
+
+        self.start()
+        queued = QueuedTask(task)
+        self.put(queued, URGENT)
+
+        if not queued.started.wait(wait) and queued.cancel():
+            raise TimeoutError("No judge slot is available")
+
+        queued.finished.wait()
+        if queued.error is not None:
+            raise queued.error
+        return queued.result
+
+    def submit_background(self, task):
+        """Queue task(slot) with a lower priority, it only runs on an idle slot.
+        Return False if too many background tasks are waiting already."""
+
+        self.start()
+        try:
+            self.background.put_nowait(task)
+        except queue.Full:
+            return False
+        return True
+
+    def run_background(self, slot):
+        """Run a background task if there is one and a background slot is free"""
+
+        if not self.background_slots.acquire(blocking=False):
+            return
+
+        try:
+            try:
+                task = self.background.get_nowait()
+            except queue.Empty:
+                return
+
+            with self.app.app_context():
+                try:
+                    task(slot)
+                except Exception:
+                    current_app.logger.exception("Background task %s failed", task)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+        finally:
+            self.background_slots.release()
+
+    def run_item(self, item, slot):
+        """Judge a submission id or run a task, a failure is logged and the
+        submission marked as an error, so it is not left running forever"""
+
+        with self.app.app_context():
+            try:
+                if callable(item):
+                    item(slot)
+                else:
+                    judge_submission(item, slot)
+            except Exception:
+                current_app.logger.exception("Judge worker failed on %s", item)
+                db.session.rollback()
+                if not callable(item):
+                    try:
+                        fail_submission(item)
+                    except Exception:
+                        current_app.logger.exception("Can not mark %s failed", item)
+                        db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def worker(self, slot):
+        while True:
+            try:
+                _, _, item = self.queue.get(timeout=BACKGROUND_POLL)
+            except queue.Empty:
+                self.run_background(slot)
+                continue
+
+            try:
+                self.run_item(item, slot)
+            finally:
+                self.queue.task_done()
+
+
+def queue_position(submission):
+    """Number of pending submissions ahead of this one"""
+
+    if submission.status != SubmissionStatusEnum.pending:
+        return 0
+
+    return Submission.query.filter(
+        Submission.status == SubmissionStatusEnum.pending,
+        Submission.submission_id < submission.submission_id,
+    ).count()
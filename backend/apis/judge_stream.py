@@ -0,0 +1,100 @@
+"""
+Relays the verdict of each case while a submission is judged, and cancels it.
+
+- The judge worker opens a stream for the submission it runs, the executors feed
+  it every case reported by the runner as soon as the case is judged (progress
+  frames, see judge/run.py).
+- GET /submission/<submission_id>/stream relays the cases over Server-Sent Events.
+- POST /submission/<submission_id>/cancel cancels the stream: the executors
+  registered how to kill their sandbox (the container, the process group), so the
+  judge slot is free at once. A submission without a stream (re-judged in a batch)
+  can not be cancelled.
+- The streams only live while the submission is judged, in this process, like the
+  judge queue itself.
+"""
+
+import threading
+
+
+class JudgeStream:
+    def __init__(self, submission_id):
+        self.submission_id = submission_id
+        self.cases = []
+        self.done = False
+        self.cancelled = threading.Event()
+        self.kills = []
+        self.condition = threading.Condition()
+
+    def add_case(self, case):
+        with self.condition:
+            self.cases.append(case)
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """The cases after the first seen ones, waiting up to timeout seconds
+        for a new one, and whether the judge is done"""
+
+        with self.condition:
+            if len(self.cases) == seen and not self.done:
+                self.condition.wait(timeout)
+            return self.cases[seen:], self.done
+
+    def on_cancel(self, kill):
+        """Call kill() on cancel, straight away if it is cancelled already"""
+
+        with self.condition:
+            self.kills.append(kill)
+        if self.cancelled.is_set():
+            kill()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled.set()
+            kills = list(self.kills)
+
+        for kill in kills:
+            try:
+                kill()
+            except Exception:
+                pass
+
+
+streams = {}
+streams_lock = threading.Lock()
+
+
+def open_stream(submission_id):
+    """The stream of the submission, opened by the worker that judges it"""
+
+    with streams_lock:
+        if submission_id not in streams:
+            streams[submission_id] = JudgeStream(submission_id)
+        return streams[submission_id]
+
+
+def get_stream(submission_id):
+    with streams_lock:
+        return streams.get(submission_id)
+
+
+def close_stream(submission_id):
+    with streams_lock:
+        stream = streams.pop(submission_id, None)
+    if stream is not None:
+        stream.finish()
+
+
+def cancel_stream(submission_id):
+    """Cancel the stream of the submission, even before its sandbox starts.
+    None if no worker judges it on its own, e.g. in a re-judge batch, no stream is
+    opened then: only the worker that opens a stream closes it."""
+
+    stream = get_stream(submission_id)
+    if stream is not None:
+        stream.cancel()
+    return stream
@@ -0,0 +1,255 @@
+"""
+Provides the leaderboards: global, per topic, per difficulty and per week.
+
+Routes:
+- GET /leaderboard/: The global leaderboard.
+- GET /leaderboard/topic/<topic>: The leaderboard of the problems of a topic.
+- GET /leaderboard/difficulty/<difficulty>: The leaderboard of the problems of a difficulty.
+- GET /leaderboard/weekly: The leaderboard of the problems solved in a week, ?week=2025-W12, the current week by default.
+
+Every route takes ?limit= (20 by default) and ?cursor=, the next_cursor of the previous page.
+
+- A user scores the POINTS of the difficulty of a problem once, when the problem is
+  solved for the first time (apis/user_best.py). Each board of the problem is one
+  row of the user in tables.LeaderboardScore, so a verdict updates 4 rows by their
+  primary key, without aggregating the submissions.
+- A page is a range of the index (board, score DESC, user_id) that starts after the
+  cursor, the last (score, user_id) of the previous page, so reading a page costs the
+  same on the first page and on the last one, whatever the number of users.
+- A re-judge can take a solve back, the scores of its users are computed again
+  from their best results, see rebuild_scores.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+from flask import abort
+from flask_restx import Namespace, Resource, reqparse
+from sqlalchemy.dialects.sqlite import insert
+
+from config import db
+from tables import *
+
+api = Namespace("leaderboard", description="Leaderboard operations")
+
+# the score of a solved problem
+POINTS = {DifficultyEnum.easy: 10, DifficultyEnum.medium: 20, DifficultyEnum.hard: 30}
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+page_parser = reqparse.RequestParser()
+page_parser.add_argument("cursor", type=str, location="args", required=False)
+page_parser.add_argument("limit", type=int, location="args", required=False)
+
+weekly_parser = page_parser.copy()
+weekly_parser.add_argument(
+    "week", type=str, location="args", required=False, help="e.g. 2025-W12"
+)
+
+
+def week_board(moment):
+    year, week, _ = moment.isocalendar()
+    return f"week:{year}-W{week:02d}"
+
+
+def problem_boards(problem, solved_at):
+    """The boards a solve of the problem counts on"""
+
+    return [
+        "global",
+        f"topic:{problem.topic.value}",
+        f"difficulty:{problem.difficulty.value}",
+        week_board(solved_at),
+    ]
+
+
+def add_solve(user_id, problem, solved_at):
+    """Score the first solve of a problem on its boards, the caller commits"""
+
+    points = POINTS[problem.difficulty]
+    for board in problem_boards(problem, solved_at):
+        db.session.execute(
+            insert(LeaderboardScore)
+            .values(board=board, user_id=user_id, score=0, solved=0)
+            .on_conflict_do_nothing()
+        )
+        LeaderboardScore.query.filter_by(board=board, user_id=user_id).update(
+            {
+                "score": LeaderboardScore.score + points,
+                "solved": LeaderboardScore.solved + 1,
+                "updated_at": datetime.now(),
+            },
+            synchronize_session=False,
+        )
+
+
+def rebuild_scores(user_ids):
+    """Compute the scores of the users again from their best results, the caller commits"""
+
+    user_ids = list(user_ids)
+    solves = (
+        db.session.query(
+            UserProblemBest.user_id, UserProblemBest.first_solved_at, Problem
+        )
+        .join(Problem, Problem.problem_id == UserProblemBest.problem_id)
+        .filter(
+            UserProblemBest.user_id.in_(user_ids),
+            UserProblemBest.first_solved_at.isnot(None),
+        )
+    )
+
+    scores = defaultdict(lambda: [0, 0])
+    for user_id, solved_at, problem in solves:
+        for board in problem_boards(problem, solved_at):
+            scores[board, user_id][0] += POINTS[problem.difficulty]
+            scores[board, user_id][1] += 1
+
+    LeaderboardScore.query.filter(LeaderboardScore.user_id.in_(user_ids)).delete(
+        synchronize_session=False
+    )
+    rows = [
+        {"board": board, "user_id": user_id, "score": score, "solved": solved}
+        for (board, user_id), (score, solved) in scores.items()
+    ]
+    if rows:
+        db.session.execute(insert(LeaderboardScore), rows)
+
+
+def parse_cursor(cursor):
+    """(score, user_id) of the last entry of the previous page"""
+
+    try:
+        score, user_id = cursor.split(",")
+        return int(score), int(user_id)
+    except ValueError:
+        abort(400, "Invalid cursor")
+
+
+def read_page(board, cursor=None, limit=PAGE_SIZE):
+    """The entries of a board after the cursor, in order of score then user_id"""
+
+    query = LeaderboardScore.query.filter_by(board=board)
+    order = (LeaderboardScore.score.desc(), LeaderboardScore.user_id)
+    if cursor is None:
+        return query.order_by(*order).limit(limit).all()
+
+    # the rest of the tie of the cursor, then the lower scores,
+    # each one a range of the index from the cursor on
+    score, user_id = cursor
+    entries = (
+        query.filter(
+            LeaderboardScore.score == score, LeaderboardScore.user_id > user_id
+        )
+        .order_by(LeaderboardScore.user_id)
+        .limit(limit)
+        .all()
+    )
+    if len(entries) < limit:
+        entries += (
+            query.filter(LeaderboardScore.score < score)
+            .order_by(*order)
+            .limit(limit - len(entries))
+            .all()
+        )
+    return entries
+
+
+def leaderboard(board, args):
+    limit = min(args.get("limit") or PAGE_SIZE, MAX_PAGE_SIZE)
+    if limit < 1:
+        abort(400, "Invalid limit")
+
+    cursor = parse_cursor(args["cursor"]) if args.get("cursor") else None
+    entries = read_page(board, cursor, limit)
+
+    # the users of the page, by their primary key
+    users = {
+        user.user_id: user
+        for user in User.query.filter(
+            User.user_id.in_([entry.user_id for entry in entries])
+        )
+    }
+
+    next_cursor = None
+    if len(entries) == limit:
+        next_cursor = f"{entries[-1].score},{entries[-1].user_id}"
+
+    result = {
+        "board": board,
+        "entries": [
+            {
+                "user_id": entry.user_id,
+                "username": users[entry.user_id].username,
+                "avatar": "uploads/" + users[entry.user_id].avatar,
+                "score": entry.score,
+                "solved": entry.solved,
+            }
+            for entry in entries
+        ],
+        "next_cursor": next_cursor,
+    }
+    return result, 200
+
+
+@api.route("/")
+class GlobalLeaderboardResource(Resource):
+    @api.expect(page_parser)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid cursor or limit")
+    def get(self):
+        """Get a page of the global leaderboard"""
+
+        return leaderboard("global", page_parser.parse_args())
+
+
+@api.route("/topic/<string:topic>")
+class TopicLeaderboardResource(Resource):
+    @api.expect(page_parser)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid topic, cursor or limit")
+    def get(self, topic):
+        """Get a page of the leaderboard of a topic"""
+
+        try:
+            topic = TopicEnum(topic)
+        except ValueError:
+            abort(400, "Invalid topic")
+
+        return leaderboard(f"topic:{topic.value}", page_parser.parse_args())
+
+
+@api.route("/difficulty/<string:difficulty>")
+class DifficultyLeaderboardResource(Resource):
+    @api.expect(page_parser)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid difficulty, cursor or limit")
+    def get(self, difficulty):
+        """Get a page of the leaderboard of a difficulty"""
+
+        try:
+            difficulty = DifficultyEnum(difficulty)
+        except ValueError:
+            abort(400, "Invalid difficulty")
+
+        return leaderboard(f"difficulty:{difficulty.value}", page_parser.parse_args())
+
+
+@api.route("/weekly")
+class WeeklyLeaderboardResource(Resource):
+    @api.expect(weekly_parser)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid week, cursor or limit")
+    def get(self):
+        """Get a page of the leaderboard of a week, the current week by default"""
+
+        args = weekly_parser.parse_args()
+        if not args.get("week"):
+            return leaderboard(week_board(datetime.now()), args)
+
+        try:
+            monday = datetime.strptime(args["week"] + "-1", "%G-W%V-%u")
+        except ValueError:
+            abort(400, "Invalid week")
+
+        return leaderboard(week_board(monday), args)
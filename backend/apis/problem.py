@@ -6,6 +6,7 @@ Routes:
 - POST /problem/: Create a new problem. Admin only.
 - GET /problem/<problem_id>: Retrieve a specific problem by ID.
 - PUT /problem/<problem_id>: Update an existing problem. Admin only.
+  Both accept an optional judge.json with the execution policy of the problem.
 - GET /problem/<problem_id>/download: Download all problem-related files as a ZIP archive.
 - GET /problem/random: Retrieve a random problem.
 - GET /problem/search-index: Get a minimal list of published problems (title, ID, and topic) for search functionality.
@@ -19,6 +20,9 @@ import io
 import random
 from tables import *
 from apis.header import auth_parser
+from apis.sandbox import parse_judge_settings
+from apis.judge_cache import invalidate
+from apis.leaderboard import rebuild_scores
 
 api = Namespace("problem", description="Problem related operations")
 
@@ -38,6 +42,24 @@ problem_model = api.model(
 )
 
 
+def read_judge_settings(judge):
+    """Content of the uploaded judge.json, None if not uploaded, abort 400 if invalid"""
+
+    if judge is None:
+        return None
+
+    if judge.filename != "judge.json":
+        abort(400, "File name must be judge.json")
+
+    content = judge.read().decode("utf-8", errors="replace")
+    try:
+        parse_judge_settings(content)
+    except ValueError as e:
+        abort(400, f"Invalid judge.json: {e}")
+
+    return content
+
+
 @api.route("/")
 class ProblemResourcePost(Resource):
     # anyone can get a problem list
@@ -112,6 +134,9 @@ class ProblemResourcePost(Resource):
                 "File names must be submission_template.py, solution.py, testcase.py, description.md",
             )
 
+        # the execution policy is optional, see judge/run.py
+        judge_settings = read_judge_settings(request.files.get("judge"))
+
         # create the record first, so we can get the problem_id to create the folder
         new_problem = Problem(
             title=title,
@@ -136,6 +161,9 @@ class ProblemResourcePost(Resource):
         solution.save(os.path.join(folder_path, "solution.py"))
         testcase.save(os.path.join(folder_path, "testcase.py"))
         description.save(os.path.join(folder_path, "description.md"))
+        if judge_settings is not None:
+            with open(os.path.join(folder_path, "judge.json"), "w") as f:
+                f.write(judge_settings)
 
         # update the folder_url
         new_problem.folder_url = f"problems/p{new_problem.problem_id}"
@@ -185,6 +213,9 @@ class ProblemResource(Resource):
         if data.get("title"):
             problem.title = data.get("title")
 
+        # the scores of a solve depend on the difficulty and the topic
+        boards = (problem.difficulty, problem.topic)
+
         try:
             if data.get("difficulty"):
                 problem.difficulty = DifficultyEnum(data.get("difficulty"))
@@ -203,6 +234,7 @@ class ProblemResource(Resource):
         solution = request.files.get("solution")
         testcase = request.files.get("testcase")
         description = request.files.get("description")
+        judge_settings = read_judge_settings(request.files.get("judge"))
 
         if submission_template is not None:
             submission_template.save(
@@ -240,6 +272,29 @@ class ProblemResource(Resource):
                 )
             )
 
+        if judge_settings is not None:
+            with open(
+                os.path.join(
+                    current_app.config["UPLOAD_FOLDER"],
+                    problem.folder_url,
+                    "judge.json",
+                ),
+                "w",
+            ) as f:
+                f.write(judge_settings)
+
+        # the cached results were judged with the old test cases, the generated
+        # cases take their expected outputs from the solution
+        if testcase is not None or judge_settings is not None or solution is not None:
+            invalidate(problem.problem_id)
+
+        if (problem.difficulty, problem.topic) != boards:
+            solvers = UserProblemBest.query.filter(
+                UserProblemBest.problem_id == problem.problem_id,
+                UserProblemBest.first_solved_at.isnot(None),
+            )
+            rebuild_scores([best.user_id for best in solvers])
+
         db.session.commit()
         return problem.to_dict(), 200
 
@@ -5,17 +5,21 @@ Routes:
 - GET /profile/<user_id>: Retrieve a user's profile by ID.
 - PUT /profile/<user_id>/edit: Update a user’s profile. Only the user or an admin can perform this action.
 - GET /profile/recent-challenges: Retrieve the 5 most recent challenges submitted by the user. Requires token.
-- GET /profile/submission/summary: Get submission summary statistics (total, passed, last 7 days). Requires token.
+- GET /profile/submission/summary: Get submission summary statistics (total, passed, solved, last 7 days). Requires token.
+- GET /profile/solved: Get the ids of the problems the user has solved. Requires token.
 - GET /profile/submission/frequency: Get the user’s submission frequency for the last 60 days (daily count). Requires token.
 """
 
 from flask_restx import Namespace, Resource, fields
 from flask import request, abort, current_app
 from datetime import datetime, timedelta
+from sqlalchemy import case, func, true
+from sqlalchemy.orm import selectinload
 import os
 from config import db
 from tables import *
 from apis.header import auth_parser
+from apis.user_best import JUDGED, solved_problem_ids
 
 api = Namespace("profile", description="User profile operations")
 
@@ -146,8 +150,10 @@ class RecentChallengesResource(Resource):
 
         # get the most recent 5 submission from the user
         # sort by submission time descending
+        # with their problems in one more query
         submissions = (
             Submission.query.filter_by(user_id=user.user_id)
+            .options(selectinload(Submission.problem))
             .order_by(Submission.created_at.desc())
             .limit(5)
             .all()
@@ -157,11 +163,8 @@ class RecentChallengesResource(Resource):
         results = []
 
         for submission in submissions:
-            # get the problem
-            problem = Problem.query.get(submission.problem_id)
-
             result = {
-                "problem": problem.to_dict(),
+                "problem": submission.problem.to_dict(),
                 "submission": {
                     "submission_id": submission.submission_id,
                     "submission_time": submission.created_at.strftime(
@@ -196,33 +199,35 @@ class SummaryResource(Resource):
         if not user:
             abort(401, "Invalid token")
 
-        # get total submission count
-        total_submission = Submission.query.filter_by(user_id=user.user_id).count()
-
-        # get total passed submission count
-        total_passed = Submission.query.filter_by(
-            user_id=user.user_id, is_pass=True
-        ).count()
-
-        # get total submission in last 7 days
+        # every count from the judged submissions of the user, in one query on the
+        # index of the user: a pending or cancelled submission has no verdict
         last_7_days = datetime.now() - timedelta(days=7)
-
-        total_submission_7_days = Submission.query.filter(
-            Submission.user_id == user.user_id,
-            Submission.created_at >= last_7_days,
-        ).count()
-
-        # get total passed submission in last 7 days
-        total_passed_7_days = Submission.query.filter(
-            Submission.user_id == user.user_id,
-            Submission.is_pass == True,
-            Submission.created_at >= last_7_days,
-        ).count()
+        passed = Submission.is_pass == true()
+        recent = Submission.created_at >= last_7_days
+
+        (
+            total_submission,
+            total_passed,
+            total_solved,
+            total_submission_7_days,
+            total_passed_7_days,
+        ) = (
+            db.session.query(
+                func.count(),
+                func.count(case((passed, 1))),
+                func.count(func.distinct(case((passed, Submission.problem_id)))),
+                func.count(case((recent, 1))),
+                func.count(case((passed & recent, 1))),
+            )
+            .filter(Submission.user_id == user.user_id, Submission.status.in_(JUDGED))
+            .one()
+        )
 
         # return the results
         result = {
             "total_submission": total_submission,
             "total_passed": total_passed,
+            "total_solved": total_solved,
             "total_submission_7_days": total_submission_7_days,
             "total_passed_7_days": total_passed_7_days,
         }
@@ -230,6 +235,26 @@ class SummaryResource(Resource):
         return result, 200
 
 
+# get the problems solved by the user, e.g. to mark them in the problem list
+@api.route("/solved")
+class SolvedProblemsResource(Resource):
+    @api.expect(auth_parser)
+    @api.response(200, "Success")
+    @api.response(401, "Unauthorized")
+    def get(self):
+        """Get the ids of the problems solved by the user"""
+
+        token = request.headers.get("Authorization")
+        if not token:
+            abort(401, "Authorization token required")
+
+        user = User.query.filter_by(token=token).first()
+        if not user:
+            abort(401, "Invalid token")
+
+        return solved_problem_ids(user.user_id), 200
+
+
 # get the submission frequency for the last 60 days
 # [ { date: yyyy-mm-dd, count: xxxx } ]
 @api.route("/submission/frequency")
@@ -0,0 +1,69 @@
+"""
+Profiles the passed submissions line by line, shown next to their ranking.
+
+- The runner traces the submission on its largest test case (run_profile in
+  judge/run.py): the time share and hits of its slowest lines, then, in a second
+  call under tracemalloc, the lines that allocated the most at its memory peak.
+  Each traced call stops after PROFILE_BUDGET seconds, the profile is then partial.
+- The time of a line includes the library calls it makes, and the tracing slows
+  the submission down, so the shares matter, not the seconds.
+- Like the complexity analysis (apis/complexity.py), it runs in the background on
+  an idle judge slot, after the verdict is stored, and the same code is only
+  profiled once per problem.
+- The profile is stored in Submission.profile.
+"""
+
+from functools import partial
+
+from flask import current_app
+
+from config import db
+from tables import *
+from apis.sandbox import get_executor, testcase_path
+
+
+def queue_profile(submission, problem):
+    """Profile a passed submission in the background, the caller commits"""
+
+    config = current_app.config
+    if not config.get("PROFILING") or not submission.is_pass:
+        return
+
+    profiled = (
+        Submission.query.filter(
+            Submission.problem_id == problem.problem_id,
+            Submission.code == submission.code,
+            Submission.profile.isnot(None),
+        )
+        .order_by(Submission.submission_id.desc())
+        .first()
+    )
+    if profiled is not None:
+        submission.profile = profiled.profile
+        return
+
+    current_app.extensions["judge_queue"].submit_background(
+        partial(profile_submission, submission.submission_id)
+    )
+
+
+def profile_submission(submission_id, slot=None):
+    """Run the profile of a submission and store it, inside an app context"""
+
+    config = current_app.config
+    submission = Submission.query.get(submission_id)
+    problem = Problem.query.get(submission.problem_id)
+
+    try:
+        is_success, profile = get_executor(config).profile(
+            submission.code,
+            testcase_path(problem),
+            slot.cpus if slot else None,
+            slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g"),
+            config.get("PROFILE_BUDGET", 10),
+        )
+    except Exception as e:
+        is_success, profile = False, str(e)
+
+    submission.profile = profile if is_success else {"error": profile}
+    db.session.commit()
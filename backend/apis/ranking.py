@@ -0,0 +1,88 @@
+"""
+Ranks a passed submission among the users who solved its problem.
+
+- Every user counts once, with the best result of the user on the problem
+  (tables.UserProblemBest, see apis/user_best.py), so resubmitting the same
+  solution does not change the population.
+- The rank on a metric (ram, real_time) is 1 + the number of other users with a
+  strictly better best value, so tied users share their rank.
+- Only the results measured in the current units are ranked (METRICS_VERSION in
+  tables.py): a submission judged before has no percentiles, and a user whose
+  passed submissions are all older has no best value, so is not in the population.
+- Every count is one SQL query on the indexes of the best results
+  (ix_user_problem_best_ram / ix_user_problem_best_time): a range of the users of
+  the problem, no submission is read.
+"""
+
+from sqlalchemy import case, func
+
+from config import db
+from tables import *
+
+# the metrics of the ranking, lower is better: the submission attribute, the best column
+METRICS = {
+    "ram": ("ram", UserProblemBest.best_ram),
+    "time": ("real_time", UserProblemBest.best_time),
+}
+
+
+def solved_query(problem_id, column=UserProblemBest.best_ram):
+    """Count of the users ranked on the column, the ones who solved the problem with
+    a result measured in the current units"""
+
+    return db.session.query(func.count()).filter(
+        UserProblemBest.problem_id == problem_id, column.isnot(None)
+    )
+
+
+def rank(submission, column, value):
+    """1-based rank of value on the column among the other users"""
+
+    better = (
+        solved_query(submission.problem_id, column)
+        .filter(column < value, UserProblemBest.user_id != submission.user_id)
+        .scalar()
+    )
+    return better + 1
+
+
+def percentile(rank, total):
+    """Share of the users the rank is not behind of (better = higher)"""
+
+    return round(100 * (1 - (rank - 1) / total), 2)
+
+
+def ranking(submission):
+    """The percentiles of a passed submission, and the counts of its problem"""
+
+    problem_id = submission.problem_id
+    measured = submission.metrics_version == METRICS_VERSION
+
+    result = {}
+    for name, (attribute, column) in METRICS.items():
+        value = getattr(submission, attribute)
+        if not measured or value is None:
+            # of other units than the best results, not comparable
+            result[f"{name}_percentile"] = None
+            continue
+
+        # the submission itself is ranked, even if its best result is not stored yet
+        ranked = solved_query(problem_id, column).scalar()
+        position = rank(submission, column, value)
+        result[f"{name}_percentile"] = percentile(position, max(ranked, position))
+
+    attempts, passes, solved, participants = (
+        db.session.query(
+            func.coalesce(func.sum(UserProblemBest.attempts), 0),
+            func.coalesce(func.sum(UserProblemBest.passes), 0),
+            func.count(case((UserProblemBest.passes > 0, 1))),
+            func.count(),
+        )
+        .filter(UserProblemBest.problem_id == problem_id)
+        .one()
+    )
+    result["total_passed_submissions"] = passes
+    result["total_solved_users"] = solved
+    result["total_submissions"] = attempts
+    result["total_participants"] = participants
+    return result
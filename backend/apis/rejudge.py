@@ -0,0 +1,250 @@
+"""
+Re-judges the submissions of a problem in bulk, e.g. after its testcase.py changed.
+
+- The submissions are split in batches of REJUDGE_BATCH_SIZE. Each batch runs in
+  one sandbox: testcase.py is imported once, then a child is forked for every
+  submission (run_batch in judge/run.py), so a submission only costs a fork.
+- The batches go through the judge queue, so they run in parallel on the judge
+  slots, one core each, without sharing a core with the other submissions.
+- The submissions are running while they are re-judged, a restart judges the
+  unfinished ones again one by one, see JudgeQueue.start.
+- Incremental by default: the cases are identified by the hash of their content,
+  and each submission keeps the outcome of every case in case_results. Only the new
+  or modified cases run again, the others are merged from the stored outcomes.
+  The outcomes measured in older units (METRICS_VERSION in tables.py) all run
+  again, so a re-judge ranks the submissions judged before.
+  The results, is_pass, real_time and ram (so the rankings) are computed again from
+  the merged cases, and stored with the best results and the leaderboard scores of
+  the re-judged users (apis/user_best.py) in one commit per batch.
+- A batch that fails (the sandbox, or storing its results) keeps the previous
+  verdicts of its submissions, they get their status back and count as failed in
+  the progress, the next batches still run.
+- The progress of a re-judge is kept in memory, see GET /admin/rejudge/<job_id>.
+"""
+
+import threading
+import time
+import uuid
+from functools import partial
+
+from flask import current_app
+
+from config import db
+from tables import *
+from apis.sandbox import get_executor, testcase_path
+from apis.judge_cache import code_hash, store_result, testcase_hash
+from apis.judge_queue import apply_report
+from apis.user_best import rebuild
+from apis.leaderboard import rebuild_scores
+
+jobs = {}
+jobs_lock = threading.Lock()
+
+
+class RejudgeJob:
+    def __init__(self, problem_id, total, incremental=True, statuses=None):
+        self.job_id = uuid.uuid4().hex
+        self.problem_id = problem_id
+        self.total = total
+        self.incremental = incremental
+        # {submission_id: status} before the re-judge, put back if a batch fails
+        self.statuses = statuses or {}
+        self.done = 0
+        self.passed = 0
+        self.errors = 0
+        self.failed = 0
+        self.cases_run = 0
+        self.cases_reused = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def advance(self, count, submissions):
+        with self.lock:
+            self.done += count
+            self.passed += sum(s.is_pass for s in submissions)
+            self.errors += sum(
+                s.status == SubmissionStatusEnum.error for s in submissions
+            )
+            for submission in submissions:
+                cases = submission.case_results or []
+                reused = sum(bool(case.get("reused")) for case in cases)
+                self.cases_reused += reused
+                self.cases_run += len(cases) - reused
+            if self.done >= self.total:
+                self.finished_at = time.time()
+
+    def to_dict(self):
+        with self.lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            return {
+                "job_id": self.job_id,
+                "problem_id": self.problem_id,
+                "status": "finished" if self.finished_at else "running",
+                "total": self.total,
+                "done": self.done,
+                "passed": self.passed,
+                "errors": self.errors,
+                "failed": self.failed,
+                "incremental": self.incremental,
+                "cases_run": self.cases_run,
+                "cases_reused": self.cases_reused,
+                "elapsed": round(elapsed, 2),
+                # submissions per minute
+                "throughput": round(self.done / elapsed * 60, 1) if elapsed else 0.0,
+            }
+
+
+def select_submissions(problem_id, result="all", user_id=None):
+    """Ids of the judged submissions of a problem, result is all, passed or failed"""
+
+    query = Submission.query.filter(
+        Submission.problem_id == problem_id,
+        Submission.status.in_(
+            [SubmissionStatusEnum.finished, SubmissionStatusEnum.error]
+        ),
+    )
+
+    if result == "passed":
+        query = query.filter(Submission.is_pass.is_(True))
+    elif result == "failed":
+        query = query.filter(Submission.is_pass.is_(False))
+
+    if user_id is not None:
+        query = query.filter(Submission.user_id == user_id)
+
+    rows = query.with_entities(Submission.submission_id).order_by(
+        Submission.submission_id
+    )
+    return [submission_id for (submission_id,) in rows]
+
+
+def start_rejudge(judge_queue, problem_id, submission_ids, incremental=True):
+    """Queue the batches of a re-judge, return the job to follow its progress.
+    Without incremental, every case of every submission runs again."""
+
+    selected = Submission.query.filter(Submission.submission_id.in_(submission_ids))
+    statuses = dict(selected.with_entities(Submission.submission_id, Submission.status))
+
+    # the submissions are being judged again
+    selected.update({"status": SubmissionStatusEnum.running}, synchronize_session=False)
+    db.session.commit()
+
+    job = RejudgeJob(problem_id, len(submission_ids), incremental, statuses)
+    with jobs_lock:
+        jobs[job.job_id] = job
+
+    if not submission_ids:
+        job.finished_at = time.time()
+
+    size = current_app.config.get("REJUDGE_BATCH_SIZE", 25)
+    for i in range(0, len(submission_ids), size):
+        batch = submission_ids[i : i + size]
+        judge_queue.submit_task(partial(judge_batch, job, batch))
+
+    return job
+
+
+def get_job(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
+
+
+def known_cases(submission):
+    """{case hash: report} of the stored outcomes of a submission, the cases judged
+    before the cases had a hash, or in other units than METRICS_VERSION, and the
+    crashed ones, are run again"""
+
+    if submission.metrics_version != METRICS_VERSION:
+        return {}
+    return {
+        case["hash"]: case for case in submission.case_results or [] if "hash" in case
+    }
+
+
+def judge_batch(job, submission_ids, slot=None):
+    """Judge a batch of submissions in one sandbox and store the results, inside an
+    app context. The job advances even if the batch fails."""
+
+    submissions = []
+    try:
+        submissions = store_batch(job, submission_ids, slot)
+    except Exception:
+        current_app.logger.exception("Re-judge of %s failed", submission_ids)
+        db.session.rollback()
+        try:
+            submissions = restore_batch(job, submission_ids)
+        except Exception:
+            current_app.logger.exception("Can not restore %s", submission_ids)
+            db.session.rollback()
+    finally:
+        job.advance(len(submission_ids), submissions)
+
+
+def restore_batch(job, submission_ids):
+    """Put back the status the submissions of a failed batch had before the
+    re-judge, their verdicts were not replaced, return the submissions"""
+
+    restored = 0
+    for status in set(job.statuses.values()):
+        ids = [i for i in submission_ids if job.statuses.get(i) == status]
+        restored += Submission.query.filter(
+            Submission.submission_id.in_(ids),
+            Submission.status == SubmissionStatusEnum.running,
+        ).update({"status": status}, synchronize_session=False)
+    db.session.commit()
+
+    with job.lock:
+        job.failed += restored
+    return Submission.query.filter(Submission.submission_id.in_(submission_ids)).all()
+
+
+def store_batch(job, submission_ids, slot=None):
+    """Judge the batch and store the verdicts, return the submissions"""
+
+    config = current_app.config
+    problem = Problem.query.get(job.problem_id)
+    submissions = Submission.query.filter(
+        Submission.submission_id.in_(submission_ids)
+    ).all()
+
+    # the key of the files judged, in case the problem is updated in the meantime
+    keys = {}
+    if config.get("JUDGE_CACHE"):
+        testcase_key = testcase_hash(problem)
+        keys = {s.submission_id: (testcase_key, code_hash(s.code)) for s in submissions}
+
+    known = None
+    if job.incremental:
+        known = {s.submission_id: known_cases(s) for s in submissions}
+
+    try:
+        is_success, reports = get_executor(config).judge_batch(
+            {s.submission_id: s.code for s in submissions},
+            testcase_path(problem),
+            slot.cpus if slot else None,
+            slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g"),
+            known=known,
+        )
+    except Exception as e:
+        is_success, reports = False, str(e)
+
+    # the merged cases give the verdict, the time and memory of the rankings
+    for submission in submissions:
+        if is_success:
+            apply_report(submission, True, reports[str(submission.submission_id)])
+        else:
+            apply_report(submission, False, reports)
+
+    # a result can get worse, the best results of the users are computed again
+    user_ids = {s.user_id for s in submissions}
+    rebuild(job.problem_id, user_ids)
+    rebuild_scores(user_ids)
+    db.session.commit()
+
+    for submission in submissions:
+        key = keys.get(submission.submission_id)
+        if key is not None and submission.status == SubmissionStatusEnum.finished:
+            store_result(key, submission)
+
+    return submissions
@@ -1,153 +1,857 @@
 """
 Executes user-submitted code in an isolated Docker container for automated problem evaluation.
 
-- Builds a temporary environment with the user's code and test cases.
-- Measures execution time and memory usage.
-- Returns test results, timing, and memory statistics.
+- The executor is chosen with SANDBOX_EXECUTOR, see get_executor:
+  "docker" injects the user's code and test cases into a container of the pre-built
+  image, sends them to a warm container of the sandbox pool (SANDBOX_MODE = "pool"),
+  or builds a temporary image per submission (SANDBOX_MODE = "build");
+  "local" runs the runner as a limited subprocess, see apis/sandbox_local.py.
+- The runner measures the time and memory of the call of every test case (judge/run.py).
+- Returns the test results with the per case report, see make_report.
 """
 
+import ast
 import docker
-import shutil
 import os
-import re
-from flask import current_app
-from datetime import datetime
+import io
+import json
+import math
+import struct
+import time
+import uuid
+import tarfile
+from flask import current_app, has_app_context
 
 from config import db
 from tables import *
+from apis.docker_client import get_docker
+from apis.sandbox_pool import get_pool
+from apis.sandbox_staging import staged_job
+from apis.sandbox_local import run_local
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the runner is copied into the sandbox as run.py, see judge/run.py
+with open(os.path.join(BASE_DIR, "judge", "run.py"), "r") as f:
+    run_script = f.read()
+
+# the runner writes one result frame on stdout, the user output goes to stderr
+command_str = "python3 run.py"
+
+# must match the result frame of judge/run.py: magic, version, payload length
+FRAME_MAGIC = b"JR"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct(">2sBI")
+
+# judge.json of a problem, see DEFAULT_SETTINGS in judge/run.py
+JUDGE_SETTINGS = [
+    "policy",
+    "max_timeouts",
+    "timeout",
+    "limits",
+    "reference",
+    "budget",
+    "parallel",
+    "workers",
+    "ladder",
+    "analysis_budget",
+    "profile_budget",
+]
+JUDGE_POLICIES = ["all", "stop-on-first-failure", "stop-after-timeouts"]
+
+# seconds of a judge job before its first case: the interpreter, testcase.py and
+# the generated cases with their reference outputs, see job_deadline
+JOB_STARTUP = 10
 
-run_script = r"""
-import signal
-import sys
-from testcase import user_submission, test_cases
+dockerfile_script = r"""
+FROM python:3.10-slim-time
+WORKDIR /app
+COPY . /app
+"""
 
-# Timeout handler
-def timeout_handler(signum, frame):
-    raise TimeoutError("Timeout!")
 
-signal.signal(signal.SIGALRM, timeout_handler)
+def make_report(cases):
+    """Summarise the per case reports of judge/run.py.
+    real_time is the total time of the calls in seconds, ram the largest memory a
+    call needed in MB, the units of METRICS_VERSION (tables.py)."""
+
+    return {
+        "results": [case["message"] for case in cases],
+        "cases": cases,
+        "real_time": round(sum(case["time"] for case in cases), 4),
+        "ram": round(
+            max((case["memory"] for case in cases), default=0) / 1024 / 1024, 2
+        ),
+    }
+
+
+class FrameReader:
+    """Decode the frames the runner writes on stdout, as the bytes arrive.
+    The progress frames (one per judged case) go to on_progress(case), the last
+    frame holds the result."""
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self.buffer = b""
+        self.payload = None
+        self.error = None
+
+    def feed(self, data):
+        self.buffer += data
+
+        while self.error is None and len(self.buffer) >= FRAME_HEADER.size:
+            magic, version, length = FRAME_HEADER.unpack_from(self.buffer)
+            if magic != FRAME_MAGIC or version != FRAME_VERSION:
+                self.error = "Unknown result frame"
+                return
+
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                return
+
+            try:
+                payload = json.loads(
+                    self.buffer[FRAME_HEADER.size : end].decode("utf-8")
+                )
+            except ValueError:
+                self.error = "The submission crashed the sandbox"
+                return
+            self.buffer = self.buffer[end:]
 
-results = []
+            if "progress" not in payload:
+                self.payload = payload
+            elif self.on_progress is not None:
+                self.on_progress(payload["progress"])
 
-for i, case in enumerate(test_cases):
-    inputs, expected = case["input"], case["expected"]
-    try:
-        signal.alarm(5)
-        result = user_submission(*inputs)
-        signal.alarm(0)
+    def result(self):
+        if self.payload is not None:
+            return self.payload
+        return {"error": self.error or "The submission crashed the sandbox"}
 
-        if result == expected:
-            results.append(f"Case {i + 1}: Passed")
-        else:
-            if i < 3:
-                results.append(
-                    f"Case {i + 1}: Failed, Input: {inputs}, Expected: {expected}, Got: {result}"
-                )
-            else:
-                results.append(f"Case {i + 1}: Failed, Hidden Params")
 
-    except TimeoutError:
-        results.append(f"Case {i + 1}: Timeout!")
-    except Exception as e:
-        results.append(f"Case {i + 1}: Error {e}")
+def read_frame(data):
+    """Decode the result frame the runner wrote on stdout"""
 
-for r in results:
-    print(r)
-"""
+    reader = FrameReader()
+    reader.feed(data)
+    return reader.result()
 
-dockerfile_script = r"""
-FROM python:3.10-slim-time
-WORKDIR /app
-COPY . /app
-"""
 
+def error_report(message):
+    """The report of a submission that could not be loaded or ran over the deadline"""
+
+    return {
+        "results": [f"Error {message}"],
+        "cases": [],
+        "real_time": None,
+        "ram": None,
+    }
 
-def sandbox_eval(submission_id):
-    submission = Submission.query.get(submission_id)
-    problem = Problem.query.get(submission.problem_id)
 
-    # User's code
-    user_code = submission.code
+def to_report(payload):
+    if payload.get("error"):
+        return error_report(payload["error"])
+    return make_report(payload["cases"])
 
-    # Get the testcase path: e.g. /uploads/problem1/testcase.py
-    testcase_url = os.path.join(
+
+def docker_manager():
+    """The shared Docker client manager, see apis/docker_client.py"""
+
+    return get_docker(current_app.config if has_app_context() else None)
+
+
+def make_archive(files, folder="app"):
+    """Pack {filename: content} into an in-memory tar under folder/, for put_archive"""
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo(name=folder)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = int(time.time())
+        tar.addfile(info)
+
+        for name, content in files.items():
+            data = content.encode("utf-8")
+            info = tarfile.TarInfo(name=f"{folder}/{name}")
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+
+    return buffer.getvalue()
+
+
+def testcase_path(problem):
+    """The testcase path: e.g. uploads/problems/p1/testcase.py"""
+
+    return os.path.join(
         current_app.config["UPLOAD_FOLDER"], problem.folder_url, "testcase.py"
     )
 
-    # Create a unique folder in the UPLOAD_FOLDER
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    folder = os.path.join(current_app.config["UPLOAD_FOLDER"], timestamp)
-    os.mkdir(folder)
 
-    # Write submission.py
-    with open(os.path.join(folder, "submission.py"), "w") as f:
-        f.write(user_code)
+def declares_generators(testcase):
+    """Whether testcase.py assigns generators, see TestCases in judge/run.py"""
 
-    # Copy testcase.py
-    shutil.copy(testcase_url, os.path.join(folder, "testcase.py"))
+    try:
+        tree = ast.parse(testcase)
+    except SyntaxError:
+        return False
+
+    return any(
+        isinstance(target, ast.Name) and target.id == "generators"
+        for node in tree.body
+        if isinstance(node, (ast.Assign, ast.AnnAssign))
+        for target in (node.targets if isinstance(node, ast.Assign) else [node.target])
+    )
 
-    # Write run.py
-    with open(os.path.join(folder, "run.py"), "w") as f:
-        f.write(run_script)
 
-    # Write Dockerfile
-    with open(os.path.join(folder, "Dockerfile"), "w") as f:
-        f.write(dockerfile_script)
+def count_cases(testcase):
+    """Number of cases testcase.py declares: its test_cases and generators lists,
+    or comprehensions over a literal list. None if it builds them any other way."""
 
-    # Build a unique tag to avoid name collisions
-    image_tag = f"python-sandbox-{timestamp}"
+    try:
+        tree = ast.parse(testcase)
+    except SyntaxError:
+        return None
+
+    counts = {}
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            value = node.value
+            if isinstance(value, ast.ListComp) and len(value.generators) == 1:
+                loop = value.generators[0]
+                value = None if loop.ifs else loop.iter
+            if isinstance(value, (ast.List, ast.Tuple)):
+                counts[target.id] = len(value.elts)
+            else:
+                counts.pop(target.id, None)
 
-    client = docker.from_env()
+    if "test_cases" not in counts:
+        return None
+    return counts["test_cases"] + counts.get("generators", 0)
 
+
+def job_deadline(files, default):
+    """Seconds a judge job may run, at least default: the runner start-up, then
+    every case its whole limit or the budget (shard_deadline in judge/run.py), so
+    the runner reports each case before the job is killed"""
+
+    count = count_cases(files["testcase.py"])
+    if count is None:
+        return default
+
+    settings = {
+        "timeout": 5,
+        "budget": None,
+        **json.loads(files.get("judge.json", "{}")),
+    }
+    longest = max([settings["timeout"], *(settings.get("limits") or {}).values()])
+    limit = longest * (count + 1)
+    if settings["budget"] is not None:
+        limit = min(limit, settings["budget"] + longest)
+
+    # whole seconds, it is the CPU time limit of the local runner too
+    return max(default, math.ceil(limit + 1 + JOB_STARTUP))
+
+
+def problem_files(testcase_url, settings=None, reference=False):
+    """testcase.py, and the judge.json next to it if the problem has one,
+    settings replaces the judge.json, e.g. to calibrate the problem.
+    With reference, solution.py too if the problem has one, e.g. to check custom inputs.
+    """
+
+    with open(testcase_url, "r") as f:
+        files = {"testcase.py": f.read()}
+
+    # the expected outputs of the generated cases come from the reference solution
+    solution_url = os.path.join(os.path.dirname(testcase_url), "solution.py")
+    if declares_generators(files["testcase.py"]) or (
+        reference and os.path.exists(solution_url)
+    ):
+        with open(solution_url, "r") as f:
+            files["solution.py"] = f.read()
+
+    if settings is not None:
+        files["judge.json"] = json.dumps(settings)
+        return files
+
+    settings_url = os.path.join(os.path.dirname(testcase_url), "judge.json")
+    if os.path.exists(settings_url):
+        with open(settings_url, "r") as f:
+            files["judge.json"] = f.read()
+
+    return files
+
+
+def judge_settings(testcase_url):
+    """The judge.json of the problem as a dict, empty if it has none"""
+
+    settings_url = os.path.join(os.path.dirname(testcase_url), "judge.json")
+    if not os.path.exists(settings_url):
+        return {}
+
+    with open(settings_url, "r") as f:
+        return json.load(f)
+
+
+def parse_judge_settings(content):
+    """Check an uploaded judge.json, raise ValueError if it is not valid"""
+
+    settings = json.loads(content)
+    if not isinstance(settings, dict):
+        raise ValueError("judge.json must be an object")
+
+    unknown = set(settings) - set(JUDGE_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown settings {', '.join(sorted(unknown))}")
+
+    if settings.get("policy", "all") not in JUDGE_POLICIES:
+        raise ValueError(f"policy must be one of {', '.join(JUDGE_POLICIES)}")
+
+    if not isinstance(settings.get("parallel", False), bool):
+        raise ValueError("parallel must be true or false")
+
+    for key in [
+        "max_timeouts",
+        "timeout",
+        "budget",
+        "workers",
+        "analysis_budget",
+        "profile_budget",
+    ]:
+        value = settings.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{key} must be a positive number")
+
+    values = settings.get("ladder")
+    if values is not None and (
+        not isinstance(values, list)
+        or not all(isinstance(value, (int, float)) and value > 0 for value in values)
+    ):
+        raise ValueError("ladder must be a list of positive numbers")
+
+    # the calibrated seconds of each case, by the hash of the case
+    for key in ["limits", "reference"]:
+        values = settings.get(key)
+        if values is not None and (
+            not isinstance(values, dict)
+            or not all(
+                isinstance(value, (int, float)) and value > 0
+                for value in values.values()
+            )
+        ):
+            raise ValueError(f"{key} must map case hashes to positive numbers")
+
+    return settings
+
+
+def follow_container(manager, container, on_progress=None, on_cancel=None):
+    """Read the frames of a started container as it writes them, until it exits,
+    return the payload of the result frame. on_cancel(kill) is given how to kill it."""
+
+    if on_cancel is not None:
+        on_cancel(container.kill)
+
+    reader = FrameReader(on_progress)
     try:
-        # Build the image
-        image, build_logs = client.images.build(
-            path=os.path.abspath(folder), tag=image_tag
-        )
+        with manager.call("attach"):
+            output = container.attach(stdout=True, stderr=False, stream=True, logs=True)
+        for chunk in output:
+            reader.feed(chunk)
+    except docker.errors.APIError:
+        # it exited before the attach, its output is in the logs
+        reader = FrameReader(on_progress)
+        with manager.call("logs"):
+            reader.feed(container.logs(stdout=True, stderr=False))
+
+    with manager.call("wait"):
+        container.wait()
+    return reader.result()
+
+
+def run_prebuilt(
+    files,
+    image,
+    command,
+    cpus=None,
+    mem_limit="1g",
+    on_progress=None,
+    on_cancel=None,
+):
+    """Run command in a fresh container of the pre-built image with the files
+    copied into /app, return the payload of the result frame.
+    on_progress(case) gets the cases as they are judged, see follow_container."""
+
+    manager = docker_manager()
+    client = manager.client()
+    container = None
+
+    try:
+        with manager.call("create"):
+            container = client.containers.create(
+                image=image,
+                command=command,
+                working_dir="/app",
+                cpuset_cpus=cpus,
+                mem_limit=mem_limit,
+            )
+
+        # copy the files into /app before the container starts
+        with manager.call("put_archive"):
+            container.put_archive("/", make_archive(files))
+        with manager.call("start"):
+            container.start()
+
+        # stdout only holds the frames of the runner
+        return follow_container(manager, container, on_progress, on_cancel)
+    finally:
+        if container is not None:
+            try:
+                with manager.call("remove"):
+                    container.remove(force=True)
+            except docker.errors.APIError:
+                pass
+
+
+def stream_hooks(stream):
+    """(on_progress, on_cancel) of a judge stream (apis/judge_stream.py), or Nones"""
+
+    if stream is None:
+        return None, None
+    return stream.add_case, stream.on_cancel
+
+
+def prebuilt_image_eval(
+    user_code, testcase_url, image, cpus=None, mem_limit="1g", stream=None
+):
+    """Run the submission in a fresh container of the pre-built image.
+    The files are copied in with put_archive, so no image is built and
+    nothing needs to be shared with the docker host."""
+
+    files = {
+        "submission.py": user_code,
+        "run.py": run_script,
+        **problem_files(testcase_url),
+    }
 
-        # Run the container using time + memory usage
-        # /usr/bin/time -p logs real/user/sys lines
-        # then cat memory usage from cgroup
-        command_str = (
-            "sh -c '/usr/bin/time -p python3 run.py && "
-            "echo memory $(cat /sys/fs/cgroup/memory/memory.usage_in_bytes 2>/dev/null || cat /sys/fs/cgroup/memory.current)'"
+    try:
+        payload = run_prebuilt(
+            files, image, command_str, cpus, mem_limit, *stream_hooks(stream)
         )
+        return True, to_report(payload)
+    except Exception as e:
+        return False, str(e)
 
-        container = client.containers.run(
-            image=image_tag,
-            command=command_str,
-            stdout=True,
-            stderr=True,
-            detach=True,
-            mem_limit="1g",
+
+def pool_eval(user_code, testcase_url, config, cpus=None, stream=None):
+    """Run the submission in a warm container of the sandbox pool,
+    the judge agent forks a fresh child for it (see apis/sandbox_pool.py)."""
+
+    on_progress, on_cancel = stream_hooks(stream)
+
+    try:
+        files = problem_files(testcase_url)
+        pool = get_pool(config, modules={"run": run_script})
+        reply = pool.run(
+            {"submission.py": user_code, **files},
+            cpus=cpus,
+            deadline=job_deadline(files, config.get("SANDBOX_POOL_JOB_DEADLINE", 60)),
+            on_progress=on_progress,
+            on_cancel=on_cancel,
         )
+    except Exception as e:
+        return False, str(e)
 
-        # Wait for it to finish and fetch logs
-        container.wait()
-        logs = container.logs().decode("utf-8", errors="replace")
+    return True, to_report(reply)
+
+
+def batch_reports(codes, payload):
+    """{submission_id: report} from the payload of run_batch"""
 
-        # print the logs
-        # example: Case 0: Passed\nCase 1: Passed\nCase 2: Passed\nreal 0.05\nuser 0.02\nsys 0.00\n1499136\n
-        # extract the "real 0.05" and "1499136" lines
-        # print(logs)
+    # testcase.py itself failed, the same for every submission
+    if payload.get("error"):
+        return {key: error_report(payload["error"]) for key in codes}
 
-        # extract the Cases sentence, real time, and memory usage
-        output = re.findall(r"Case \d+.*", logs)
+    reports = payload.get("submissions", {})
+    return {key: to_report(reports.get(key, {"error": "Not judged"})) for key in codes}
 
-        real_time = re.search(r"real\s+(\d+\.\d+)", logs)
-        real_time = float(real_time.group(1)) if real_time else None
 
-        # ram is the last line
-        mem_match = re.search(r"memory\s+(\d+)", logs)
-        ram = int(mem_match.group(1)) / 1024 / 1024 if mem_match else None
-        ram = round(ram, 2) if ram else None
+def batch_eval(
+    codes, testcase_url, config, cpus=None, mem_limit="1g", settings=None, known=None
+):
+    """Judge the {submission_id: code} submissions in one sandbox, testcase.py is
+    imported once for all of them (run_batch in judge/run.py).
+    settings replaces the judge.json of the problem, see problem_files.
+    known ({submission_id: {case hash: report}}) holds the stored outcomes of the
+    cases that did not change, they are not run again.
+    Return (True, {submission_id: report}) or (False, error)."""
 
-        # remove the container, image, and folder
-        container.remove()
-        client.images.remove(image=image_tag, force=True)
-        shutil.rmtree(folder)
+    codes = {str(key): code for key, code in codes.items()}
+    known = {str(key): cases for key, cases in (known or {}).items()}
 
-        return True, output, real_time, ram
+    try:
+        if config.get("SANDBOX_MODE") == "pool":
+            files = problem_files(testcase_url, settings)
+            deadline = job_deadline(files, config.get("SANDBOX_POOL_JOB_DEADLINE", 60))
+            pool = get_pool(config, modules={"run": run_script})
+            payload = pool.run(
+                files,
+                cpus=cpus,
+                deadline=deadline * len(codes),
+                submissions=codes,
+                known=known,
+            )
+        else:
+            # the build mode images are based on the pre-built image too
+            files = {
+                "run.py": run_script,
+                "submissions.json": json.dumps(codes),
+                "known.json": json.dumps(known),
+                **problem_files(testcase_url, settings),
+            }
+            payload = run_prebuilt(
+                files,
+                config["SANDBOX_IMAGE"],
+                "python3 run.py --batch",
+                cpus,
+                mem_limit,
+            )
     except Exception as e:
-        # If build or run failed, return error info
-        return False, str(e), None, None
+        return False, str(e)
+
+    return True, batch_reports(codes, payload)
+
+
+def build_image_eval(
+    user_code, testcase_url, staging_dir=None, cpus=None, mem_limit="1g", stream=None
+):
+    """Build a temporary image containing the submission, then run it.
+    Slower than prebuilt_image_eval, kept for hosts without the pre-built image."""
+
+    files = {
+        "submission.py": user_code,
+        **problem_files(testcase_url),
+        "run.py": run_script,
+        "Dockerfile": dockerfile_script,
+    }
+
+    # Build a unique tag to avoid name collisions
+    image_tag = f"python-sandbox-{uuid.uuid4().hex}"
+
+    container = None
+    image = None
+
+    # the job folder, the container and the image are removed on every path
+    with staged_job(files, staging_dir) as folder:
+        try:
+            manager = docker_manager()
+            client = manager.client()
+
+            # Build the image
+            with manager.call("build"):
+                image, build_logs = client.images.build(path=folder, tag=image_tag)
+
+            with manager.call("run"):
+                container = client.containers.run(
+                    image=image_tag,
+                    command=command_str,
+                    stdout=True,
+                    stderr=True,
+                    detach=True,
+                    cpuset_cpus=cpus,
+                    mem_limit=mem_limit,
+                )
+
+            # stdout only holds the frames of the runner
+            payload = follow_container(manager, container, *stream_hooks(stream))
+            return True, to_report(payload)
+        except Exception as e:
+            # If build or run failed, return error info
+            return False, str(e)
+        finally:
+            if container is not None:
+                try:
+                    with manager.call("remove"):
+                        container.remove(force=True)
+                except docker.errors.APIError:
+                    pass
+            if image is not None:
+                try:
+                    with manager.call("remove_image"):
+                        client.images.remove(image=image_tag, force=True)
+                except docker.errors.APIError:
+                    pass
+
+
+def samples_report(payload):
+    """The report of the sample cases, with the custom inputs of the user"""
+
+    report = to_report(payload)
+    report["custom"] = payload.get("custom", [])
+    return report
+
+
+def tool_payload(payload, key):
+    """(True, payload[key]) from the payload of run_analysis (points) or run_profile
+    (profile), or (False, error)"""
+
+    if payload.get("error"):
+        return False, payload["error"]
+    return True, payload[key]
+
+
+class DockerExecutor:
+    """Judge in docker containers, in the SANDBOX_MODE of the config"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def judge(self, user_code, testcase_url, cpus=None, mem_limit="1g", stream=None):
+        config = self.config
+        mode = config.get("SANDBOX_MODE", "prebuilt")
+
+        if mode == "pool":
+            return pool_eval(user_code, testcase_url, config, cpus, stream)
+
+        if mode == "build":
+            return build_image_eval(
+                user_code,
+                testcase_url,
+                config.get("SANDBOX_STAGING_DIR"),
+                cpus,
+                mem_limit,
+                stream,
+            )
+
+        return prebuilt_image_eval(
+            user_code, testcase_url, config["SANDBOX_IMAGE"], cpus, mem_limit, stream
+        )
+
+    def judge_batch(
+        self, codes, testcase_url, cpus=None, mem_limit="1g", settings=None, known=None
+    ):
+        return batch_eval(
+            codes, testcase_url, self.config, cpus, mem_limit, settings, known
+        )
+
+    def run_tool(self, user_code, testcase_url, mode, settings, cpus, mem_limit):
+        """Run `run.py --<mode>` on the submission, mode is analyse or profile"""
+
+        config = self.config
+        files = {"submission.py": user_code, **problem_files(testcase_url, settings)}
+
+        if config.get("SANDBOX_MODE") == "pool":
+            pool = get_pool(config, modules={"run": run_script})
+            return pool.run(
+                files,
+                cpus=cpus,
+                deadline=config.get("SANDBOX_POOL_JOB_DEADLINE", 60),
+                **{mode: True},
+            )
+
+        return run_prebuilt(
+            {"run.py": run_script, **files},
+            config["SANDBOX_IMAGE"],
+            f"python3 run.py --{mode}",
+            cpus,
+            mem_limit,
+        )
+
+    def analyse(self, user_code, testcase_url, cpus=None, mem_limit="1g", budget=10):
+        settings = {"analysis_budget": budget, **judge_settings(testcase_url)}
+
+        try:
+            payload = self.run_tool(
+                user_code, testcase_url, "analyse", settings, cpus, mem_limit
+            )
+        except Exception as e:
+            return False, str(e)
+
+        return tool_payload(payload, "points")
+
+    def profile(self, user_code, testcase_url, cpus=None, mem_limit="1g", budget=10):
+        settings = {"profile_budget": budget, **judge_settings(testcase_url)}
+
+        try:
+            payload = self.run_tool(
+                user_code, testcase_url, "profile", settings, cpus, mem_limit
+            )
+        except Exception as e:
+            return False, str(e)
+
+        return tool_payload(payload, "profile")
+
+    def run_samples(self, user_code, testcase_url, inputs, cpus=None, mem_limit="1g"):
+        config = self.config
+        files = {
+            "submission.py": user_code,
+            **problem_files(testcase_url, reference=True),
+        }
+
+        try:
+            # a warm container is the fastest, otherwise a fresh one
+            if config.get("SANDBOX_MODE") == "pool":
+                pool = get_pool(config, modules={"run": run_script})
+                payload = pool.run(
+                    files,
+                    cpus=cpus,
+                    deadline=config.get("SANDBOX_POOL_JOB_DEADLINE", 60),
+                    samples=inputs,
+                )
+            else:
+                files["run.py"] = run_script
+                files["inputs.json"] = json.dumps(inputs)
+                payload = run_prebuilt(
+                    files,
+                    config["SANDBOX_IMAGE"],
+                    "python3 run.py --samples",
+                    cpus,
+                    mem_limit,
+                )
+        except Exception as e:
+            return False, str(e)
+
+        return True, samples_report(payload)
+
+
+class LocalExecutor:
+    """Judge in local subprocesses with resource limits, no docker needed"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def run(self, files, args, cpus, mem_limit, deadline, stream=None):
+        on_progress, on_cancel = stream_hooks(stream)
+        reader = FrameReader(on_progress)
+        stdout = run_local(
+            files,
+            args,
+            cpus,
+            mem_limit,
+            deadline,
+            self.config.get("SANDBOX_STAGING_DIR"),
+            reader.feed,
+            on_cancel,
+        )
+        return {"error": "Timeout!"} if stdout is None else reader.result()
+
+    def judge(self, user_code, testcase_url, cpus=None, mem_limit="1g", stream=None):
+        files = {
+            "submission.py": user_code,
+            "run.py": run_script,
+            **problem_files(testcase_url),
+        }
+        deadline = job_deadline(files, self.config.get("SANDBOX_LOCAL_DEADLINE", 60))
+
+        try:
+            payload = self.run(files, (), cpus, mem_limit, deadline, stream)
+            return True, to_report(payload)
+        except Exception as e:
+            return False, str(e)
+
+    def judge_batch(
+        self, codes, testcase_url, cpus=None, mem_limit="1g", settings=None, known=None
+    ):
+        codes = {str(key): code for key, code in codes.items()}
+        known = {str(key): cases for key, cases in (known or {}).items()}
+        files = {
+            "run.py": run_script,
+            "submissions.json": json.dumps(codes),
+            "known.json": json.dumps(known),
+            **problem_files(testcase_url, settings),
+        }
+        deadline = job_deadline(files, self.config.get("SANDBOX_LOCAL_DEADLINE", 60))
+        deadline *= len(codes)
+
+        try:
+            payload = self.run(files, ("--batch",), cpus, mem_limit, deadline)
+        except Exception as e:
+            return False, str(e)
+
+        return True, batch_reports(codes, payload)
+
+    def run_tool(self, user_code, testcase_url, mode, settings, cpus, mem_limit):
+        """Run `run.py --<mode>` on the submission, mode is analyse or profile"""
+
+        files = {
+            "submission.py": user_code,
+            "run.py": run_script,
+            **problem_files(testcase_url, settings),
+        }
+        deadline = self.config.get("SANDBOX_LOCAL_DEADLINE", 60)
+        return self.run(files, (f"--{mode}",), cpus, mem_limit, deadline)
+
+    def analyse(self, user_code, testcase_url, cpus=None, mem_limit="1g", budget=10):
+        settings = {"analysis_budget": budget, **judge_settings(testcase_url)}
+
+        try:
+            payload = self.run_tool(
+                user_code, testcase_url, "analyse", settings, cpus, mem_limit
+            )
+        except Exception as e:
+            return False, str(e)
+
+        return tool_payload(payload, "points")
+
+    def profile(self, user_code, testcase_url, cpus=None, mem_limit="1g", budget=10):
+        settings = {"profile_budget": budget, **judge_settings(testcase_url)}
+
+        try:
+            payload = self.run_tool(
+                user_code, testcase_url, "profile", settings, cpus, mem_limit
+            )
+        except Exception as e:
+            return False, str(e)
+
+        return tool_payload(payload, "profile")
+
+    def run_samples(self, user_code, testcase_url, inputs, cpus=None, mem_limit="1g"):
+        files = {
+            "submission.py": user_code,
+            "run.py": run_script,
+            "inputs.json": json.dumps(inputs),
+            **problem_files(testcase_url, reference=True),
+        }
+        deadline = self.config.get("SANDBOX_LOCAL_DEADLINE", 60)
+
+        try:
+            payload = self.run(files, ("--samples",), cpus, mem_limit, deadline)
+        except Exception as e:
+            return False, str(e)
+
+        return True, samples_report(payload)
+
+
+EXECUTORS = {"docker": DockerExecutor, "local": LocalExecutor}
+
+
+def get_executor(config):
+    """The executor of SANDBOX_EXECUTOR, "docker" (default) or "local" """
+
+    name = config.get("SANDBOX_EXECUTOR", "docker")
+    if name not in EXECUTORS:
+        raise ValueError(f"Unknown SANDBOX_EXECUTOR {name}")
+
+    return EXECUTORS[name](config)
+
+
+def sandbox_eval(submission_id, slot=None, stream=None):
+    """Judge a submission, slot is the judge slot (cpus and memory limit) running it.
+    The cases are fed to the stream as they are judged, see apis/judge_stream.py.
+    Return (True, report), see make_report, or (False, error) if the sandbox failed."""
+
+    submission = Submission.query.get(submission_id)
+    problem = Problem.query.get(submission.problem_id)
+
+    config = current_app.config
+    cpus = slot.cpus if slot else None
+    mem_limit = slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g")
+
+    return get_executor(config).judge(
+        submission.code, testcase_path(problem), cpus, mem_limit, stream
+    )
@@ -0,0 +1,124 @@
+"""
+Runs the judge runner as a local subprocess, without docker (SANDBOX_EXECUTOR = "local").
+
+Much faster than a container, but weaker isolation, so only for trusted or
+internal workloads, the tests and the CI benchmarks:
+
+- The job files are staged in a unique tmpfs folder, see apis/sandbox_staging.py.
+- The child gets a stripped environment, its own session, and resource limits:
+  address space (the slot memory), CPU time, file size, open files, no core dumps.
+- Where the kernel allows it, the child enters new user and network namespaces,
+  so the submission has no network.
+- The child is pinned to the slot cpus, like the docker containers.
+"""
+
+import os
+import resource
+import select
+import signal
+import subprocess
+import sys
+import time
+
+from docker.utils import parse_bytes
+
+from apis.sandbox_staging import staged_job
+
+ENV = {
+    "PATH": "/usr/local/bin:/usr/bin:/bin",
+    "LANG": "C.UTF-8",
+    "PYTHONIOENCODING": "utf-8",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+
+# bytes a submission may write to a file, and files it may open
+FILE_SIZE_LIMIT = 16 * 1024 * 1024
+OPEN_FILES_LIMIT = 64
+
+
+def limit_child(cpus, mem_limit, cpu_seconds):
+    """Returns the preexec_fn of the child, it runs after the fork, before python starts"""
+
+    def preexec():
+        resource.setrlimit(resource.RLIMIT_AS, (mem_limit, mem_limit))
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (FILE_SIZE_LIMIT, FILE_SIZE_LIMIT))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (OPEN_FILES_LIMIT, OPEN_FILES_LIMIT))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+        if cpus:
+            os.sched_setaffinity(0, {int(cpu) for cpu in cpus.split(",")})
+
+        # python 3.12+, and only where unprivileged namespaces are enabled
+        if hasattr(os, "unshare"):
+            try:
+                os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNET)
+            except OSError:
+                pass
+
+    return preexec
+
+
+def run_local(
+    files,
+    args=(),
+    cpus=None,
+    mem_limit="1g",
+    deadline=60,
+    staging_dir=None,
+    on_output=None,
+    on_cancel=None,
+):
+    """Run `python run.py *args` with the files, return its stdout (the result frame),
+    or None if it ran over the deadline.
+    on_output(chunk) gets the stdout as it is written, on_cancel(kill) is given
+    how to kill the child and whatever it started."""
+
+    with staged_job(files, staging_dir) as folder:
+        process = subprocess.Popen(
+            # -E ignores the PYTHON* variables, -s the user site-packages
+            [sys.executable, "-E", "-s", "run.py", *args],
+            cwd=folder,
+            env=ENV,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            preexec_fn=limit_child(cpus, parse_bytes(mem_limit), deadline),
+        )
+
+        def kill():
+            # the child is the leader of its session, kill whatever it left behind
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+        if on_cancel is not None:
+            on_cancel(kill)
+
+        stdout = b""
+        end = time.monotonic() + deadline
+        try:
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    stdout = None
+                    break
+
+                ready, _, _ = select.select([process.stdout], [], [], remaining)
+                if not ready:
+                    continue
+
+                chunk = os.read(process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                stdout += chunk
+                if on_output is not None:
+                    on_output(chunk)
+        finally:
+            kill()
+            process.stdout.close()
+            process.wait()
+
+    return stdout
@@ -0,0 +1,323 @@
+"""
+Keeps a pool of warm sandbox containers, each running the judge agent (judge/agent.py).
+
+- The containers are started once and locked down (no network, read-only root,
+  no capabilities, limited pids and memory).
+- A submission is sent to an idle container, the agent forks a fresh child for it,
+  so neither the container start nor the Python startup is on the hot path.
+- The containers are grouped in lanes, one per judge slot (cpuset), so a
+  submission runs on the cores of the slot that picked it up.
+- A container is recycled after max_jobs submissions, or when it fails a health check.
+"""
+
+import atexit
+import json
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+
+from apis.docker_client import get_docker
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(BASE_DIR, "judge", "agent.py"), "r") as f:
+    agent_script = f.read()
+
+
+class SandboxError(Exception):
+    pass
+
+
+class WarmContainer:
+    """One sandbox container with the agent attached over stdin/stdout"""
+
+    def __init__(self, manager, image, modules, cpus=None, mem_limit="1g"):
+        self.jobs = 0
+        self.buffer = b""
+        self.cpus = cpus
+        self.manager = manager
+
+        client = manager.client()
+        with manager.call("create"):
+            self.container = client.containers.create(
+                image=image,
+                command=["python3", "-u", "-c", agent_script],
+                stdin_open=True,
+                working_dir="/tmp",
+                user="nobody",
+                network_disabled=True,
+                read_only=True,
+                tmpfs={"/tmp": "rw,size=64m"},
+                cpuset_cpus=cpus,
+                mem_limit=mem_limit,
+                pids_limit=64,
+                cap_drop=["ALL"],
+                security_opt=["no-new-privileges"],
+            )
+
+        try:
+            # attach before the start, so no output is missed
+            with manager.call("attach"):
+                self.socket = client.api.attach_socket(
+                    self.container.id, params={"stdin": 1, "stdout": 1, "stream": 1}
+                )
+            self.raw = getattr(self.socket, "_sock", self.socket)
+            with manager.call("start"):
+                self.container.start()
+            self.request({"modules": modules}, timeout=30)
+        except Exception:
+            self.close()
+            raise
+
+    def recv_exactly(self, n, deadline):
+        data = b""
+        while len(data) < n:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SandboxError("Sandbox did not answer in time")
+
+            ready, _, _ = select.select([self.raw], [], [], remaining)
+            if not ready:
+                continue
+
+            chunk = self.raw.recv(n - len(data))
+            if not chunk:
+                raise SandboxError("Sandbox closed the connection")
+            data += chunk
+        return data
+
+    def request(self, message, timeout, on_progress=None):
+        """Send one JSON line to the agent and wait for its reply line back.
+        The progress lines sent before the reply go to on_progress(case)."""
+
+        self.raw.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+        # the attach stream is multiplexed: 8 bytes header (stream, size) + payload
+        deadline = time.monotonic() + timeout
+        while True:
+            while b"\n" not in self.buffer:
+                header = self.recv_exactly(8, deadline)
+                size = int.from_bytes(header[4:], "big")
+                payload = self.recv_exactly(size, deadline)
+                if header[0] == 1:
+                    self.buffer += payload
+
+            line, _, self.buffer = self.buffer.partition(b"\n")
+            reply = json.loads(line)
+            if "progress" not in reply:
+                return reply
+            if on_progress is not None:
+                on_progress(reply["progress"])
+
+    def is_healthy(self):
+        try:
+            with self.manager.call("reload"):
+                self.container.reload()
+            if self.container.status != "running":
+                return False
+            return self.request({"ping": True}, timeout=5).get("pong") is True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+        try:
+            with self.manager.call("remove"):
+                self.container.remove(force=True)
+        except Exception:
+            pass
+
+
+class SandboxPool:
+    def __init__(
+        self,
+        manager,
+        image,
+        size=1,
+        max_jobs=50,
+        health_interval=30,
+        modules=None,
+        mem_limit="1g",
+    ):
+        # the shared Docker client, see apis/docker_client.py
+        self.manager = manager
+        self.image = image
+        self.size = size
+        self.max_jobs = max_jobs
+        self.health_interval = health_interval
+        self.modules = modules or {}
+        self.mem_limit = mem_limit
+
+        # cpus -> idle containers, and cpus -> number of live containers
+        self.lanes = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.health_thread = threading.Thread(target=self.health_loop, daemon=True)
+        self.health_thread.start()
+
+    def lane(self, cpus):
+        """The idle containers pinned to cpus, topped up to the pool size"""
+
+        with self.lock:
+            if cpus not in self.lanes:
+                self.lanes[cpus] = queue.Queue()
+                self.counts[cpus] = 0
+
+        # raise straight away if the docker cannot start a container
+        while self.counts[cpus] < self.size:
+            self.add_container(cpus)
+
+        return self.lanes[cpus]
+
+    def add_container(self, cpus):
+        container = WarmContainer(
+            self.manager, self.image, self.modules, cpus, self.mem_limit
+        )
+        with self.lock:
+            self.counts[cpus] += 1
+        self.lanes[cpus].put(container)
+
+    def discard(self, container):
+        container.close()
+        with self.lock:
+            self.counts[container.cpus] -= 1
+
+    def replace(self, container):
+        self.discard(container)
+        if self.closed:
+            return
+
+        try:
+            self.add_container(container.cpus)
+        except Exception:
+            # the docker may be busy, the health loop will top the lane up again
+            pass
+
+    def release(self, container):
+        if container.jobs >= self.max_jobs:
+            self.replace(container)
+        else:
+            self.lanes[container.cpus].put(container)
+
+    def run(
+        self,
+        files,
+        cpus=None,
+        timeout=5,
+        deadline=60,
+        memory=512 * 1024 * 1024,
+        submissions=None,
+        known=None,
+        analyse=False,
+        profile=False,
+        samples=None,
+        on_progress=None,
+        on_cancel=None,
+    ):
+        """Judge one submission in a warm container of the cpus lane, return the agent reply.
+        With submissions ({id: code}), judge all of them against the files in one job,
+        known ({id: {case hash: report}}) holds their stored outcomes, see run_batch.
+        With analyse, time the submission at growing input sizes instead, see run_analysis,
+        with profile, trace it line by line on its largest case, see run_profile.
+        With samples (custom inputs), only run the sample cases, see run_samples.
+        on_progress(case) gets each case as it is judged, on_cancel(kill) is given
+        how to stop the job: the container is closed, and replaced.
+        """
+
+        try:
+            container = self.lane(cpus).get(timeout=deadline)
+        except queue.Empty:
+            raise SandboxError("No sandbox is available, please try again later")
+
+        try:
+            job = {
+                "id": uuid.uuid4().hex,
+                "files": files,
+                "timeout": timeout,
+                "deadline": deadline,
+                "memory": memory,
+            }
+            if submissions is not None:
+                job["submissions"] = submissions
+            if known:
+                job["known"] = known
+            if analyse:
+                job["analyse"] = True
+            if profile:
+                job["profile"] = True
+            if samples is not None:
+                job["samples"] = samples
+            if on_cancel is not None:
+                on_cancel(container.close)
+            result = container.request(job, deadline + 10, on_progress)
+            container.jobs += 1
+        except Exception:
+            self.replace(container)
+            raise
+
+        self.release(container)
+        return result
+
+    def health_loop(self):
+        while not self.closed:
+            time.sleep(self.health_interval)
+
+            for cpus, idle in list(self.lanes.items()):
+                # check the idle containers, busy ones are checked by their job
+                for _ in range(idle.qsize()):
+                    try:
+                        container = idle.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    if container.is_healthy():
+                        idle.put(container)
+                    else:
+                        self.replace(container)
+
+                # top the lane up if a replacement failed earlier
+                for _ in range(self.size - self.counts[cpus]):
+                    try:
+                        self.add_container(cpus)
+                    except Exception:
+                        break
+
+    def close(self):
+        self.closed = True
+        for idle in list(self.lanes.values()):
+            while True:
+                try:
+                    self.discard(idle.get_nowait())
+                except queue.Empty:
+                    break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config, modules):
+    """Create the process-wide pool on first use"""
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(
+                manager=get_docker(config),
+                image=config["SANDBOX_IMAGE"],
+                size=config.get("SANDBOX_POOL_SIZE", 1),
+                max_jobs=config.get("SANDBOX_POOL_MAX_JOBS", 50),
+                health_interval=config.get("SANDBOX_POOL_HEALTH_INTERVAL", 30),
+                modules=modules,
+                mem_limit=config.get("JUDGE_SLOT_MEMORY", "1g"),
+            )
+            atexit.register(_pool.close)
+    return _pool
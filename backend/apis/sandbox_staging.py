@@ -0,0 +1,62 @@
+"""
+Stages the files of a judge job (submission.py, testcase.py, run.py, ...) in a
+unique folder on a tmpfs, for the sandbox modes that need them on the filesystem.
+
+- Each job gets its own folder (mkdtemp), so concurrent jobs never collide.
+- The folder lives in memory (/dev/shm) when available, so there is no disk I/O.
+- The folder is always removed when the job ends, whatever happens inside.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+PREFIX = "judge-"
+
+
+def staging_root(root=None):
+    """The configured root, else /dev/shm when writable, else the system temp folder"""
+
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+
+    return tempfile.gettempdir()
+
+
+@contextmanager
+def staged_job(files, root=None):
+    """Write {filename: content} to a new job folder, yield its path, then remove it"""
+
+    folder = tempfile.mkdtemp(prefix=PREFIX, dir=staging_root(root))
+    try:
+        for name, content in files.items():
+            with open(os.path.join(folder, name), "w") as f:
+                f.write(content)
+
+        yield folder
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def remove_stale_jobs(root=None, max_age=3600):
+    """Remove the job folders left behind by a crashed process"""
+
+    root = staging_root(root)
+    now = time.time()
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not name.startswith(PREFIX) or not os.path.isdir(path):
+            continue
+
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
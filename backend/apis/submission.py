@@ -2,20 +2,38 @@
 Provides API endpoints for handling code submissions, including creation, evaluation, retrieval, and ranking.
 
 Routes:
-- POST /submission/<problem_id>: Submit a solution for a problem. Triggers sandbox evaluation. Requires token.
-- GET /submission/<submission_id>: Retrieve a specific submission and previous attempts. Requires token.
+- POST /submission/run/<problem_id>: Run the code on the sample cases and on custom inputs, checked against the reference solution, on a judge slot ahead of the queued submissions. Nothing is stored, the result is returned straight away. Requires token.
+- POST /submission/<problem_id>: Submit a solution for a problem. Queues the sandbox evaluation and returns the pending submission, or returns the finished submission when the same code was judged before. Requires token.
+- GET /submission/<submission_id>: Retrieve a specific submission and previous attempts, poll it until the status is finished or error. Requires token.
+- GET /submission/<submission_id>/stream: Server-Sent Events of the verdict of each case as soon as it is judged, then the finished submission, 503 past STREAM_WORKERS open streams. Requires token, in the header or the token query argument (EventSource can not set headers).
+- POST /submission/<submission_id>/cancel: Cancel a pending or running submission, a running sandbox is killed at once. Requires token.
 - GET /submission/user/<problem_id>: Get all submissions of the user for a specific problem. Requires token.
-- GET /submission/ranking/<submission_id>: Get RAM and time performance rankings for a passed submission. Requires token.
+- GET /submission/ranking/<submission_id>: Get RAM and time performance rankings for a passed submission, its estimated complexity next to the reference solution, and its line profile. Requires token.
 - GET /submission/all: Retrieve all submissions made by the current user. Requires token.
 """
 
 from flask_restx import Namespace, Resource, fields
-from flask import abort, request, current_app
+from flask import abort, request, current_app, Response, stream_with_context
+from sqlalchemy.orm import defer, selectinload
 import os
 import ast
+import json
+import threading
+import time
+from functools import partial
 from tables import *
 from apis.header import auth_parser
-from apis.sandbox import sandbox_eval
+from apis.judge_queue import queue_position, queue_measure, cancel_submission
+from apis.judge_stream import get_stream, cancel_stream
+from apis.judge_cache import apply_cached_result
+from apis.complexity import queue_analysis
+from apis.profiling import queue_profile
+from apis.ranking import ranking
+from apis.user_best import record_result
+from apis.sandbox import error_report, get_executor, testcase_path
+
+# the listings of submissions do not load their large reports, see Submission.to_dict
+SUMMARY = [defer(getattr(Submission, key)) for key in Submission.DETAILS]
 
 api = Namespace(
     "submission",
@@ -30,6 +48,148 @@ submission_model = api.model(
 )
 
 
+# Sample Run Model, the inputs are lists of arguments, e.g. [[[2, 7, 11, 15], 9]]
+run_model = api.model(
+    "SampleRun",
+    {"code": fields.String(required=True, description="The code to run")},
+)
+
+# seconds a sample run waits for a judge slot
+SAMPLE_RUN_WAIT = 5
+
+# bytes of JSON of the custom inputs of a sample run
+SAMPLE_RUN_INPUT_SIZE = 10 * 1024
+
+
+# seconds between two keep-alive comments of the event stream, and between two
+# looks at the database while the submission is not judged in this process
+STREAM_KEEPALIVE = 15
+STREAM_POLL = 0.5
+
+# a submission in these states may still change
+UNFINISHED = [SubmissionStatusEnum.pending, SubmissionStatusEnum.running]
+
+
+# One Server-Sent Event
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# The submission of the token user (or any for an admin), abort otherwise
+def get_own_submission(token, submission_id):
+    # the logged out users have no token
+    user = User.query.filter_by(token=token).first() if token else None
+    if user is None:
+        abort(401, "Unauthorized")
+
+    submission = Submission.query.get(submission_id)
+    if submission is None:
+        abort(404, "Submission not found")
+
+    if user.role != UserEnum.admin and user.user_id != submission.user_id:
+        abort(401, "You are not authorized to view this submission")
+
+    return submission
+
+
+# The events of a submission: its status while it waits, each case as it is judged,
+# the cases judged elsewhere (another process, the cache) and the finished submission
+def submission_events(submission_id):
+    sent = set()
+    waited = 0.0
+
+    while True:
+        stream = get_stream(submission_id)
+        if stream is not None:
+            cases, done = stream.wait(len(sent), STREAM_KEEPALIVE)
+            for case in cases:
+                sent.add(case["case"])
+                yield sse("case", case)
+            if done:
+                break
+            if not cases:
+                yield ": keep-alive\n\n"
+            continue
+
+        # not judged in this process (yet), look at the database, in a new
+        # read transaction to see what the worker stored
+        db.session.rollback()
+        submission = Submission.query.get(submission_id)
+        if submission.status not in UNFINISHED:
+            break
+
+        if waited == 0.0 or waited >= STREAM_KEEPALIVE:
+            yield sse("status", {"status": submission.status.value})
+            waited = 0.0
+        time.sleep(STREAM_POLL)
+        waited += STREAM_POLL
+
+    db.session.rollback()
+    submission = Submission.query.get(submission_id)
+    for case in submission.case_results or []:
+        if case["case"] not in sent:
+            yield sse("case", case)
+    yield sse("done", submission.to_dict())
+
+
+# The submission template of the problem
+def read_template(problem):
+    template_path = os.path.join(
+        current_app.config["UPLOAD_FOLDER"],
+        problem.folder_url,
+        "submission_template.py",
+    )
+    if not os.path.exists(template_path):
+        abort(500, "Template file missing")
+
+    with open(template_path, "r") as file:
+        return file.read()
+
+
+# Check the custom inputs of a sample run: a list of argument lists
+def check_inputs(inputs, template_code):
+    if not isinstance(inputs, list) or not all(isinstance(i, list) for i in inputs):
+        abort(400, "Inputs should be a list of argument lists")
+
+    limit = current_app.config.get("SAMPLE_RUN_INPUTS", 5)
+    if len(inputs) > limit:
+        abort(400, f"At most {limit} custom inputs")
+    if len(json.dumps(inputs)) > SAMPLE_RUN_INPUT_SIZE:
+        abort(400, "Custom inputs are too large")
+
+    # the arguments of the function, when the template has only one
+    signature = extract_function_signature(template_code) or {}
+    if len(signature) == 1:
+        params = list(signature.values())[0]
+        for arguments in inputs:
+            if len(arguments) != len(params):
+                abort(400, f"Each input should have {len(params)} arguments {params}")
+
+
+# The long requests in flight of a kind, the sample runs (SAMPLE_RUN_WORKERS) or the
+# event streams (STREAM_WORKERS): each one holds a server thread until it is done,
+# so together they never take all the threads (see the Dockerfile) nor the judge slots
+def held_slots(name, setting):
+    slots = current_app.extensions.get(name)
+    if slots is None:
+        slots = current_app.extensions.setdefault(
+            name, threading.Semaphore(current_app.config.get(setting, 2))
+        )
+    return slots
+
+
+# Run the code on the sample cases of a judge slot, inside an app context
+def run_samples(code, path, inputs, slot=None):
+    config = current_app.config
+    return get_executor(config).run_samples(
+        code,
+        path,
+        inputs,
+        slot.cpus if slot else None,
+        slot.mem_limit if slot else config.get("JUDGE_SLOT_MEMORY", "1g"),
+    )
+
+
 # Check if the code can compile
 def check_is_code_compile(code):
     try:
@@ -83,7 +243,8 @@ def check_is_template_function_present(template_code, submission_code):
 @api.route("/<int:problem_id>")
 class SubmissionResource(Resource):
     @api.expect(auth_parser, submission_model)
-    @api.response(200, "Submission created")
+    @api.response(201, "Submission created and judged from the cache")
+    @api.response(202, "Submission created and queued")
     @api.response(401, "Unauthorized")
     @api.response(400, "Bad request")
     def post(self, problem_id):
@@ -108,48 +269,96 @@ class SubmissionResource(Resource):
         if problem is None:
             abort(404, "Problem not found")
 
-        template_path = os.path.join(
-            current_app.config["UPLOAD_FOLDER"],
-            problem.folder_url,
-            "submission_template.py",
-        )
-        if not os.path.exists(template_path):
-            abort(500, "Template file missing")
-
-        # Read template file
-        with open(template_path, "r") as file:
-            template_code = file.read()
+        template_code = read_template(problem)
 
         # Check 2: check if the template function is all present in the submission
         check_is_template_function_present(template_code, code)
 
-        # Save the submission
-        submission = Submission(user_id=user.user_id, problem_id=problem_id, code=code)
+        # Save the submission, it is pending until the judge queue picks it up
+        submission = Submission(
+            user_id=user.user_id,
+            problem_id=problem_id,
+            code=code,
+            status=SubmissionStatusEnum.pending,
+        )
 
         db.session.add(submission)
+
+        # The same code was judged before, no need to run the sandbox
+        if current_app.config.get("JUDGE_CACHE") and apply_cached_result(
+            submission, problem
+        ):
+            record_result(submission)
+            db.session.commit()
+            queue_measure(submission)
+            queue_analysis(submission, problem)
+            queue_profile(submission, problem)
+            db.session.commit()
+            return submission.to_dict(), 201
+
         db.session.commit()
 
-        # Trigger the sandbox evaluation
-        submission_id = submission.submission_id
-        is_success, results, real_time, ram = sandbox_eval(submission_id)
+        # Queue the sandbox evaluation
+        current_app.extensions["judge_queue"].submit(submission.submission_id)
 
-        if not is_success:
-            abort(500, results)
+        # return the pending submission record,
+        # poll GET /submission/<submission_id> for the result
+        return submission.to_dict(), 202
 
-        # return both things
-        submission.results = results
-        submission.real_time = real_time
-        submission.ram = ram
 
-        # add the is_pass flag
-        # when the Passed is in every results, then it is passed
-        submission.is_pass = all("Passed" in r for r in results)
+@api.route("/run/<int:problem_id>")
+class SampleRunResource(Resource):
+    @api.expect(auth_parser, run_model)
+    @api.response(200, "The sample cases and the custom inputs ran")
+    @api.response(400, "Bad request")
+    @api.response(401, "Unauthorized")
+    @api.response(404, "Problem not found")
+    @api.response(503, "No sandbox is available")
+    def post(self, problem_id):
+        """Run the code on the sample cases and the custom inputs, nothing is stored"""
 
-        # save the submission
-        db.session.commit()
+        token = request.headers.get("Authorization")
+        user = User.query.filter_by(token=token).first()
+        if user is None:
+            abort(401, "Unauthorized")
 
-        # return the submission record
-        return submission.to_dict(), 200
+        data = request.json
+        code = data.get("code")
+        if not code:
+            abort(400, "Empty code")
+        check_is_code_compile(code)
+
+        problem = Problem.query.get(problem_id)
+        if problem is None:
+            abort(404, "Problem not found")
+
+        template_code = read_template(problem)
+        check_is_template_function_present(template_code, code)
+
+        inputs = data.get("inputs", [])
+        check_inputs(inputs, template_code)
+
+        # the same sandbox as the judge, on a judge slot ahead of the submissions
+        slots = held_slots("sample_runs", "SAMPLE_RUN_WORKERS")
+        if not slots.acquire(blocking=False):
+            abort(503, "No sandbox is available, please try again later")
+
+        try:
+            is_success, report = current_app.extensions["judge_queue"].run_task(
+                partial(run_samples, code, testcase_path(problem), inputs),
+                SAMPLE_RUN_WAIT,
+            )
+        except TimeoutError:
+            abort(503, "No sandbox is available, please try again later")
+        except Exception as e:
+            is_success, report = False, str(e)
+        finally:
+            slots.release()
+
+        if not is_success:
+            report = {**error_report(report), "custom": []}
+
+        return report, 200
 
 
 @api.route("/<int:submission_id>")
@@ -187,20 +396,90 @@ class SubmissionResource(Resource):
             Submission.query.filter_by(
                 user_id=user.user_id, problem_id=problem.problem_id
             )
+            .options(*SUMMARY)
             .order_by(Submission.created_at.desc())
             .all()
         )
 
-        # return everything
+        # return everything, with the queue position while it is pending
         result = {
-            "submission": submission.to_dict(),
+            "submission": submission.to_dict(details=True),
             "problem": problem.to_dict(),
             "previous": [sub.to_dict() for sub in previous],
+            "queue_position": queue_position(submission),
         }
 
         return result, 200
 
 
+@api.route("/<int:submission_id>/stream")
+class SubmissionStreamResource(Resource):
+    @api.response(200, "Event stream of the submission")
+    @api.response(401, "Unauthorized")
+    @api.response(404, "Submission not found")
+    @api.response(503, "Too many streams, poll the submission instead")
+    @api.doc(params={"token": "token, when the Authorization header can not be set"})
+    def get(self, submission_id):
+        """Stream the verdict of each case of the submission as it is judged"""
+
+        token = request.headers.get("Authorization") or request.args.get("token")
+        get_own_submission(token, submission_id)
+
+        # the stream holds a server thread until the submission is judged
+        slots = held_slots("streams", "STREAM_WORKERS")
+        if not slots.acquire(blocking=False):
+            abort(503, "Too many streams, poll GET /submission/<submission_id>")
+
+        response = Response(
+            stream_with_context(submission_events(submission_id)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        # also when the client goes away before the first event
+        response.call_on_close(slots.release)
+        return response
+
+
+@api.route("/<int:submission_id>/cancel")
+class SubmissionCancelResource(Resource):
+    @api.expect(auth_parser)
+    @api.response(200, "Submission cancelled")
+    @api.response(202, "Cancelling the running sandbox")
+    @api.response(400, "The submission is judged already")
+    @api.response(401, "Unauthorized")
+    @api.response(404, "Submission not found")
+    @api.response(
+        409, "The submission is re-judged in a batch, it can not be cancelled"
+    )
+    def post(self, submission_id):
+        """Cancel a pending or running submission, its judge slot is free at once"""
+
+        token = request.headers.get("Authorization")
+        submission = get_own_submission(token, submission_id)
+
+        # not claimed by a worker yet, the worker skips it
+        cancelled = Submission.query.filter_by(
+            submission_id=submission_id, status=SubmissionStatusEnum.pending
+        ).update({"status": SubmissionStatusEnum.cancelled})
+        if cancelled:
+            db.session.refresh(submission)
+            cancel_submission(submission)
+            db.session.commit()
+            return submission.to_dict(), 200
+
+        db.session.refresh(submission)
+        if submission.status != SubmissionStatusEnum.running:
+            abort(400, "The submission is judged already")
+
+        # the worker kills the sandbox and stores the cancelled submission,
+        # a submission re-judged in a batch has no stream of its own
+        if cancel_stream(submission_id) is None:
+            abort(409, "The submission can not be cancelled now")
+
+        db.session.refresh(submission)
+        return submission.to_dict(), 202
+
+
 @api.route("/user/<int:problem_id>")
 class UserSubmissionsResource(Resource):
     @api.response(200, "User submissions retrieved")
@@ -220,6 +499,7 @@ class UserSubmissionsResource(Resource):
         # Fetch all submissions for the user & problem, order by the created_at desc
         submissions = (
             Submission.query.filter_by(user_id=user.user_id, problem_id=problem_id)
+            .options(*SUMMARY)
             .order_by(Submission.created_at.desc())
             .all()
         )
@@ -257,47 +537,12 @@ class SubmissionRankingResource(Resource):
         if not submission.is_pass:
             abort(400, "Submission did not pass the test cases")
 
-        problem_id = submission.problem_id
-
-        # Get all successful submissions for this problem
-        passed_submissions = Submission.query.filter_by(
-            problem_id=problem_id, is_pass=True
-        ).all()
-
-        # Sort by RAM and Time
-        # The passed submission definitely has the RAM and Time
-        ram_sorted = sorted(passed_submissions, key=lambda s: s.ram)
-        time_sorted = sorted(passed_submissions, key=lambda s: s.real_time)
-
-        # Total passed submissions
-        total_passed = len(passed_submissions)
-
-        # RAM and Time rankings (1-based)
-        ram_rank = ram_sorted.index(submission) + 1
-        time_rank = time_sorted.index(submission) + 1
-
-        # Convert to percentile (better = higher)
-        # Calculate aginst the passed submissions only
-        ram_percentile = round(100 * (1 - (ram_rank - 1) / total_passed), 2)
-        time_percentile = round(100 * (1 - (time_rank - 1) / total_passed), 2)
-
-        # Total submissions and participants
-        total_submissions = Submission.query.filter_by(problem_id=problem_id).count()
-        total_participants = (
-            db.session.query(Submission.user_id)
-            .filter_by(problem_id=problem_id)
-            .distinct()
-            .count()
-        )
+        # percentiles and counts from the indexes, see apis/ranking.py
+        result = ranking(submission)
 
-        # the result
-        result = {
-            "ram_percentile": ram_percentile,
-            "time_percentile": time_percentile,
-            "total_passed_submissions": total_passed,
-            "total_submissions": total_submissions,
-            "total_participants": total_participants,
-        }
+        # with the estimated complexity and the line profile once they are measured
+        result["complexity"] = submission.complexity
+        result["profile"] = submission.profile
 
         return result, 200
 
@@ -320,9 +565,11 @@ class AllUserSubmissionResource(Resource):
         if not user:
             abort(401, "Invalid token")
 
-        # get all submissions of the user, order by the created_at desc
+        # get all submissions of the user, order by the created_at desc,
+        # with their problems in one more query
         submissions = (
             Submission.query.filter_by(user_id=user.user_id)
+            .options(selectinload(Submission.problem), *SUMMARY)
             .order_by(Submission.created_at.desc())
             .all()
         )
@@ -331,10 +578,8 @@ class AllUserSubmissionResource(Resource):
         results = []
 
         for submission in submissions:
-            problem = Problem.query.get(submission.problem_id)
-
             result = {
-                "problem": problem.to_dict(),
+                "problem": submission.problem.to_dict(),
                 "submission": submission.to_dict(),
             }
 
@@ -0,0 +1,151 @@
+"""
+Keeps the best result of every user on every problem (tables.UserProblemBest), so
+the rankings and the solved problems of a user never scan the submissions.
+
+- record_result counts a judged submission (finished or error) in the row of its
+  user and problem, with one INSERT .. ON CONFLICT DO NOTHING and one UPDATE whose
+  new values are computed by the database (attempts + 1, min of the best time, ...),
+  so two workers judging submissions of the same user never lose an update.
+- It is called before the commit of the verdict, in the same transaction.
+- The first solve of a problem scores on the leaderboards, see apis/leaderboard.py.
+- A re-judge can make a result worse, so the rows of the re-judged users are
+  rebuilt from their submissions instead, see rebuild.
+- The rankings (apis/ranking.py) count the users with a better best result on
+  the indexes of the table, a user who resubmits a solution is counted once.
+- The best time and memory only come from the submissions measured in the current
+  units (METRICS_VERSION in tables.py), a user whose passed submissions are all
+  older is solved but has no best time or memory until they are re-judged.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func, true
+from sqlalchemy.dialects.sqlite import insert
+
+from config import db
+from tables import *
+from apis.leaderboard import add_solve
+
+# the submissions counted as attempts, a cancelled or waiting one is not judged
+JUDGED = (SubmissionStatusEnum.finished, SubmissionStatusEnum.error)
+
+
+def ensure_row(user_id, problem_id):
+    db.session.execute(
+        insert(UserProblemBest)
+        .values(user_id=user_id, problem_id=problem_id, attempts=0, passes=0)
+        .on_conflict_do_nothing()
+    )
+
+
+def record_result(submission):
+    """Count a judged submission in the best result of its user, the caller commits"""
+
+    if submission.status not in JUDGED:
+        return
+
+    ensure_row(submission.user_id, submission.problem_id)
+
+    # the first solve scores on the leaderboards, the condition makes it count once
+    if submission.is_pass:
+        first_solve = UserProblemBest.query.filter_by(
+            user_id=submission.user_id,
+            problem_id=submission.problem_id,
+            first_solved_at=None,
+        ).update({"first_solved_at": submission.created_at}, synchronize_session=False)
+        if first_solve:
+            problem = db.session.get(Problem, submission.problem_id)
+            add_solve(submission.user_id, problem, submission.created_at)
+
+    values = {"attempts": UserProblemBest.attempts + 1, "updated_at": datetime.now()}
+    if submission.is_pass:
+        best = [(UserProblemBest.first_solved_at, submission.created_at)]
+        best += measured_best(submission)
+        # min() of SQLite is NULL when an argument is NULL, hence the coalesce
+        for column, value in best:
+            values[column.key] = func.min(func.coalesce(column, value), value)
+        values["passes"] = UserProblemBest.passes + 1
+
+    UserProblemBest.query.filter_by(
+        user_id=submission.user_id, problem_id=submission.problem_id
+    ).update(values, synchronize_session=False)
+
+
+def measured_best(submission):
+    """(column, value) of the best time and memory a passed submission can improve"""
+
+    if submission.metrics_version != METRICS_VERSION:
+        return []
+    return [
+        (UserProblemBest.best_time, submission.real_time),
+        (UserProblemBest.best_ram, submission.ram),
+    ]
+
+
+def record_metrics(submission):
+    """Count the time and memory of a passed submission measured after its verdict
+    was counted, e.g. a judge cache hit (apis/judge_queue.py), the caller commits"""
+
+    if not submission.is_pass:
+        return
+
+    values = {"updated_at": datetime.now()}
+    for column, value in measured_best(submission):
+        values[column.key] = func.min(func.coalesce(column, value), value)
+
+    UserProblemBest.query.filter_by(
+        user_id=submission.user_id, problem_id=submission.problem_id
+    ).update(values, synchronize_session=False)
+
+
+def rebuild(problem_id, user_ids=None):
+    """Compute the rows of a problem again from the submissions, the caller commits"""
+
+    passed = Submission.is_pass == true()
+    measured = passed & (Submission.metrics_version == METRICS_VERSION)
+    query = (
+        db.session.query(
+            Submission.user_id,
+            func.count(),
+            func.count(case((passed, 1))),
+            func.min(case((measured, Submission.real_time))),
+            func.min(case((measured, Submission.ram))),
+            func.min(case((passed, Submission.created_at))),
+        )
+        .filter(
+            Submission.problem_id == problem_id,
+            Submission.status.in_(JUDGED),
+        )
+        .group_by(Submission.user_id)
+    )
+    if user_ids is not None:
+        query = query.filter(Submission.user_id.in_(user_ids))
+
+    stale = UserProblemBest.query.filter_by(problem_id=problem_id)
+    if user_ids is not None:
+        stale = stale.filter(UserProblemBest.user_id.in_(user_ids))
+    stale.delete(synchronize_session=False)
+
+    rows = [
+        {
+            "user_id": user_id,
+            "problem_id": problem_id,
+            "attempts": attempts,
+            "passes": passes,
+            "best_time": best_time,
+            "best_ram": best_ram,
+            "first_solved_at": first_solved_at,
+        }
+        for user_id, attempts, passes, best_time, best_ram, first_solved_at in query
+    ]
+    if rows:
+        db.session.execute(insert(UserProblemBest), rows)
+
+
+def solved_problem_ids(user_id):
+    """The problems the user has solved, from the rows of the user"""
+
+    rows = db.session.query(UserProblemBest.problem_id).filter(
+        UserProblemBest.user_id == user_id, UserProblemBest.passes > 0
+    )
+    return [problem_id for problem_id, in rows.order_by(UserProblemBest.problem_id)]
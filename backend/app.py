@@ -6,7 +6,7 @@ Also checks if Docker is running before starting the server.
 
 from flask import send_from_directory
 from config import create_app, db
-import docker
+from apis.docker_client import get_docker
 import os
 
 # create the Flask application
@@ -31,9 +31,9 @@ if __name__ == "__main__":
         exit()
 
     # check if the docker is running
+    # the judge reuses the same client, see apis/docker_client.py
     try:
-        client = docker.from_env()
-        client.containers.list()
+        get_docker(app.config).client().ping()
     except Exception as e:
         print("Error: Docker is not running, please start the docker first.")
         exit()
@@ -0,0 +1,120 @@
+"""
+Benchmark the leaderboard reads: fill a board of a scratch database with synthetic
+scores for a growing number of users, then time the page reads of apis/leaderboard.py
+at the top of the board, in the middle and at the end.
+
+A page is a range of the index from its cursor, so the latency should stay flat
+from 1k to 1M users, and be the same deep in the board as on the first page.
+
+No backend or docker needed, the scratch database is removed at the end.
+
+Usage (in the backend folder):
+    python -m benchmarks.leaderboard
+    python -m benchmarks.leaderboard --users 1000,10000 --reads 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import text
+
+from config import db
+
+parser = argparse.ArgumentParser(description="Time the leaderboard page reads")
+parser.add_argument(
+    "--users", default="1000,10000,100000,1000000", help="comma separated sizes"
+)
+parser.add_argument("--reads", type=int, default=200, help="page reads per position")
+parser.add_argument("--limit", type=int, default=20, help="entries per page")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def fill(users, rng):
+    """One global board row per user, with many ties like the real scores"""
+
+    db.session.execute(text("DELETE FROM leaderboard_scores"))
+    rows = [
+        {
+            "board": "global",
+            "user_id": user_id,
+            "score": 10 * rng.randint(0, 500),
+            "solved": 0,
+        }
+        for user_id in range(1, users + 1)
+    ]
+    for i in range(0, len(rows), 50000):
+        db.session.execute(
+            text(
+                "INSERT INTO leaderboard_scores (board, user_id, score, solved) "
+                "VALUES (:board, :user_id, :score, :solved)"
+            ),
+            rows[i : i + 50000],
+        )
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+
+
+def cursor_at(position):
+    """The cursor of the entry at a position of the board"""
+
+    entry = (
+        LeaderboardScore.query.filter_by(board="global")
+        .order_by(LeaderboardScore.score.desc(), LeaderboardScore.user_id)
+        .offset(position)
+        .first()
+    )
+    return entry.score, entry.user_id
+
+
+def time_reads(cursor, reads, limit):
+    timings = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        read_page("global", cursor, limit)
+        timings.append(time.perf_counter() - start)
+        # the session would serve the next read from its identity map
+        db.session.expunge_all()
+
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = (
+        f"sqlite:///{os.path.join(folder, 'leaderboard.db')}"
+    )
+    db.init_app(app)
+
+    with app.app_context():
+        from tables import LeaderboardScore
+        from apis.leaderboard import read_page
+
+        LeaderboardScore.__table__.create(db.engine)
+        rng = random.Random(args.seed)
+
+        print(f"{'users':>9} {'position':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for users in [int(n) for n in args.users.split(",")]:
+            fill(users, rng)
+            for name, position in [("top", None), ("middle", users // 2)]:
+                cursor = None if position is None else cursor_at(position)
+                p50, p99 = time_reads(cursor, args.reads, args.limit)
+                print(f"{users:>9} {name:>8} {p50 * 1000:>8.3f} {p99 * 1000:>8.3f}")
+
+            cursor = cursor_at(users - args.limit - 1)
+            p50, p99 = time_reads(cursor, args.reads, args.limit)
+            print(f"{users:>9} {'end':>8} {p50 * 1000:>8.3f} {p99 * 1000:>8.3f}")
+
+        db.session.remove()
+        db.engine.dispose()
+
+    os.remove(os.path.join(folder, "leaderboard.db"))
+    os.rmdir(folder)
@@ -0,0 +1,122 @@
+"""
+Load test the judge: replay the admin solutions uploads/problems/p*/solution.py
+as concurrent submissions against a running backend, then wait for the verdicts.
+
+It reports the throughput, the submission latency (POST until finished), and
+the spread of the real_time / ram stored for each problem. With enough judge
+slots the throughput scales with the cores, and the spread stays small because
+the sandboxes do not share cores.
+
+Require the backend to be running (python app.py) with the docker and the image,
+and JUDGE_CACHE = False, otherwise the copies of a solution are served by the cache.
+
+Usage (in the backend folder):
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --copies 5 --concurrency 16
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+parser = argparse.ArgumentParser(description="Replay the solutions as submissions")
+parser.add_argument("--host", default="http://localhost:9000")
+parser.add_argument("--email", default="Tom@mail.com")
+parser.add_argument("--password", default="Abcd1234!")
+parser.add_argument("--copies", type=int, default=3, help="submissions per problem")
+parser.add_argument("--concurrency", type=int, default=8, help="clients at once")
+parser.add_argument("--timeout", type=int, default=600, help="seconds to wait")
+
+
+def load_solutions():
+    solutions = []
+    for path in sorted(glob.glob(os.path.join("uploads", "problems", "p*"))):
+        solution = os.path.join(path, "solution.py")
+        if not os.path.exists(solution):
+            continue
+
+        problem_id = int(os.path.basename(path)[1:])
+        with open(solution, "r") as f:
+            solutions.append((problem_id, f.read()))
+
+    return solutions
+
+
+def submit_and_wait(host, token, problem_id, code, timeout):
+    headers = {"Authorization": token}
+    start = time.perf_counter()
+
+    response = requests.post(
+        f"{host}/submission/{problem_id}", json={"code": code}, headers=headers
+    )
+    response.raise_for_status()
+    submission_id = response.json()["submission_id"]
+
+    # poll until the judge queue is done with it
+    while time.perf_counter() - start < timeout:
+        response = requests.get(f"{host}/submission/{submission_id}", headers=headers)
+        submission = response.json()["submission"]
+        if submission["status"] not in ["pending", "running"]:
+            submission["latency"] = time.perf_counter() - start
+            return submission
+        time.sleep(0.2)
+
+    return {"problem_id": problem_id, "status": "timeout"}
+
+
+def spread(values):
+    values = [v for v in values if v is not None]
+    if len(values) < 2:
+        return 0.0
+    return statistics.pstdev(values) / statistics.mean(values) * 100
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    response = requests.post(
+        f"{args.host}/account/login",
+        json={"email": args.email, "password": args.password},
+    )
+    response.raise_for_status()
+    token = response.json()["token"]
+
+    jobs = load_solutions() * args.copies
+    print(f"Replaying {len(jobs)} submissions with {args.concurrency} clients...")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        submissions = list(
+            executor.map(
+                lambda job: submit_and_wait(
+                    args.host, token, job[0], job[1], args.timeout
+                ),
+                jobs,
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    finished = [s for s in submissions if s["status"] == "finished"]
+    latencies = sorted(s["latency"] for s in finished)
+
+    print(f"finished {len(finished)}/{len(submissions)} in {elapsed:.1f}s")
+    print(f"throughput: {len(finished) / elapsed * 60:.1f} submissions/minute")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"latency: p50 {latencies[len(latencies) // 2]:.2f}s  p99 {p99:.2f}s")
+
+    # the same solution should get the same numbers, whatever runs next to it
+    print("problem  passed  real_time spread  ram spread")
+    for problem_id in sorted({s["problem_id"] for s in finished}):
+        same = [s for s in finished if s["problem_id"] == problem_id]
+        passed = sum(s["is_pass"] for s in same)
+        time_spread = spread([s["real_time"] for s in same])
+        ram_spread = spread([s["ram"] for s in same])
+        print(
+            f"p{problem_id:<7} {passed}/{len(same):<5} {time_spread:>8.1f}%  {ram_spread:>12.1f}%"
+        )
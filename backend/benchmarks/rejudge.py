@@ -0,0 +1,69 @@
+"""
+Benchmark the admin re-judge: re-judge every submission of the problems against
+a running backend, then report the throughput of each re-judge.
+
+Require the backend to be running (python app.py) with the docker and the image,
+and some submissions, e.g. from init_database.py.
+
+Usage (in the backend folder):
+    python -m benchmarks.rejudge
+    python -m benchmarks.rejudge --problems 1,2,3 --result failed
+"""
+
+import argparse
+import time
+
+import requests
+
+parser = argparse.ArgumentParser(description="Re-judge the problems in bulk")
+parser.add_argument("--host", default="http://localhost:9000")
+parser.add_argument("--email", default="Admin@mail.com")
+parser.add_argument("--password", default="Abcd1234!")
+parser.add_argument("--problems", default="1", help="comma separated problem ids")
+parser.add_argument("--result", default="all", help="all, passed or failed")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    response = requests.post(
+        f"{args.host}/account/login",
+        json={"email": args.email, "password": args.password},
+    )
+    response.raise_for_status()
+    headers = {"Authorization": response.json()["token"]}
+
+    # start them all, so the batches of every problem share the judge slots
+    jobs = []
+    for problem_id in args.problems.split(","):
+        response = requests.post(
+            f"{args.host}/admin/problems/{problem_id}/rejudge",
+            json={"result": args.result},
+            headers=headers,
+        )
+        response.raise_for_status()
+        jobs.append(response.json())
+
+    start = time.perf_counter()
+    while any(job["status"] != "finished" for job in jobs):
+        time.sleep(0.5)
+        jobs = [
+            requests.get(
+                f"{args.host}/admin/rejudge/{job['job_id']}", headers=headers
+            ).json()
+            for job in jobs
+        ]
+        done = sum(job["done"] for job in jobs)
+        total = sum(job["total"] for job in jobs)
+        print(f"\r{done}/{total} submissions", end="", flush=True)
+    elapsed = time.perf_counter() - start
+
+    total = sum(job["total"] for job in jobs)
+    print(f"\nre-judged {total} submissions in {elapsed:.1f}s")
+    if elapsed:
+        print(f"throughput: {total / elapsed * 60:.1f} submissions/minute")
+    for job in jobs:
+        print(
+            f"p{job['problem_id']:<4} {job['done']:>5} done  {job['passed']:>5} passed  "
+            f"{job['errors']:>3} errors  {job['throughput']:>8.1f}/min"
+        )
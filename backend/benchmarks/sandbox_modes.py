@@ -0,0 +1,101 @@
+"""
+Benchmark the sandbox modes with the admin solution of a problem.
+
+- build: builds a temporary image for every submission (the old behaviour).
+- prebuilt: starts a container of the pre-built image and copies the files in.
+- pool: sends the submission to a warm container running the judge agent.
+- local: runs the runner as a limited local subprocess, no docker needed.
+
+Require the docker to be running and the python:3.10-slim-time image built,
+except for the local mode, e.g. in the CI: --modes local
+
+Usage (in the backend folder):
+    python -m benchmarks.sandbox_modes
+    python -m benchmarks.sandbox_modes --problem 3 --rounds 40 --concurrency 4
+"""
+
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from apis.sandbox import (
+    LocalExecutor,
+    build_image_eval,
+    prebuilt_image_eval,
+    pool_eval,
+)
+
+parser = argparse.ArgumentParser(description="Compare the sandbox modes")
+parser.add_argument("--problem", type=int, default=1, help="problem id, default 1")
+parser.add_argument("--rounds", type=int, default=10, help="runs per mode")
+parser.add_argument(
+    "--concurrency", type=int, default=1, help="submissions in flight at once"
+)
+parser.add_argument("--image", default="python:3.10-slim-time")
+parser.add_argument(
+    "--modes", default="build,prebuilt,pool,local", help="comma separated modes"
+)
+
+
+def run_mode(name, run_once, rounds, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        is_success, report = run_once()
+        return is_success, report, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(timed, range(rounds)))
+
+    for is_success, report, _ in runs:
+        if not is_success:
+            print(f"{name}: sandbox error {report}")
+            return None
+
+    timings = sorted(t for _, _, t in runs)
+    # the time of the cases themselves, the rest is the sandbox overhead
+    case_times = [report["real_time"] or 0 for _, report, _ in runs]
+    return {
+        "mode": name,
+        "cases": statistics.mean(case_times),
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    folder = os.path.join("uploads", "problems", f"p{args.problem}")
+    testcase_url = os.path.join(folder, "testcase.py")
+    with open(os.path.join(folder, "solution.py"), "r") as f:
+        code = f.read()
+
+    pool_config = {"SANDBOX_IMAGE": args.image, "SANDBOX_POOL_SIZE": args.concurrency}
+
+    modes = {
+        "build": lambda: build_image_eval(code, testcase_url),
+        "prebuilt": lambda: prebuilt_image_eval(code, testcase_url, args.image),
+        "pool": lambda: pool_eval(code, testcase_url, pool_config),
+        "local": lambda: LocalExecutor({}).judge(code, testcase_url),
+    }
+
+    # start the pool before timing, as the backend does on the first submission
+    if "pool" in args.modes:
+        modes["pool"]()
+
+    summaries = [
+        run_mode(name, modes[name], args.rounds, args.concurrency)
+        for name in args.modes.split(",")
+    ]
+
+    print(
+        f"problem p{args.problem}, {args.rounds} rounds per mode, concurrency {args.concurrency}"
+    )
+    for s in summaries:
+        if s is not None:
+            print(
+                f"{s['mode']:>8}: mean {s['mean']:.3f}s  p50 {s['p50']:.3f}s  p99 {s['p99']:.3f}s  cases {s['cases']:.4f}s"
+            )
@@ -18,6 +18,73 @@ class DevConfig:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}"
     DEBUG = True
 
+    # "docker" judges in the sandbox containers below, "local" in limited subprocesses,
+    # only for trusted code (no docker needed), see apis/sandbox_local.py
+    SANDBOX_EXECUTOR = "docker"
+    # seconds of a judge job at least, the problems with many cases get each case
+    # its whole limit, see job_deadline in apis/sandbox.py
+    SANDBOX_LOCAL_DEADLINE = 60
+
+    # sandbox: "prebuilt" reuses the image below, "build" builds one per submission,
+    # "pool" keeps warm containers running the judge agent
+    SANDBOX_MODE = "prebuilt"
+    SANDBOX_IMAGE = "python:3.10-slim-time"
+    SANDBOX_POOL_SIZE = 1  # warm containers per judge slot
+    SANDBOX_POOL_MAX_JOBS = 50
+    SANDBOX_POOL_HEALTH_INTERVAL = 30
+    SANDBOX_POOL_JOB_DEADLINE = 60  # at least, like SANDBOX_LOCAL_DEADLINE
+
+    # one Docker client for the process: keep-alive connections to the daemon,
+    # pinged after DOCKER_HEALTH_INTERVAL idle seconds, see apis/docker_client.py
+    DOCKER_MAX_POOL_SIZE = 10
+    DOCKER_HEALTH_INTERVAL = 30
+    DOCKER_API_VERSION = "auto"
+
+    # job folders for the "build" mode, None means /dev/shm (tmpfs) when available
+    SANDBOX_STAGING_DIR = None
+
+    # number of sandboxes judging in parallel, capped by the cores of the docker host
+    # minus JUDGE_RESERVED_CPUS; each one is pinned to a core with its own memory limit
+    JUDGE_WORKERS = 4
+    JUDGE_RESERVED_CPUS = 1
+    JUDGE_PIN_CPUS = True
+    JUDGE_SLOT_MEMORY = "1g"
+    # cores per slot, more than 1 lets the problems with parallel cases use them
+    JUDGE_SLOT_CPUS = 1
+
+    # reuse the result of the same code for the same problem, see apis/judge_cache.py
+    JUDGE_CACHE = True
+
+    # POST /submission/run/<problem_id>: sample runs at once, on the judge slots, and
+    # custom inputs per run
+    SAMPLE_RUN_WORKERS = 2
+    SAMPLE_RUN_INPUTS = 5
+
+    # GET /submission/<submission_id>/stream: event streams open at once, each one
+    # holds a server thread, with the sample runs less than the gunicorn --threads
+    STREAM_WORKERS = 2
+
+    # submissions judged in one sandbox by an admin re-judge, see apis/rejudge.py
+    REJUDGE_BATCH_SIZE = 25
+
+    # time limits calibrated on the reference solution, see apis/calibration.py:
+    # factor x the fastest of the runs + floor seconds, per case
+    CALIBRATION_RUNS = 3
+    CALIBRATION_FACTOR = 4
+    CALIBRATION_FLOOR = 0.2
+
+    # complexity of the passed submissions, measured in the background on idle judge
+    # slots within the budget (seconds), see apis/complexity.py
+    COMPLEXITY_ANALYSIS = True
+    ANALYSIS_BUDGET = 10
+    ANALYSIS_WORKERS = 1
+    ANALYSIS_QUEUE_SIZE = 100
+
+    # line profile of the passed submissions on their largest case, in the background
+    # like the analysis above, seconds per traced call, see apis/profiling.py
+    PROFILING = True
+    PROFILE_BUDGET = 10
+
 
 class TestConfig:
     UPLOAD_FOLDER = "uploads"
@@ -25,12 +92,21 @@ class TestConfig:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'tests', 'test.db')}"
     TESTING = True
 
+    # the tests judge without docker
+    SANDBOX_EXECUTOR = "local"
+    SANDBOX_MODE = "prebuilt"
+    SANDBOX_IMAGE = "python:3.10-slim-time"
+    JUDGE_WORKERS = 1
+    JUDGE_PIN_CPUS = False
+    JUDGE_CACHE = True
+    PROFILING = True
+
 
 # initialize variable db
 db = SQLAlchemy()
 
 
-def create_app(env="dev"):
+def create_app(env="dev", overrides=None):
     api = Api(
         version="1.0",
         title="PyHub API - 9900-T12B-Chocolate Project",
@@ -51,10 +127,19 @@ def create_app(env="dev"):
     else:
         raise ValueError("Invalid environment. Use 'dev' or 'test'.")
 
+    # e.g. the copies of the database and the uploads the tests run on
+    app.config.update(overrides or {})
+
     # initialize the database and api
     db.init_app(app)
     api.init_app(app)
 
+    # bring the database schema up to date, see migrations.py
+    from migrations import upgrade
+
+    with app.app_context():
+        upgrade(db.engine.url.database)
+
     # import all apis from the apis folder
     from apis import (
         account,
@@ -65,6 +150,7 @@ def create_app(env="dev"):
         ai_tutor,
         admin,
         analytics,
+        leaderboard,
     )
 
     api.add_namespace(account.api)
@@ -75,5 +161,11 @@ def create_app(env="dev"):
     api.add_namespace(ai_tutor.api)
     api.add_namespace(admin.api)
     api.add_namespace(analytics.api)
+    api.add_namespace(leaderboard.api)
+
+    # the submissions are judged in the background
+    from apis.judge_queue import JudgeQueue
+
+    JudgeQueue(app)
 
     return app
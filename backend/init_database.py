@@ -12,11 +12,15 @@ from datetime import datetime, timedelta
 from faker import Faker
 import random
 import secrets
+import time
 import requests
 import docker
 
 from config import db, app
 from tables import *
+from migrations import stamp
+from apis.user_best import rebuild
+from apis.leaderboard import rebuild_scores
 
 # check if the docker is running
 try:
@@ -46,6 +50,9 @@ with app.app_context():
     db.create_all()
     db.session.commit()
 
+    # the new database has the latest schema, its next start runs no step
+    stamp(db.engine.url.database)
+
     # insert the default users
     for user in users:
         new_user = User(
@@ -138,16 +145,17 @@ with app.app_context():
 
                 if not response.ok:
                     print(response.text)
-
-                # obtain the user submission from the database
-                # and put a random time
-                submission = (
-                    Submission.query.filter_by(
-                        user_id=user.user_id, problem_id=problem.problem_id
-                    )
-                    .order_by(Submission.created_at.desc())
-                    .first()
-                )
+                    continue
+
+                # the submission is judged in the background, wait for it
+                # then put a random time
+                submission = Submission.query.get(response.json()["submission_id"])
+                while submission.status in [
+                    SubmissionStatusEnum.pending,
+                    SubmissionStatusEnum.running,
+                ]:
+                    time.sleep(0.5)
+                    db.session.refresh(submission)
 
                 t2 = start_time + timedelta(seconds=random.randint(0, int(seconds)))
                 submission.created_at = t2
@@ -159,5 +167,12 @@ with app.app_context():
 
         print(f"Finish user {user.username} ({user_index+1}/{len(users)})")
 
+    # the submission times were changed after the verdicts,
+    # compute the best results and the leaderboards again from them
+    for problem in Problem.query.all():
+        rebuild(problem.problem_id)
+    rebuild_scores([user.user_id for user in User.query.all()])
+    db.session.commit()
+
     print("Comments and submissions inserted!")
     print("Database initialized!")
@@ -0,0 +1,233 @@
+"""
+Long-lived judge agent for the warm sandbox pool (apis/sandbox_pool.py).
+
+It runs as PID 1 of a locked-down sandbox container and talks to the backend
+over the attached stdin/stdout, one JSON message per line:
+
+- {"modules": {"run": "<source of judge/run.py>"}}  -> {"ready": true}
+- {"ping": true}                                    -> {"pong": true}
+- {"id": ..., "files": {...}, "timeout": 5, "deadline": 60, "memory": ...}
+                                                    -> {"id": ..., "cases": [...]} or {"id": ..., "error": ...}
+- the same with "submissions": {id: code}           -> {"id": ..., "submissions": {id: report}}
+  and "known": {id: {case hash: report}}, the stored outcomes of the unchanged cases
+- the same with "analyse" or "profile": true          -> {"id": ..., "points": [...]} or {"id": ..., "profile": {...}}
+- the same with "samples": [arguments, ...]         -> {"id": ..., "cases": [...], "custom": [...]}
+- a {"id": ..., "progress": case} line is sent for every case before the reply
+
+The interpreter and the run module are loaded once. For every job the agent
+forks a fresh child, so a submission never sees the state of the previous one,
+and every process the job left behind is killed before the next job starts.
+The child judges the job, the submission runs in a host child of its own that
+can not reach the pipe of the report, see SubmissionHost in judge/run.py.
+
+Keep this file standalone: it only runs inside the sandbox image.
+"""
+
+import json
+import os
+import resource
+import select
+import shutil
+import signal
+import sys
+import time
+import types
+
+JOBS_DIR = "/tmp/jobs"
+
+
+def reply(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def load_modules(modules):
+    for name, source in modules.items():
+        module = types.ModuleType(name)
+        exec(compile(source, f"{name}.py", "exec"), module.__dict__)
+        sys.modules[name] = module
+
+
+def run_child(job, folder, write_fd):
+    """Runs in the forked child, never returns. The submission itself runs in a host
+    child of its own, see SubmissionHost in judge/run.py, only this process writes
+    the result frames."""
+
+    from run import (
+        error_report,
+        load_settings,
+        load_testcase,
+        run_analysis,
+        run_batch,
+        run_cases,
+        run_samples,
+        submission_host,
+        write_frame,
+    )
+
+    payload = {}
+    try:
+        os.setsid()
+
+        # the user output must not reach the agent stdout
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+
+        if job.get("memory"):
+            resource.setrlimit(resource.RLIMIT_AS, (job["memory"], job["memory"]))
+
+        os.chdir(folder)
+        sys.path.insert(0, folder)
+
+        settings = load_settings(folder, timeout=job.get("timeout", 5))
+
+        # a batch of {id: code} shares the test cases, e.g. to re-judge a problem
+        if "submissions" in job:
+            payload["submissions"] = run_batch(
+                job["submissions"], settings, job.get("known")
+            )
+        elif job.get("analyse"):
+            user_submission, test_cases = load_testcase()
+
+            # the growth of the time and memory with the input size
+            with submission_host(user_submission, test_cases, settings) as host:
+                payload["points"] = run_analysis(host, test_cases, settings)
+        elif job.get("profile"):
+            user_submission, test_cases = load_testcase()
+
+            # the hot lines and the allocations on the largest case
+            with submission_host(user_submission, test_cases, settings) as host:
+                payload["profile"] = host.profile(settings)
+        elif "samples" in job:
+            user_submission, test_cases = load_testcase(with_reference=True)
+
+            # the sample cases and the custom inputs of the user, nothing is stored
+            with submission_host(user_submission, test_cases, settings) as host:
+                payload = run_samples(host, test_cases, settings, job["samples"])
+        else:
+            user_submission, test_cases = load_testcase()
+
+            # the per case time and memory, under the problem policy, see judge/run.py,
+            # each case is streamed to the agent as soon as it is judged
+            def on_case(case):
+                write_frame(write_fd, {"progress": case})
+
+            with submission_host(user_submission, test_cases, settings) as host:
+                payload["cases"] = run_cases(host, test_cases, settings, on_case)
+    except BaseException as e:
+        payload = error_report(e)
+
+    # the report goes back to the agent as a result frame, see judge/run.py
+    write_frame(write_fd, payload)
+    os._exit(0)
+
+
+def sweep(pid, folder):
+    """Kill every process the job left behind and remove its files"""
+
+    # as PID 1 of the container, -1 reaches every other process,
+    # otherwise (e.g. local debugging) only the job process group
+    try:
+        if os.getpid() == 1:
+            os.kill(-1, signal.SIGKILL)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+    while True:
+        try:
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_job(job):
+    from run import read_frame, split_frames
+
+    folder = os.path.join(JOBS_DIR, str(job["id"]))
+    os.makedirs(folder)
+    for name, content in job["files"].items():
+        with open(os.path.join(folder, name), "w") as f:
+            f.write(content)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        run_child(job, folder, write_fd)
+    os.close(write_fd)
+
+    # collect the child payload until EOF or the job deadline,
+    # and relay the progress of the cases to the backend as it comes
+    chunks = []
+    pending = b""
+    deadline = time.monotonic() + job.get("deadline", 60)
+    timed_out = False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+        chunks.append(data)
+
+        try:
+            frames, pending = split_frames(pending + data)
+        except ValueError:
+            frames, pending = [], b""
+        for frame in frames:
+            if "progress" in frame:
+                reply({"id": job["id"], "progress": frame["progress"]})
+    os.close(read_fd)
+
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    sweep(pid, folder)
+
+    if timed_out:
+        return {"id": job["id"], "error": "Timeout!"}
+
+    try:
+        payload = read_frame(b"".join(chunks))
+    except ValueError:
+        payload = {"error": "The submission crashed the sandbox"}
+
+    payload["id"] = job["id"]
+    return payload
+
+
+def main():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+
+        message = json.loads(line)
+        if "modules" in message:
+            load_modules(message["modules"])
+
+            # a submission can not reopen the stdout of the agent through /proc
+            from run import set_dumpable
+
+            set_dumpable(False)
+            reply({"ready": True})
+        elif message.get("ping"):
+            reply({"pong": True})
+        else:
+            reply(run_job(message))
+
+
+if __name__ == "__main__":
+    main()
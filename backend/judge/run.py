@@ -0,0 +1,1581 @@
+"""
+Runs the problem test cases against the user submission inside the sandbox.
+
+It is copied into the sandbox next to submission.py and testcase.py and run with
+`python3 run.py`. The report is a result frame on stdout, see write_frame, after
+a {"progress": case} frame per case, streamed as soon as the case is judged.
+The user output goes to stderr instead (capped at OUTPUT_LIMIT), and the backend
+reads the frame without scanning the user output.
+The submission never runs in this process: it runs in a forked host child that
+closed the result channel, gets the arguments of each call and sends back the
+result, which is compared here, see SubmissionHost. So neither its output nor
+its code can write or change a verdict.
+The warm pool agent (judge/agent.py) imports run_cases and write_frame instead.
+
+The execution policy of the problem comes from the optional judge.json next to
+testcase.py, see DEFAULT_SETTINGS: run all the cases, or stop at the first
+failure, or stop after some timeouts, within an optional total time budget.
+The cases left out are reported as skipped. The limits calibrated on the
+reference solution (see apis/calibration.py) replace the timeout case by case.
+When the problem marks its cases as independent ("parallel": true), they are
+sharded across a few forked processes, one per core of the sandbox, and merged
+back in order, see run_parallel. The policy and the budget hold for the cases of
+all the shards together.
+
+testcase.py may also declare seeded generators of large inputs:
+`generators = [{"generate": make_input, "seed": 1}, ...]`, make_input(rng) returns
+the input tuple. Their cases are generated lazily, one at a time, in the sandbox,
+and the expected output comes from the reference solution.py, see TestCases.
+
+`python3 run.py --analyse` times the submission and the reference solution on
+the first generator at the growing input sizes of the "ladder", see run_analysis,
+so the backend can estimate their complexity (apis/complexity.py).
+
+`python3 run.py --samples` only runs the first SAMPLE_CASES cases, the ones shown
+in full to the user, and the custom inputs of inputs.json, checked against the
+reference solution.py when there is one, see run_samples.
+
+`python3 run.py --profile` traces the submission line by line on its largest test
+case: the time share and hits of its slowest lines, and the lines that allocated
+the most at the peak of its memory (tracemalloc), see run_profile.
+
+`python3 run.py --batch` judges the many submissions of submissions.json
+({id: code}) at once, e.g. to re-judge a problem: testcase.py is imported once,
+then a child is forked for every submission, see run_batch. Each case is
+identified by the hash of its content, so with the stored outcomes of known.json
+({id: {case hash: report}}) only the new or modified cases run again, and the
+ones whose stored time is past their current limit, see can_reuse.
+
+Each case records the wall time, the CPU time and the peak resident memory of the
+call of the submission, measured in the host around the call only: without passing
+the arguments and the result, and without the memory of the interpreter and of the
+arguments. The judge process bounds them with what it measures around the request.
+
+Keep this file standalone: it only runs inside the sandbox image.
+"""
+
+import builtins
+import copy
+import gc
+import hashlib
+import inspect
+import io
+import json
+import math
+import os
+import pickle
+import random
+import select
+import signal
+import struct
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter, OrderedDict, defaultdict, deque
+from decimal import Decimal
+from fractions import Fraction
+from functools import partial
+
+# result frame: magic, protocol version, length of the JSON payload
+FRAME_MAGIC = b"JR"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct(">2sBI")
+
+# message between the judge and the submission host: length of the pickled data
+MESSAGE_HEADER = struct.Struct(">I")
+
+# bytes of a reply the judge reads from the submission host
+REPLY_LIMIT = 256 * 1024 * 1024
+
+# seconds the host may take on top of its own timeout, e.g. to generate an input
+HOST_SLACK = 1
+
+# seconds the judge waits for a host that broke the protocol to end on its own
+EXIT_GRACE = 0.1
+
+# prctl option, see set_dumpable
+PR_SET_DUMPABLE = 4
+
+# bytes of user output kept, and characters of a value shown in a message
+OUTPUT_LIMIT = 64 * 1024
+VALUE_LIMIT = 200
+
+# the judge.json of the problem overrides these
+DEFAULT_SETTINGS = {
+    # "all", "stop-on-first-failure" or "stop-after-timeouts"
+    "policy": "all",
+    # timeouts allowed before "stop-after-timeouts" stops
+    "max_timeouts": 1,
+    # seconds per case
+    "timeout": 5,
+    # {case hash: seconds} calibrated on the reference solution, instead of timeout,
+    # a changed case has a new hash, so it falls back to the timeout
+    "limits": None,
+    # {case hash: seconds} the reference solution took, kept for reference only
+    "reference": None,
+    # seconds for all the cases together, split across the cases left
+    "budget": None,
+    # the cases are independent, so they can run in parallel processes
+    "parallel": False,
+    # at most this many processes, and never more than the cores of the sandbox
+    "workers": 4,
+    # input sizes of the complexity analysis, see run_analysis
+    "ladder": [1000, 2000, 4000, 8000, 16000, 32000, 64000],
+    # seconds for the whole analysis, the larger sizes are left out past it
+    "analysis_budget": 10,
+    # seconds of each traced call of the line profile, see run_profile
+    "profile_budget": 10,
+}
+POLICIES = ["all", "stop-on-first-failure", "stop-after-timeouts"]
+
+# calls of each function at each size of the analysis ladder
+ANALYSIS_REPEATS = 3
+
+# the first cases are the samples: their input, expected and output are shown
+SAMPLE_CASES = 3
+
+# lines of the profile: the slowest ones, and the ones that allocated the most
+PROFILE_LINES = 10
+PROFILE_ALLOCATIONS = 5
+
+# a new tracemalloc snapshot when the traced memory grew by this ratio since the last
+PROFILE_SNAPSHOT_GROWTH = 1.25
+
+
+# Timeout handler
+def timeout_handler(signum, frame):
+    raise TimeoutError("Timeout!")
+
+
+def reset_peak_memory(pid="self"):
+    """Reset the peak resident memory (VmHWM) of the process, linux only"""
+
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def read_memory(pid="self", field="VmHWM"):
+    """Resident memory of the process in bytes, VmHWM is the peak and VmRSS the
+    current, 0 where /proc can not be read"""
+
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return 0
+
+
+def read_cpu_time(pid):
+    """CPU seconds the process used so far, user and system, 0 where /proc can not
+    be read. The clock ticks of /proc are coarse, 10 ms on most kernels."""
+
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # the process name may hold spaces and parentheses
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def set_dumpable(dumpable):
+    """Whether the other processes of the same user may open the memory and the file
+    descriptors of this process under /proc, linux only. A forked child inherits it."""
+
+    try:
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.prctl(PR_SET_DUMPABLE, int(dumpable), 0, 0, 0)
+    except (ImportError, OSError, AttributeError):
+        pass
+
+
+def copy_inputs(inputs):
+    """A copy of the arguments of a call, the function may change them in place.
+    A pickle round trip is much faster than deepcopy on large inputs, deepcopy is
+    the fallback for what can not be pickled."""
+
+    try:
+        return pickle.loads(pickle.dumps(inputs, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return copy.deepcopy(inputs)
+
+
+def truncate(value, limit=VALUE_LIMIT):
+    try:
+        text = str(value)
+    except Exception:
+        # e.g. too deeply nested to print
+        text = f"<{type(value).__name__}>"
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class CappedOutput:
+    """Stand-in for sys.stdout, drops the user output after limit characters"""
+
+    def __init__(self, stream, limit=OUTPUT_LIMIT):
+        self.stream = stream
+        self.remaining = limit
+
+    def write(self, text):
+        if self.remaining > 0:
+            self.stream.write(text[: self.remaining])
+            self.remaining -= len(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def open_result_channel():
+    """Keep the real stdout for the result frame, send the user output to stderr"""
+
+    result_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = CappedOutput(sys.stderr)
+    return result_fd
+
+
+def write_frame(fd, report):
+    """Write the report as one frame: header then the JSON payload"""
+
+    payload = json.dumps(report).encode("utf-8")
+    data = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(payload)) + payload
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def split_frames(data):
+    """Decode the complete frames at the start of data, return them with the bytes
+    left, raise ValueError if it is not a frame"""
+
+    payloads = []
+    while len(data) >= FRAME_HEADER.size:
+        magic, version, length = FRAME_HEADER.unpack_from(data)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError("unknown result frame")
+
+        end = FRAME_HEADER.size + length
+        if len(data) < end:
+            break
+        payloads.append(json.loads(data[FRAME_HEADER.size : end].decode("utf-8")))
+        data = data[end:]
+
+    return payloads, data
+
+
+def read_frame(data):
+    """Decode the report written by write_frame, after the progress frames of the
+    cases if any, raise ValueError if there is none"""
+
+    payloads, rest = split_frames(data)
+    reports = [payload for payload in payloads if "progress" not in payload]
+    if not reports:
+        raise ValueError("truncated result frame" if rest else "no result frame")
+
+    return reports[-1]
+
+
+def load_settings(folder=".", **overrides):
+    """The execution settings, from the judge.json in folder if there is one"""
+
+    settings = dict(DEFAULT_SETTINGS, **overrides)
+
+    path = os.path.join(folder, "judge.json")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            settings.update(json.load(f))
+
+    if settings["policy"] not in POLICIES:
+        raise ValueError(f"Unknown policy {settings['policy']}")
+
+    return settings
+
+
+def content_hash(*parts):
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class TestCases:
+    """The literal test cases then the generated ones, a generated case is only
+    built when it is run, so the large inputs never sit in memory together"""
+
+    def __init__(self, literal, generators=(), reference=None, reference_hash=""):
+        self.literal = literal
+        self.generators = list(generators)
+        self.reference = reference
+        self.reference_hash = reference_hash
+
+    def inputs(self, i):
+        """The input of case i, without running the reference solution"""
+
+        if i < len(self.literal):
+            return tuple(self.literal[i]["input"])
+
+        generator = self.generators[i - len(self.literal)]
+        return tuple(generator["generate"](random.Random(generator["seed"])))
+
+    def case_hash(self, i):
+        """The hash of the content of case i, without generating it: a generated
+        case is its generate function, its seed and the reference solution"""
+
+        if i < len(self.literal):
+            return case_hash(self.literal, i)
+
+        generator = self.generators[i - len(self.literal)]
+        try:
+            source = inspect.getsource(generator["generate"])
+        except (OSError, TypeError):
+            source = generator["generate"].__name__
+        return content_hash(source, generator["seed"], self.reference_hash)
+
+    def __len__(self):
+        return len(self.literal) + len(self.generators)
+
+    def __getitem__(self, i):
+        if i < len(self.literal):
+            return self.literal[i]
+
+        inputs = self.inputs(i)
+
+        # the reference may change its arguments in place too
+        expected = self.reference(*copy_inputs(inputs))
+        return {"input": inputs, "expected": expected}
+
+
+def read_reference():
+    """The source of solution.py and its hash, the file is removed once read,
+    so the submission can not read it, not even at import time"""
+
+    with open("solution.py", "rb") as f:
+        source = f.read()
+    os.remove("solution.py")
+
+    return source.decode("utf-8"), hashlib.sha256(source).hexdigest()
+
+
+def load_reference(source, name):
+    """The function name of the reference solution"""
+
+    module = types.ModuleType("reference")
+    exec(compile(source, "solution.py", "exec"), module.__dict__)
+    return getattr(module, name)
+
+
+def load_testcase(with_reference=False):
+    """Import testcase.py, return user_submission and its TestCases.
+    solution.py is loaded for the generators, and with_reference even without them,
+    if there is one."""
+
+    # solution.py is gone before any code of the submission runs
+    source, reference_hash = None, ""
+    if os.path.exists("solution.py"):
+        source, reference_hash = read_reference()
+
+    # the submission only runs in its host, see SubmissionHost
+    sys.modules["submission"] = SubmissionProxy("submission")
+    import testcase
+
+    generators = getattr(testcase, "generators", [])
+    reference = None
+    if source is not None and (generators or with_reference):
+        reference = load_reference(source, testcase.user_submission.__name__)
+    elif generators:
+        raise FileNotFoundError("The generated cases need solution.py")
+
+    test_cases = TestCases(testcase.test_cases, generators, reference, reference_hash)
+    return testcase.user_submission, test_cases
+
+
+def case_hash(test_cases, i):
+    """The hash of the input and expected output of case i, it identifies the case
+    across the edits of testcase.py, see reuse_case"""
+
+    if isinstance(test_cases, TestCases):
+        return test_cases.case_hash(i)
+    return content_hash(test_cases[i]["input"], test_cases[i]["expected"])
+
+
+def can_reuse(report, settings, digest):
+    """Whether the stored report of an unchanged case still holds. A timeout is
+    never reused, and no outcome that took longer than the limit of the case now:
+    they depend on the limits, not only on the case."""
+
+    return report["status"] in ["passed", "failed", "error"] and report[
+        "time"
+    ] <= case_limit(settings, digest)
+
+
+def reuse_case(report, i, digest):
+    """The stored report of an unchanged case, moved to position i"""
+
+    report = dict(report, case=i + 1, hash=digest, reused=True)
+    detail = report["message"].split(": ", 1)[1]
+    if report.get("diff") and i >= SAMPLE_CASES:
+        report.pop("diff")
+        detail = "Failed, Hidden Params"
+    report["message"] = f"Case {i + 1}: {detail}"
+    return report
+
+
+def should_stop(settings, results):
+    """Whether the policy stops the run after the last case"""
+
+    if settings["policy"] == "stop-on-first-failure":
+        return results[-1]["status"] != "passed"
+
+    if settings["policy"] == "stop-after-timeouts":
+        timeouts = sum(r["status"] == "timeout" for r in results)
+        return timeouts >= settings["max_timeouts"]
+
+    return False
+
+
+def case_limit(settings, digest):
+    """Seconds the case of this hash may take: its calibrated limit, or the timeout"""
+
+    return (settings.get("limits") or {}).get(digest, settings["timeout"])
+
+
+def case_timeout(settings, digest, spent, cases_left):
+    """The case limit, or its share of the budget left if that is smaller"""
+
+    timeout = case_limit(settings, digest)
+    if settings["budget"] is not None:
+        timeout = min(timeout, (settings["budget"] - spent) / cases_left)
+
+    # a zero timer would disable the alarm
+    return max(timeout, 0.001)
+
+
+def skipped_case(i):
+    return {
+        "case": i + 1,
+        "status": "skipped",
+        "message": f"Case {i + 1}: Skipped",
+        "time": 0,
+        "cpu_time": 0,
+        "memory": 0,
+    }
+
+
+def crashed_case(i):
+    return {
+        "case": i + 1,
+        "status": "error",
+        "message": f"Case {i + 1}: Error The submission crashed the sandbox",
+        "time": 0,
+        "cpu_time": 0,
+        "memory": 0,
+    }
+
+
+def shard_deadline(settings, count):
+    """Seconds the count cases may take: every case its whole timeout, or the budget"""
+
+    # a hand written judge.json may set limits above the timeout
+    longest = max([settings["timeout"], *(settings.get("limits") or {}).values()])
+
+    limit = longest * (count + 1)
+    if settings["budget"] is not None:
+        limit = min(limit, settings["budget"] + longest)
+
+    return limit + 1
+
+
+def parallel_workers(settings, count):
+    """Number of processes for the cases, 1 when they must run one after another"""
+
+    if not settings.get("parallel"):
+        return 1
+
+    if hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+
+    return max(1, min(settings.get("workers", 4), cores, count))
+
+
+class SubmissionError(Exception):
+    """The submission itself failed, its message is the error reported as it is"""
+
+
+def error_report(e):
+    """The report of a run that failed as a whole"""
+
+    if isinstance(e, SubmissionError):
+        return {"error": truncate(e)}
+    return {"error": truncate(f"{type(e).__name__}: {e}")}
+
+
+def write_all(fd, data, deadline=None):
+    """Write data to fd, raise TimeoutError past the deadline (perf_counter)"""
+
+    view = memoryview(data)
+    while view:
+        timeout = None if deadline is None else deadline - time.perf_counter()
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("Timeout!")
+        _, ready, _ = select.select([], [fd], [], timeout)
+        if ready:
+            try:
+                view = view[os.write(fd, view) :]
+            except BlockingIOError:
+                pass
+
+
+def read_exactly(fd, size, deadline=None):
+    """Read size bytes from fd, raise EOFError if it is closed first and
+    TimeoutError past the deadline (perf_counter)"""
+
+    chunks = []
+    while size:
+        timeout = None if deadline is None else deadline - time.perf_counter()
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("Timeout!")
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if not ready:
+            continue
+        data = os.read(fd, min(size, 1024 * 1024))
+        if not data:
+            raise EOFError("The pipe is closed")
+        chunks.append(data)
+        size -= len(data)
+
+    return b"".join(chunks)
+
+
+def send_message(fd, message, deadline=None):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    write_all(fd, MESSAGE_HEADER.pack(len(data)) + data, deadline)
+
+
+def close_fds(keep):
+    """Close every file descriptor above stderr, except the ones in keep"""
+
+    try:
+        fds = [int(fd) for fd in os.listdir("/proc/self/fd")]
+    except OSError:
+        fds = range(3, os.sysconf("SC_OPEN_MAX"))
+
+    for fd in fds:
+        if fd > 2 and fd not in keep:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class Record:
+    """Stand-in for an object of a class of the submission, with its attributes only,
+    so none of its methods runs in the judge process"""
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __repr__(self):
+        return f"<{type(self).__name__} object>"
+
+
+record_classes = {}
+
+# what a result of the submission may be made of, besides the classes of testcase.py
+SAFE_BUILTINS = {
+    "bool",
+    "bytearray",
+    "bytes",
+    "complex",
+    "dict",
+    "float",
+    "frozenset",
+    "int",
+    "list",
+    "range",
+    "set",
+    "slice",
+    "str",
+    "tuple",
+}
+SAFE_CLASSES = {
+    ("collections", "Counter"): Counter,
+    ("collections", "OrderedDict"): OrderedDict,
+    ("collections", "defaultdict"): defaultdict,
+    ("collections", "deque"): deque,
+    ("decimal", "Decimal"): Decimal,
+    ("fractions", "Fraction"): Fraction,
+}
+
+
+class ReplyUnpickler(pickle.Unpickler):
+    """Loads a reply of the submission host without running any of its code: plain
+    values, the standard containers and the classes of testcase.py. The classes of
+    the submission become a Record, any other global is refused."""
+
+    def find_class(self, module, name):
+        if module == "builtins" and name in SAFE_BUILTINS:
+            return getattr(builtins, name)
+        if (module, name) in SAFE_CLASSES:
+            return SAFE_CLASSES[(module, name)]
+
+        if module == "testcase":
+            value = getattr(sys.modules.get("testcase"), name, None)
+            if isinstance(value, type):
+                return value
+        elif module == "submission":
+            if name not in record_classes:
+                record_classes[name] = type(name, (Record,), {"__module__": module})
+            return record_classes[name]
+
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a result")
+
+
+def load_submission(code, user_submission):
+    """Run the code as the submission module, in the host child, return the function
+    to judge (user_submission of testcase.py, a SubmissionProxy function)"""
+
+    module = types.ModuleType("submission")
+    module.__file__ = "submission.py"
+
+    # the module level code of the submission has the case timeout too, see start
+    exec(compile(code, "submission.py", "exec"), module.__dict__)
+
+    # its objects are pickled by reference to their module
+    sys.modules["submission"] = module
+    SubmissionProxy.current = module
+    return user_submission
+
+
+def submission_host(user_submission, test_cases, settings, code=None):
+    """The host of submission.py, or of the code of a batch submission"""
+
+    if code is None:
+        with open("submission.py", "r") as f:
+            code = f.read()
+
+    return SubmissionHost(
+        partial(load_submission, code, user_submission), test_cases, settings["timeout"]
+    )
+
+
+def host_call(
+    function, test_cases, inputs, clock=time.perf_counter, cpu_clock=time.process_time
+):
+    # the clocks are bound before the submission is loaded, and only the call is
+    # measured: the arguments are already unpickled, the result not pickled yet
+    reset_peak_memory()
+    baseline = read_memory(field="VmRSS")
+    start_time, start_cpu = clock(), cpu_clock()
+    try:
+        reply = {"status": "ok", "result": function(*inputs)}
+    except BaseException as e:
+        reply = {"status": "error", "result": truncate(e)}
+
+    reply["usage"] = {
+        "time": clock() - start_time,
+        "cpu_time": cpu_clock() - start_cpu,
+        # the memory the call needed on top of the interpreter and the arguments
+        "memory": max(0, read_memory() - baseline),
+    }
+    return reply
+
+
+def host_measure(function, test_cases, n, timeout):
+    generator = test_cases.generators[0]
+    inputs = tuple(generator["generate"](random.Random(generator["seed"]), n))
+    try:
+        return {
+            "status": "ok",
+            "result": measure_point(function, inputs, time.perf_counter() + timeout),
+        }
+    except TimeoutError:
+        return {"status": "timeout"}
+    except BaseException as e:
+        return {"status": "error", "result": truncate(f"{type(e).__name__}: {e}")}
+
+
+def host_profile(function, test_cases, settings):
+    try:
+        return {"status": "ok", "result": run_profile(function, test_cases, settings)}
+    except BaseException as e:
+        return {"status": "error", "result": truncate(f"{type(e).__name__}: {e}")}
+
+
+# what the judge may ask the submission host, see SubmissionHost
+HOST_REQUESTS = {"call": host_call, "measure": host_measure, "profile": host_profile}
+
+
+def serve_submission(load, test_cases, read_fd, write_fd):
+    """The submission host: load the submission, then answer the requests of the
+    judge until it closes the pipe. Runs in the forked child, never returns."""
+
+    try:
+        # only its own pipes are left, not the result channel of the judge
+        close_fds([read_fd, write_fd])
+        os.setsid()
+        # so the judge can reset its peak memory, see reset_peak_memory
+        set_dumpable(True)
+        signal.signal(signal.SIGALRM, timeout_handler)
+
+        # the reference solution stays in the judge process
+        if isinstance(test_cases, TestCases):
+            test_cases.reference = None
+            gc.collect()
+
+        try:
+            function = load()
+            reply = {"ready": True}
+        except BaseException as e:
+            function, reply = None, {"error": truncate(f"{type(e).__name__}: {e}")}
+        send_message(write_fd, reply)
+
+        while function is not None:
+            try:
+                header = read_exactly(read_fd, MESSAGE_HEADER.size)
+            except EOFError:
+                break
+            (length,) = MESSAGE_HEADER.unpack(header)
+            kind, *args = pickle.loads(read_exactly(read_fd, length))
+
+            reply = HOST_REQUESTS[kind](function, test_cases, *args)
+            try:
+                send_message(write_fd, reply)
+            except Exception as e:
+                message = truncate(f"The result can not be sent: {e}")
+                send_message(write_fd, {"status": "error", "result": message})
+    except BaseException:
+        os._exit(1)
+    os._exit(0)
+
+
+class SubmissionHost:
+    """Runs the submission in a forked child, the judge process never runs user code.
+
+    The child closes every file descriptor it inherited but its two pipes, so it
+    can not write to the result channel, and the judge process is not dumpable (see
+    set_dumpable), so the child can not reopen them through /proc either. The judge
+    sends the pickled arguments of a call and loads the pickled result with
+    ReplyUnpickler, then compares it with the expected output itself. The child
+    measures the time, the CPU time and the memory of the call itself, the judge
+    process enforces the limit, and bounds them with its own measures (see call).
+    After a timeout or a crash the child is killed, the next call starts a new one.
+
+    The child gets a copy of the judge process as it is when it starts, so it starts
+    before a case is built: it never holds an expected output it did not answer yet.
+    """
+
+    def __init__(self, load, test_cases, timeout):
+        # load() runs in the child and returns the function to call
+        self.load = load
+        self.test_cases = test_cases
+        # seconds the module level code of the submission may take
+        self.timeout = timeout
+        self.pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start the child, raise SubmissionError if the submission can not load"""
+
+        # the buffered output would be written twice after the fork
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        request_read, request_write = os.pipe()
+        reply_read, reply_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            serve_submission(self.load, self.test_cases, request_read, reply_write)
+        os.close(request_read)
+        os.close(reply_write)
+        os.set_blocking(request_write, False)
+        self.pid, self.request_fd, self.reply_fd = pid, request_write, reply_read
+
+        try:
+            reply = self.receive(time.perf_counter() + self.timeout)
+        except TimeoutError:
+            self.stop()
+            raise SubmissionError("TimeoutError: Timeout!")
+        except Exception:
+            self.stop()
+            raise SubmissionError("The submission crashed the sandbox")
+
+        if "error" in reply or not reply.get("ready"):
+            self.stop()
+            raise SubmissionError(
+                truncate(reply.get("error") or "The submission crashed the sandbox")
+            )
+
+    def stop(self):
+        if self.pid is None:
+            return
+
+        os.close(self.request_fd)
+        os.close(self.reply_fd)
+
+        # kill whatever the submission left behind, the child has its own session
+        for kill in (os.killpg, os.kill):
+            try:
+                kill(self.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            # reaped already, see exit_message
+            pass
+        self.pid = None
+
+    def exit_message(self):
+        """How the child ended if it did on its own within EXIT_GRACE, e.g. the
+        submission called exit, or None if it still runs"""
+
+        deadline = time.perf_counter() + EXIT_GRACE
+        while True:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() > deadline:
+                return None
+            time.sleep(0.005)
+
+        if os.WIFSIGNALED(status):
+            name = signal.Signals(os.WTERMSIG(status)).name
+            return f"The submission was killed by {name}"
+        return f"The submission exited with code {os.waitstatus_to_exitcode(status)}"
+
+    def receive(self, deadline):
+        """The next reply of the child, a dict"""
+
+        (length,) = MESSAGE_HEADER.unpack(
+            read_exactly(self.reply_fd, MESSAGE_HEADER.size, deadline)
+        )
+        if length > REPLY_LIMIT:
+            raise ValueError("The result is too large")
+
+        data = read_exactly(self.reply_fd, length, deadline)
+        try:
+            reply = ReplyUnpickler(io.BytesIO(data)).load()
+        except Exception as e:
+            return {"status": "error", "result": f"The result can not be checked: {e}"}
+
+        if not isinstance(reply, dict):
+            raise ValueError("Not a reply")
+        return reply
+
+    def request(self, message, timeout):
+        """Send the message, return the reply of the child and the seconds, CPU
+        seconds and peak memory it took. The status of the reply is "timeout" past
+        timeout, or "crashed" if the child died or broke the protocol, with how it
+        ended as the result if it did on its own."""
+
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            reply = {"status": "error", "result": f"The input can not be sent: {e}"}
+            return reply, {"time": 0, "cpu_time": 0, "memory": 0}
+
+        if self.pid is None:
+            self.start()
+
+        reset_peak_memory(self.pid)
+        start_cpu = read_cpu_time(self.pid)
+        start_time = time.perf_counter()
+        try:
+            header = MESSAGE_HEADER.pack(len(data))
+            write_all(self.request_fd, header + data, start_time + timeout)
+            reply = self.receive(start_time + timeout)
+        except TimeoutError:
+            reply = {"status": "timeout"}
+        except (EOFError, OSError):
+            reply = {"status": "crashed"}
+        except ValueError as e:
+            # the rest of the reply is not read, the child is out of step
+            reply = {"status": "crashed", "result": str(e)}
+        # measured from here, with the transfer of the message and the reply, and
+        # the whole peak memory of the child: the limit, and the bounds of a call
+        usage = {
+            "time": time.perf_counter() - start_time,
+            "cpu_time": read_cpu_time(self.pid) - start_cpu,
+            "memory": read_memory(self.pid),
+        }
+        # what the child wrote before it ended is not a reply of its own
+        if reply.get("status") == "crashed":
+            reply["result"] = self.exit_message() or reply.get("result")
+        if reply.get("status") in ["timeout", "crashed"]:
+            self.stop()
+        return reply, usage
+
+    def call(self, inputs, timeout):
+        """(status, result, usage) of the submission on inputs, the status is "ok",
+        "error" with the message as the result, "timeout" or "crashed" """
+
+        reply, usage = self.request(("call", tuple(inputs)), timeout)
+        status = reply.get("status")
+        if status not in ["ok", "error", "timeout"]:
+            status = "crashed"
+
+        # the usage of the call itself, measured by the child around it, never more
+        # than what this process measured around the whole request
+        inner = reply.get("usage")
+        if status in ["ok", "error"] and isinstance(inner, dict):
+            try:
+                measured = {
+                    key: type(bound)(inner[key]) for key, bound in usage.items()
+                }
+                if all(math.isfinite(value) for value in measured.values()):
+                    usage = {
+                        key: min(max(measured[key], 0), usage[key]) for key in usage
+                    }
+            except (KeyError, TypeError, ValueError, OverflowError):
+                pass
+        return status, reply.get("result"), usage
+
+    def measure(self, n, timeout):
+        """(seconds, memory) of the submission on the first generator at size n,
+        see measure_point, raise TimeoutError past timeout"""
+
+        if timeout <= 0:
+            raise TimeoutError("Timeout!")
+
+        reply, _ = self.request(("measure", n, timeout), timeout + HOST_SLACK)
+        if reply.get("status") == "ok":
+            seconds, memory = reply["result"]
+            return float(seconds), int(memory)
+        if reply.get("status") == "timeout":
+            raise TimeoutError("Timeout!")
+        raise SubmissionError(
+            reply.get("result") or "The submission crashed the sandbox"
+        )
+
+    def profile(self, settings):
+        """The line profile of the submission, see run_profile"""
+
+        budget = 2 * settings["profile_budget"] + settings["timeout"] + HOST_SLACK
+        reply, _ = self.request(("profile", settings), budget)
+        if reply.get("status") == "ok" and isinstance(reply["result"], dict):
+            return reply["result"]
+        if reply.get("status") == "timeout":
+            raise SubmissionError("TimeoutError: Timeout!")
+        raise SubmissionError(
+            reply.get("result") or "The submission crashed the sandbox"
+        )
+
+
+def run_cases(host, test_cases, settings=None, on_case=None, known=None):
+    """Run the cases on the submission host under the execution settings, return one
+    report dict per case. on_case(report) is called as soon as a case is judged, e.g.
+    to stream it. known ({case hash: report}) holds the stored outcomes of the
+    unchanged cases, they are not run again, e.g. by an incremental re-judge."""
+
+    settings = settings or dict(DEFAULT_SETTINGS)
+
+    workers = parallel_workers(settings, len(test_cases))
+    if workers > 1:
+        return run_parallel(host, test_cases, settings, workers, on_case, known)
+
+    return run_shard(host, test_cases, settings, range(len(test_cases)), on_case, known)
+
+
+def shard_settings(settings, shard, count):
+    """The settings of a shard of the count cases: its share of the budget, so the
+    shards together spend no more CPU time than the budget"""
+
+    if settings["budget"] is None:
+        return settings
+    return dict(settings, budget=settings["budget"] * len(shard) / count)
+
+
+def run_parallel(host, test_cases, settings, workers, on_case=None, known=None):
+    """Shard the cases across forked processes, each with a submission host of its
+    own, so each case keeps its own timeout and memory accounting. The shards send
+    each case as it is judged, the policy applies to the cases of all the shards:
+    once it stops, the shards are killed and their cases left are skipped. The
+    reports are merged back in the order of the cases."""
+
+    count = len(test_cases)
+    shards = [list(range(count))[w::workers] for w in range(workers)]
+
+    # the buffered output would be written twice after the fork
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    children = {}
+    start = time.monotonic()
+    for shard in shards:
+        own_settings = shard_settings(settings, shard, count)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                with SubmissionHost(host.load, test_cases, host.timeout) as own:
+                    run_shard(
+                        own,
+                        test_cases,
+                        own_settings,
+                        shard,
+                        lambda case: write_frame(write_fd, {"progress": case}),
+                        known,
+                    )
+                report = {"done": True}
+            except BaseException as e:
+                report = error_report(e)
+
+            write_frame(write_fd, report)
+            os._exit(0)
+        os.close(write_fd)
+        deadline = start + shard_deadline(own_settings, len(shard))
+        children[read_fd] = [pid, deadline, b""]
+
+    results = []
+    error = None
+    stopped = False
+    while children and not stopped:
+        now = time.monotonic()
+        # a shard that ran over its deadline fails the cases it did not send
+        for fd in [fd for fd, child in children.items() if child[1] <= now]:
+            close_shard(fd, children.pop(fd))
+        if not children:
+            break
+
+        remaining = min(child[1] for child in children.values()) - now
+        ready, _, _ = select.select(list(children), [], [], remaining)
+        for fd in ready:
+            child = children[fd]
+            data = os.read(fd, 65536)
+            try:
+                payloads, child[2] = split_frames(child[2] + data)
+            except ValueError:
+                payloads, data = [], b""
+
+            for payload in payloads:
+                if "progress" in payload:
+                    results.append(payload["progress"])
+                    if on_case is not None:
+                        on_case(results[-1])
+                    stopped = stopped or should_stop(settings, results)
+                # the submission did not load
+                error = error or payload.get("error")
+
+            # the shard is done, or crashed
+            if not data:
+                close_shard(fd, children.pop(fd))
+
+    for fd, child in children.items():
+        close_shard(fd, child)
+
+    # the cases the shards did not send: skipped by the policy, or crashed
+    judged = {r["case"] for r in results}
+    for i in range(count):
+        if i + 1 not in judged:
+            results.append(skipped_case(i) if stopped else crashed_case(i))
+            if on_case is not None:
+                on_case(results[-1])
+
+    if error is not None:
+        raise SubmissionError(error)
+
+    return sorted(results, key=lambda r: r["case"])
+
+
+def close_shard(fd, child):
+    os.close(fd)
+    try:
+        os.kill(child[0], signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    os.waitpid(child[0], 0)
+
+
+def run_shard(host, test_cases, settings, indices, on_case=None, known=None):
+    """Run the cases at indices one after another on the submission host, return
+    one report dict per case"""
+
+    indices = list(indices)
+    results = []
+    spent = 0
+
+    for position, i in enumerate(indices):
+        if results and should_stop(settings, results):
+            for j in indices[position:]:
+                results.append(skipped_case(j))
+                if on_case is not None:
+                    on_case(results[-1])
+            break
+
+        # the case did not change since the stored outcome
+        digest = case_hash(test_cases, i)
+        stored = (known or {}).get(digest)
+        if stored is not None and can_reuse(stored, settings, digest):
+            results.append(reuse_case(stored, i, digest))
+            spent += stored["time"]
+            if on_case is not None:
+                on_case(results[-1])
+            continue
+
+        # before the case is built, see SubmissionHost
+        if host.pid is None:
+            host.start()
+
+        # a generated case is built, and its reference run, once
+        case = test_cases[i]
+        inputs, expected = case["input"], case["expected"]
+        timeout = case_timeout(settings, digest, spent, len(indices) - position)
+
+        # the result is compared here, never by the submission
+        status, result, usage = host.call(inputs, timeout)
+        if status == "ok":
+            try:
+                status = "passed" if result == expected else "failed"
+            except Exception as e:
+                status, result = "error", e
+
+        diff = None
+        if status == "passed":
+            message = f"Case {i + 1}: Passed"
+        elif status == "failed":
+            # similar to leetcode, only show the sample cases
+            if i < SAMPLE_CASES:
+                diff = {
+                    "input": truncate(inputs),
+                    "expected": truncate(expected),
+                    "got": truncate(result),
+                }
+                message = f"Case {i + 1}: Failed, Input: {diff['input']}, Expected: {diff['expected']}, Got: {diff['got']}"
+            else:
+                message = f"Case {i + 1}: Failed, Hidden Params"
+        elif status == "timeout":
+            message = f"Case {i + 1}: Timeout!"
+        elif status == "error":
+            message = f"Case {i + 1}: Error {truncate(result)}"
+        else:
+            status = "error"
+            detail = result or "The submission crashed the sandbox"
+            message = f"Case {i + 1}: Error {truncate(detail)}"
+
+        report = {
+            "case": i + 1,
+            "hash": digest,
+            "status": status,
+            "message": message,
+            "time": round(usage["time"], 6),
+            "cpu_time": round(usage["cpu_time"], 6),
+            "memory": usage["memory"],
+        }
+        if diff:
+            report["diff"] = diff
+        results.append(report)
+        spent += usage["time"]
+
+        if on_case is not None:
+            on_case(report)
+
+    return results
+
+
+def call_with_timeout(function, inputs, timeout):
+    """(status, result, seconds) of function(*inputs): "ok", or "timeout", or
+    "error" with the truncated exception as the result"""
+
+    args = copy_inputs(inputs)
+
+    start_time = time.perf_counter()
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        result = function(*args)
+        status = "ok"
+    except TimeoutError:
+        status, result = "timeout", None
+    except Exception as e:
+        status, result = "error", truncate(e)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return status, result, round(time.perf_counter() - start_time, 6)
+
+
+def run_samples(host, test_cases, settings, inputs=()):
+    """Run the sample cases, then the custom inputs (lists of arguments) of the user.
+    The custom ones pass when the output matches the reference solution, when there
+    is one, return {"cases": [...], "custom": [...]}"""
+
+    signal.signal(signal.SIGALRM, timeout_handler)
+
+    samples = min(SAMPLE_CASES, len(test_cases.literal))
+    cases = run_shard(host, test_cases, settings, range(samples))
+
+    custom = []
+    for args in inputs:
+        args = tuple(args)
+        status, result, usage = host.call(args, settings["timeout"])
+        if status == "crashed":
+            status, result = "error", result or "The submission crashed the sandbox"
+        report = {
+            "input": truncate(args),
+            "status": status,
+            "time": round(usage["time"], 6),
+        }
+
+        if status == "ok":
+            report["got"] = truncate(result)
+            # an input the reference can not handle is not checked
+            reference_status = None
+            if test_cases.reference is not None:
+                reference_status, expected, _ = call_with_timeout(
+                    test_cases.reference, args, settings["timeout"]
+                )
+            if reference_status == "ok":
+                report["expected"] = truncate(expected)
+                try:
+                    report["status"] = "passed" if result == expected else "failed"
+                except Exception as e:
+                    report["status"], report["error"] = "error", truncate(e)
+        elif status == "error":
+            report["error"] = truncate(result)
+
+        custom.append(report)
+
+    return {"cases": cases, "custom": custom}
+
+
+def measure_call(function, inputs, timeout, trace=False):
+    """Seconds of function(*inputs), and with trace the peak memory it allocated
+    (tracemalloc, precise but slower), raise TimeoutError past timeout"""
+
+    args = copy_inputs(inputs)
+
+    if trace:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        signal.setitimer(signal.ITIMER_REAL, max(timeout, 0.001))
+        function(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        elapsed = time.perf_counter() - start_time
+        memory = tracemalloc.get_traced_memory()[1] if trace else 0
+        tracemalloc.stop()
+
+    return round(elapsed, 6), memory
+
+
+def measure_point(function, inputs, deadline):
+    """(seconds, memory) of function on inputs: the fastest of a few calls, the least
+    noisy one, then the peak memory of a traced call, raise TimeoutError past the
+    deadline (perf_counter)"""
+
+    runs = []
+    for trace in [False] * ANALYSIS_REPEATS + [True]:
+        timeout = deadline - time.perf_counter()
+        if timeout <= 0:
+            raise TimeoutError("Timeout!")
+        runs.append(measure_call(function, inputs, timeout, trace))
+
+    return min(seconds for seconds, _ in runs[:-1]), runs[-1][1]
+
+
+def run_analysis(host, test_cases, settings):
+    """Time the submission (on its host) and the reference on the first generator at
+    each size of the ladder, within the analysis budget, return one point per size"""
+
+    if not test_cases.generators:
+        raise ValueError("The problem has no generators to analyse")
+
+    generator = test_cases.generators[0]
+    signal.signal(signal.SIGALRM, timeout_handler)
+    deadline = time.perf_counter() + settings["analysis_budget"]
+
+    points = []
+    for n in settings["ladder"]:
+        try:
+            seconds, memory = host.measure(n, deadline - time.perf_counter())
+            inputs = tuple(generator["generate"](random.Random(generator["seed"]), n))
+            reference_seconds, reference_memory = measure_point(
+                test_cases.reference, inputs, deadline
+            )
+        except TimeoutError:
+            # the budget is spent, the larger sizes would not fit either
+            break
+        points.append(
+            {
+                "n": n,
+                "time": seconds,
+                "memory": memory,
+                "reference_time": reference_seconds,
+                "reference_memory": reference_memory,
+            }
+        )
+
+    return points
+
+
+def input_size(inputs):
+    """Size of the arguments of a case, the length of the sized ones"""
+
+    return sum(len(arg) if hasattr(arg, "__len__") else 1 for arg in inputs)
+
+
+def is_submission_code(code):
+    return os.path.basename(code.co_filename) == "submission.py"
+
+
+def trace_lines(function, inputs, timeout):
+    """Call function(*inputs) with a line tracer on the submission code, return
+    {line: [hits, seconds]} and whether the call finished in time. The time of a
+    line runs until the next line of its frame, so it includes the library calls
+    it makes, while the submission functions it calls count on their own lines."""
+
+    lines = defaultdict(lambda: [0, 0.0])
+    # frame -> (line, start), the start is None while the line calls the submission
+    current = {}
+
+    def trace_frame(frame, event, arg):
+        now = time.perf_counter()
+        previous = current.pop(frame, None)
+        if previous is not None and previous[1] is not None:
+            lines[previous[0]][1] += now - previous[1]
+        if event == "line":
+            lines[frame.f_lineno][0] += 1
+            current[frame] = (frame.f_lineno, time.perf_counter())
+        elif event == "return" and frame.f_back in current:
+            # back to the line of the caller
+            current[frame.f_back] = (current[frame.f_back][0], time.perf_counter())
+        return trace_frame
+
+    def trace_call(frame, event, arg):
+        if not is_submission_code(frame.f_code):
+            return None
+
+        # the time of the callee is its own lines, not the line of the caller
+        caller = current.get(frame.f_back)
+        if caller is not None and caller[1] is not None:
+            lines[caller[0]][1] += time.perf_counter() - caller[1]
+            current[frame.f_back] = (caller[0], None)
+        return trace_frame
+
+    args = copy_inputs(inputs)
+    complete = True
+    sys.settrace(trace_call)
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        function(*args)
+    except TimeoutError:
+        # the lines traced so far are still a profile
+        complete = False
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.settrace(None)
+
+    return lines, complete
+
+
+def trace_allocations(function, inputs, timeout):
+    """Call function(*inputs) under tracemalloc, return the peak bytes,
+    {line: [bytes, blocks]} allocated by the submission code near the peak, and
+    whether the call finished in time. A snapshot is taken each time the memory
+    grew by PROFILE_SNAPSHOT_GROWTH."""
+
+    state = {"snapshot": None, "size": 0}
+
+    def trace_frame(frame, event, arg):
+        size = tracemalloc.get_traced_memory()[0]
+        if size > state["size"] * PROFILE_SNAPSHOT_GROWTH:
+            state["snapshot"], state["size"] = tracemalloc.take_snapshot(), size
+        return trace_frame
+
+    def trace_call(frame, event, arg):
+        return trace_frame if is_submission_code(frame.f_code) else None
+
+    args = copy_inputs(inputs)
+    complete = True
+    tracemalloc.start()
+    sys.settrace(trace_call)
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        result = function(*args)
+        # the result is still alive, it may be the peak
+        sys.settrace(None)
+        trace_frame(None, "return", None)
+        del result
+    except TimeoutError:
+        complete = False
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.settrace(None)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    allocations = {}
+    if state["snapshot"] is not None:
+        snapshot = state["snapshot"].filter_traces(
+            [tracemalloc.Filter(True, "*submission.py")]
+        )
+        for stat in snapshot.statistics("lineno"):
+            allocations[stat.traceback[0].lineno] = [stat.size, stat.count]
+
+    return peak, allocations, complete
+
+
+def run_profile(user_submission, test_cases, settings):
+    """Profile the submission on its largest case, see trace_lines and
+    trace_allocations, return the hot lines and the allocation lines"""
+
+    signal.signal(signal.SIGALRM, timeout_handler)
+
+    # the generated cases are built one at a time, only the largest is kept
+    largest, inputs = None, None
+    for i in range(len(test_cases)):
+        case_inputs = test_cases.inputs(i)
+        if inputs is None or input_size(case_inputs) > input_size(inputs):
+            largest, inputs = i, case_inputs
+
+    if inputs is None:
+        raise ValueError("The problem has no test case to profile")
+
+    with open("submission.py", "r") as f:
+        source = f.read().splitlines()
+
+    def code(line):
+        return truncate(source[line - 1].strip()) if 0 < line <= len(source) else ""
+
+    budget = settings["profile_budget"]
+
+    start = time.perf_counter()
+    lines, timed = trace_lines(user_submission, inputs, budget)
+    total = time.perf_counter() - start
+    peak, allocations, traced = trace_allocations(user_submission, inputs, budget)
+
+    hot = sorted(lines.items(), key=lambda item: item[1][1], reverse=True)
+    profile = {
+        "case": largest + 1,
+        "complete": timed and traced,
+        "time": round(total, 6),
+        "lines": [
+            {
+                "line": line,
+                "code": code(line),
+                "hits": hits,
+                "time": round(seconds, 6),
+                "share": round(seconds / total, 4) if total else 0.0,
+            }
+            for line, (hits, seconds) in hot[:PROFILE_LINES]
+        ],
+    }
+
+    biggest = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)
+    profile["peak_memory"] = peak
+    profile["allocations"] = [
+        {"line": line, "code": code(line), "size": size, "count": count}
+        for line, (size, count) in biggest[:PROFILE_ALLOCATIONS]
+    ]
+
+    return profile
+
+
+class SubmissionProxy(types.ModuleType):
+    """Stand-in for the submission module, so the judge imports testcase.py without
+    the submission, once for a whole batch. Its functions call the function of the
+    same name of the current submission, in the submission host."""
+
+    current = None
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return getattr(SubmissionProxy.current, name)(*args, **kwargs)
+
+        # the reference solution is found by name, see load_testcase
+        call.__name__ = name
+        return call
+
+
+def run_batch(codes, settings, known=None):
+    """Judge the {id: code} submissions against the same test cases, return {id: report}.
+    known ({id: {case hash: report}}) holds the stored outcomes, see run_cases."""
+
+    user_submission, test_cases = load_testcase()
+
+    known = known or {}
+    reports = {}
+    for key, code in codes.items():
+        try:
+            with submission_host(user_submission, test_cases, settings, code) as host:
+                cases = run_cases(host, test_cases, settings, known=known.get(key))
+            reports[key] = {"cases": cases}
+        except Exception as e:
+            reports[key] = error_report(e)
+
+    return reports
+
+
+if __name__ == "__main__":
+    result_fd = open_result_channel()
+    # the submission host can not reopen the result channel through /proc
+    set_dumpable(False)
+
+    try:
+        settings = load_settings()
+        if "--batch" in sys.argv:
+            with open("submissions.json", "r") as f:
+                codes = json.load(f)
+
+            # the stored outcomes of an incremental re-judge
+            known = None
+            if os.path.exists("known.json"):
+                with open("known.json", "r") as f:
+                    known = json.load(f)
+            report = {"submissions": run_batch(codes, settings, known)}
+        elif "--analyse" in sys.argv:
+            user_submission, test_cases = load_testcase()
+
+            with submission_host(user_submission, test_cases, settings) as host:
+                report = {"points": run_analysis(host, test_cases, settings)}
+        elif "--profile" in sys.argv:
+            user_submission, test_cases = load_testcase()
+
+            with submission_host(user_submission, test_cases, settings) as host:
+                report = {"profile": host.profile(settings)}
+        elif "--samples" in sys.argv:
+            user_submission, test_cases = load_testcase(with_reference=True)
+
+            inputs = []
+            if os.path.exists("inputs.json"):
+                with open("inputs.json", "r") as f:
+                    inputs = json.load(f)
+            with submission_host(user_submission, test_cases, settings) as host:
+                report = run_samples(host, test_cases, settings, inputs)
+        else:
+            user_submission, test_cases = load_testcase()
+
+            # stream every case as it is judged, then the whole report
+            def on_case(case):
+                sys.stdout.flush()
+                write_frame(result_fd, {"progress": case})
+
+            with submission_host(user_submission, test_cases, settings) as host:
+                report = {"cases": run_cases(host, test_cases, settings, on_case)}
+    except BaseException as e:
+        report = error_report(e)
+
+    sys.stdout.flush()
+    write_frame(result_fd, report)
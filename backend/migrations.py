@@ -0,0 +1,292 @@
+"""
+Versioned schema migrations of the SQLite databases: database.db, tests/test.db
+and utils/default.db.
+
+- The version of a database is its PRAGMA user_version, 0 before the migrations.
+- MIGRATIONS lists the steps in order. upgrade runs the steps above the version of
+  the database, each one in a transaction with its new user_version, so a failed
+  step leaves the database at the previous version.
+- Every step is idempotent (IF NOT EXISTS, a column is only added when missing):
+  the databases were changed by hand before the migrations.
+- upgrade leaves an empty database at version 0, db.create_all() gives it the
+  latest schema and stamp then sets its version to LATEST (init_database.py),
+  without running the steps.
+- The backend upgrades its database on start, see create_app in config.py.
+- A schema change of tables.py goes with a new step at the end of MIGRATIONS,
+  the databases of the repository are only changed by running it, never by hand.
+
+Usage (in the backend folder):
+    python migrations.py
+    python migrations.py tests/test.db utils/default.db
+"""
+
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn, table, name, ddl):
+    if name not in columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def judge_state(conn):
+    # the submissions of the database were all judged when it was made
+    add_column(conn, "submissions", "status", "VARCHAR(8) NOT NULL DEFAULT 'finished'")
+    add_column(conn, "submissions", "case_results", "JSON")
+
+
+def judge_cache(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS judge_cache (
+            cache_id INTEGER NOT NULL,
+            problem_id INTEGER NOT NULL,
+            testcase_hash VARCHAR(64) NOT NULL,
+            code_hash VARCHAR(64) NOT NULL,
+            created_at DATETIME,
+            results JSON,
+            case_results JSON,
+            is_pass BOOLEAN NOT NULL,
+            real_time FLOAT,
+            ram FLOAT,
+            hits INTEGER NOT NULL,
+            PRIMARY KEY (cache_id),
+            UNIQUE (testcase_hash, code_hash),
+            FOREIGN KEY(problem_id) REFERENCES problems (problem_id)
+        )
+        """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_judge_cache_problem_id "
+        "ON judge_cache (problem_id)"
+    )
+
+
+def complexity(conn):
+    add_column(conn, "submissions", "complexity", "JSON")
+
+
+def profile(conn):
+    add_column(conn, "submissions", "profile", "JSON")
+
+
+def ranking_indexes(conn):
+    for name, index_columns in [
+        ("ix_submissions_rank_ram", "problem_id, is_pass, ram"),
+        ("ix_submissions_rank_time", "problem_id, is_pass, real_time"),
+        ("ix_submissions_problem_user", "problem_id, user_id"),
+    ]:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON submissions ({index_columns})"
+        )
+
+
+def user_problem_best(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_problem_best (
+            user_id INTEGER NOT NULL,
+            problem_id INTEGER NOT NULL,
+            attempts INTEGER NOT NULL,
+            passes INTEGER NOT NULL,
+            best_time FLOAT,
+            best_ram FLOAT,
+            first_solved_at DATETIME,
+            updated_at DATETIME,
+            PRIMARY KEY (user_id, problem_id),
+            FOREIGN KEY(user_id) REFERENCES users (user_id),
+            FOREIGN KEY(problem_id) REFERENCES problems (problem_id)
+        )
+        """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_user_problem_best_ram "
+        "ON user_problem_best (problem_id, best_ram)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_user_problem_best_time "
+        "ON user_problem_best (problem_id, best_time)"
+    )
+
+    # the best results of the judged submissions, see apis/user_best.py
+    conn.execute("""
+        INSERT OR IGNORE INTO user_problem_best
+            (user_id, problem_id, attempts, passes, best_time, best_ram,
+             first_solved_at, updated_at)
+        SELECT user_id, problem_id, count(*), sum(is_pass),
+            min(CASE WHEN is_pass THEN real_time END),
+            min(CASE WHEN is_pass THEN ram END),
+            min(CASE WHEN is_pass THEN created_at END),
+            datetime('now')
+        FROM submissions
+        WHERE status IN ('finished', 'error')
+        GROUP BY user_id, problem_id
+        """)
+
+
+def leaderboard_scores(conn):
+    # frozen copies of POINTS and week_board of apis/leaderboard.py at this version
+    points = {"easy": 10, "medium": 20, "hard": 30}
+
+    def week_board(moment):
+        year, week, _ = moment.isocalendar()
+        return f"week:{year}-W{week:02d}"
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard_scores (
+            board VARCHAR(30) NOT NULL,
+            user_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            solved INTEGER NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (board, user_id),
+            FOREIGN KEY(user_id) REFERENCES users (user_id)
+        )
+        """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_scores_rank "
+        "ON leaderboard_scores (board, score DESC, user_id)"
+    )
+
+    # the first solves of the best results, see apis/leaderboard.py
+    solves = conn.execute("""
+        SELECT b.user_id, b.first_solved_at, p.topic, p.difficulty
+        FROM user_problem_best b JOIN problems p ON p.problem_id = b.problem_id
+        WHERE b.first_solved_at IS NOT NULL
+        """)
+    scores = defaultdict(lambda: [0, 0])
+    for user_id, solved_at, topic, difficulty in solves:
+        # the enums are stored by name, the same as their value
+        boards = [
+            "global",
+            f"topic:{topic}",
+            f"difficulty:{difficulty}",
+            week_board(datetime.fromisoformat(solved_at)),
+        ]
+        for board in boards:
+            scores[board, user_id][0] += points[difficulty]
+            scores[board, user_id][1] += 1
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO leaderboard_scores (board, user_id, score, solved) "
+        "VALUES (?, ?, ?, ?)",
+        [(board, user_id, *score) for (board, user_id), score in scores.items()],
+    )
+
+
+def hot_path_indexes(conn):
+    # one account per username and per email, and a token finds one user,
+    # NULL tokens (logged out) do not collide
+    for name, column in [
+        ("ux_users_username", "username"),
+        ("ux_users_email", "email"),
+        ("ux_users_token", "token"),
+    ]:
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON users ({column})")
+
+    for name, table, index_columns in [
+        # the submissions of a user, on a problem or in a period, newest first
+        (
+            "ix_submissions_user_problem_created",
+            "submissions",
+            "user_id, problem_id, created_at",
+        ),
+        ("ix_submissions_user_created", "submissions", "user_id, created_at"),
+        # the submissions of a period, the analytics
+        ("ix_submissions_created_pass", "submissions", "created_at, is_pass"),
+        # the judge queue
+        ("ix_submissions_status", "submissions", "status"),
+        ("ix_comments_problem_id", "comments", "problem_id"),
+        ("ix_comments_user_id", "comments", "user_id"),
+        (
+            "ix_ai_conversations_problem_created",
+            "ai_conversations",
+            "problem_id, created_at",
+        ),
+        ("ix_ai_conversations_created", "ai_conversations", "created_at"),
+    ]:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({index_columns})")
+
+
+def metrics_version(conn):
+    # the real_time and ram stored so far are of other units (/usr/bin/time, the
+    # sandbox memory), they stay with None and out of the best results until the
+    # submissions are re-judged, see METRICS_VERSION in tables.py
+    if "metrics_version" in columns(conn, "submissions"):
+        return
+    add_column(conn, "submissions", "metrics_version", "INTEGER")
+    conn.execute("UPDATE user_problem_best SET best_time = NULL, best_ram = NULL")
+
+
+# (version, description, step), in order, never change a step once released
+MIGRATIONS = [
+    (1, "judge state and per case results of the submissions", judge_state),
+    (2, "judge result cache", judge_cache),
+    (3, "estimated complexity of the submissions", complexity),
+    (4, "line profile of the submissions", profile),
+    (5, "indexes of the submission rankings", ranking_indexes),
+    (6, "best result of every user per problem", user_problem_best),
+    (7, "leaderboard scores", leaderboard_scores),
+    (8, "indexes of the hot queries, unique users and tokens", hot_path_indexes),
+    (9, "units of the stored time and memory", metrics_version),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(path):
+    """Run the migrations the database at path is missing, return its new version"""
+
+    # autocommit, the transactions of the steps are explicit
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        version = get_version(conn)
+
+        # an empty database gets the latest schema from db.create_all(), see stamp
+        tables = conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table'"
+        ).fetchone()[0]
+        if not tables:
+            return version
+
+        for step_version, description, step in MIGRATIONS:
+            if step_version <= version:
+                continue
+
+            conn.execute("BEGIN")
+            try:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {step_version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            version = step_version
+
+        return version
+    finally:
+        conn.close()
+
+
+def stamp(path, version=LATEST):
+    """Set the version of the database at path without running the steps, for a
+    database made by db.create_all() with the latest schema"""
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or ["database.db"]:
+        before = sqlite3.connect(path).execute("PRAGMA user_version").fetchone()[0]
+        after = upgrade(path)
+        print(f"{path}: version {before} -> {after}")
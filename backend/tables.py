@@ -3,7 +3,7 @@ Defines all database models and enums for the application using SQLAlchemy.
 """
 
 from datetime import datetime
-from sqlalchemy import JSON, Enum
+from sqlalchemy import JSON, Enum, desc
 from sqlalchemy.ext.mutable import MutableList
 import enum
 from config import db
@@ -13,10 +13,12 @@ class Base(db.Model):
     __abstract__ = True
     __table_args__ = {"extend_existing": True}
 
-    def to_dict(self):
+    def to_dict(self, exclude=()):
         result = {}
         for key in self.__mapper__.c.keys():
-            if key == "avatar" or "url" in key:
+            if key in exclude:
+                continue
+            elif key == "avatar" or "url" in key:
                 result[key] = "uploads/" + self.__getattribute__(key)
             elif key == "password":
                 continue
@@ -39,8 +41,15 @@ class UserEnum(enum.Enum):
     user = "user"
 
 
+# one account per username and per email, a token finds one user (NULL when logged out)
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ux_users_username", "username", unique=True),
+        db.Index("ux_users_email", "email", unique=True),
+        db.Index("ux_users_token", "token", unique=True),
+        {"extend_existing": True},
+    )
     user_id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False)
     email = db.Column(db.String(50), nullable=False)
@@ -118,9 +127,42 @@ class Problem(Base):
     folder_url = db.Column(db.String(50), nullable=False)
 
 
+# submission status enum: pending, running, finished, error, cancelled
+# submissions are judged in the background, see apis/judge_queue.py
+class SubmissionStatusEnum(enum.Enum):
+    pending = "pending"
+    running = "running"
+    finished = "finished"
+    error = "error"
+    cancelled = "cancelled"
+
+
+# the units of real_time and ram of the judged submissions, see make_report in
+# apis/sandbox.py: 1 = the total time of the calls of the cases in seconds and the
+# largest memory a call needed in MB, measured around the call by judge/run.py
+# the submissions judged before (/usr/bin/time and the sandbox memory) have None,
+# they are not ranked until they are re-judged, see apis/ranking.py
+METRICS_VERSION = 1
+
+
 # user submission for a problem, all submission are Python
+# the indexes: the passed submissions of a problem in order of ram and of real_time
+# and its participants, the submissions of a user (on a problem) newest first,
+# the submissions of a period, and the judge queue
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        db.Index("ix_submissions_rank_ram", "problem_id", "is_pass", "ram"),
+        db.Index("ix_submissions_rank_time", "problem_id", "is_pass", "real_time"),
+        db.Index("ix_submissions_problem_user", "problem_id", "user_id"),
+        db.Index(
+            "ix_submissions_user_problem_created", "user_id", "problem_id", "created_at"
+        ),
+        db.Index("ix_submissions_user_created", "user_id", "created_at"),
+        db.Index("ix_submissions_created_pass", "created_at", "is_pass"),
+        db.Index("ix_submissions_status", "status"),
+        {"extend_existing": True},
+    )
     submission_id = db.Column(db.Integer, primary_key=True)
     problem_id = db.Column(
         db.Integer, db.ForeignKey("problems.problem_id"), nullable=False
@@ -133,9 +175,12 @@ class Submission(Base):
     # the actual code is stored as text
     code = db.Column(db.Text, nullable=False, default="")
 
-    # the result of the submission
+    # the result of the submission, one "Case N: ..." line per case
     results = db.Column(JSON, nullable=True, default=None)
 
+    # per case report: status, time, cpu_time and peak memory, see judge/run.py
+    case_results = db.Column(JSON, nullable=True, default=None)
+
     # check submission is_pass or not
     is_pass = db.Column(db.Boolean, nullable=False, default=False)
 
@@ -143,6 +188,83 @@ class Submission(Base):
     real_time = db.Column(db.Float, nullable=True, default=None)
     ram = db.Column(db.Float, nullable=True, default=None)
 
+    # the units of real_time and ram, see METRICS_VERSION
+    metrics_version = db.Column(db.Integer, nullable=True, default=None)
+
+    # judging state, the results above are set once it is finished
+    status = db.Column(
+        Enum(SubmissionStatusEnum),
+        nullable=False,
+        default=SubmissionStatusEnum.pending,
+    )
+
+    # estimated time and space complexity of a passed submission and of the
+    # reference solution, set in the background, see apis/complexity.py
+    complexity = db.Column(JSON, nullable=True, default=None)
+
+    # the slowest lines and the biggest allocations of a passed submission on its
+    # largest case, set in the background, see apis/profiling.py
+    profile = db.Column(JSON, nullable=True, default=None)
+
+    # loaded on access, the listings load them for all the rows at once
+    # with selectinload, so a listing costs the same number of queries at any size
+    problem = db.relationship("Problem")
+    user = db.relationship("User")
+
+    # the large reports, only returned with a single submission, the listings keep
+    # the verdict, the time and the memory and do not load them
+    DETAILS = ("case_results", "profile", "complexity")
+
+    def to_dict(self, details=False):
+        return super().to_dict(exclude=() if details else self.DETAILS)
+
+
+# the best result of a user on a problem, kept up to date in the transaction that
+# stores each verdict, see apis/user_best.py
+# the rankings count one row per user, so resubmitting a solution does not count twice
+class UserProblemBest(Base):
+    __tablename__ = "user_problem_best"
+    __table_args__ = (
+        db.Index("ix_user_problem_best_ram", "problem_id", "best_ram"),
+        db.Index("ix_user_problem_best_time", "problem_id", "best_time"),
+        {"extend_existing": True},
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    problem_id = db.Column(
+        db.Integer, db.ForeignKey("problems.problem_id"), primary_key=True
+    )
+
+    # judged submissions (finished or error) and passed submissions
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    passes = db.Column(db.Integer, nullable=False, default=0)
+
+    # best real_time and ram of the passed submissions, None until solved
+    best_time = db.Column(db.Float, nullable=True, default=None)
+    best_ram = db.Column(db.Float, nullable=True, default=None)
+
+    # created_at of the first passed submission
+    first_solved_at = db.Column(db.DateTime, nullable=True, default=None)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# the score of a user on a leaderboard: "global", "topic:<topic>",
+# "difficulty:<difficulty>" or "week:<year>-W<week>", one row per board and user,
+# updated when the user solves a problem for the first time, see apis/leaderboard.py
+# the index is the order of a board page, the pages are read with keyset cursors
+class LeaderboardScore(Base):
+    __tablename__ = "leaderboard_scores"
+    __table_args__ = (
+        db.Index("ix_leaderboard_scores_rank", "board", desc("score"), "user_id"),
+        {"extend_existing": True},
+    )
+    board = db.Column(db.String(30), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+
+    # points of the solved problems, and their number
+    score = db.Column(db.Integer, nullable=False, default=0)
+    solved = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
 
 # everyone can leave comments
 # content is text, support markdown
@@ -150,18 +272,29 @@ class Comment(Base):
     __tablename__ = "comments"
     comment_id = db.Column(db.Integer, primary_key=True)
     problem_id = db.Column(
-        db.Integer, db.ForeignKey("problems.problem_id"), nullable=False
+        db.Integer, db.ForeignKey("problems.problem_id"), nullable=False, index=True
+    )
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.user_id"), nullable=False, index=True
     )
-    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
+    # loaded on access, or with the comments in the listings, see apis/comment.py
+    problem = db.relationship("Problem")
+    user = db.relationship("User")
+
 
 # user can discuss the problem with the ai-tutor powered by GPT-4o mini
 # one conversation contains: the problem, the user, the conversation id
 class AIConversation(Base):
     __tablename__ = "ai_conversations"
+    __table_args__ = (
+        db.Index("ix_ai_conversations_problem_created", "problem_id", "created_at"),
+        db.Index("ix_ai_conversations_created", "created_at"),
+        {"extend_existing": True},
+    )
     conversation_id = db.Column(db.Integer, primary_key=True)
     problem_id = db.Column(
         db.Integer, db.ForeignKey("problems.problem_id"), nullable=False
@@ -171,3 +304,31 @@ class AIConversation(Base):
 
     # the messages is a JSON list, so we can customize its structure
     messages = db.Column(MutableList.as_mutable(JSON), nullable=False, default=[])
+
+
+# the judge result of a code for a problem, reused when the same code is submitted again
+# testcase_hash: testcase.py, judge.json and the runner of the problem
+# code_hash: the code without comments and formatting, see apis/judge_cache.py
+class JudgeCache(Base):
+    __tablename__ = "judge_cache"
+    __table_args__ = (
+        db.UniqueConstraint("testcase_hash", "code_hash"),
+        {"extend_existing": True},
+    )
+    cache_id = db.Column(db.Integer, primary_key=True)
+    problem_id = db.Column(
+        db.Integer, db.ForeignKey("problems.problem_id"), nullable=False, index=True
+    )
+    testcase_hash = db.Column(db.String(64), nullable=False)
+    code_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    # the judge result, as stored in the submission
+    results = db.Column(JSON, nullable=True, default=None)
+    case_results = db.Column(JSON, nullable=True, default=None)
+    is_pass = db.Column(db.Boolean, nullable=False, default=False)
+    real_time = db.Column(db.Float, nullable=True, default=None)
+    ram = db.Column(db.Float, nullable=True, default=None)
+
+    # number of submissions served from this entry
+    hits = db.Column(db.Integer, nullable=False, default=0)
@@ -1,16 +1,34 @@
 """
 Defines pytest fixtures for setting up the Flask test client and retrieving authentication tokens for test users.
+
+The tests run on a copy of tests/test.db and of the uploads folder, so a test run
+leaves the files of the repository as they are.
 """
 
+import shutil
+
 import pytest
-from config import create_app
+from config import BASE_DIR, create_app
 from tests.utils.auth import login_user
 
 
+# pytest fixture for the copies of the database and the uploads
+@pytest.fixture(scope="session")
+def test_data(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("data")
+    shutil.copy(f"{BASE_DIR}/tests/test.db", folder / "test.db")
+    shutil.copytree(f"{BASE_DIR}/uploads", folder / "uploads")
+
+    return {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{folder / 'test.db'}",
+        "UPLOAD_FOLDER": str(folder / "uploads"),
+    }
+
+
 # pytest fixture for the app
 @pytest.fixture(scope="module")
-def client():
-    app = create_app("test")
+def client(test_data):
+    app = create_app("test", test_data)
     with app.test_client() as client:
         yield client
 
@@ -4,3 +4,113 @@ def test_admin_get_users(client, admin_token):
 
     users = response.json
     assert isinstance(users, list), "Users should be a list"
+
+
+def test_admin_get_judge_cache(client, admin_token, user_token):
+    response = client.get("/admin/judge-cache", headers={"Authorization": admin_token})
+    assert response.status_code == 200, "Failed to get the judge cache stats"
+    assert {"entries", "hits", "misses", "hit_rate"} <= set(response.json)
+
+    response = client.get("/admin/judge-cache", headers={"Authorization": user_token})
+    assert response.status_code == 403, "Only admin can get the judge cache stats"
+
+
+def test_admin_rejudge_progress(client, admin_token):
+    # a user without submissions, so nothing is actually judged again
+    response = client.post(
+        "/admin/problems/1/rejudge",
+        json={"result": "failed", "user_id": 9999},
+        headers={"Authorization": admin_token},
+    )
+    assert response.status_code == 202, "Failed to start the re-judge"
+    assert response.json["total"] == 0
+    assert response.json["status"] == "finished"
+    assert response.json["incremental"] is True, "Only the changed cases run"
+
+    job_id = response.json["job_id"]
+    response = client.get(
+        f"/admin/rejudge/{job_id}", headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 200, "Failed to get the re-judge progress"
+    assert response.json["job_id"] == job_id
+
+    response = client.get(
+        "/admin/rejudge/unknown", headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 404, "Unknown re-judge should return 404"
+
+
+def test_admin_rejudge_bad_request(client, admin_token, user_token):
+    response = client.post(
+        "/admin/problems/1/rejudge",
+        json={"result": "slow"},
+        headers={"Authorization": admin_token},
+    )
+    assert response.status_code == 400, "Unknown result filter should return 400"
+
+    response = client.post(
+        "/admin/problems/1/rejudge", json={}, headers={"Authorization": user_token}
+    )
+    assert response.status_code == 403, "Only admin can re-judge"
+
+
+def test_admin_calibrate_bad_request(client, admin_token, user_token):
+    response = client.post(
+        "/admin/calibrate",
+        json={"problem_ids": [9999]},
+        headers={"Authorization": admin_token},
+    )
+    assert response.status_code == 404, "Unknown problem should return 404"
+
+    response = client.post(
+        "/admin/calibrate", json={}, headers={"Authorization": user_token}
+    )
+    assert response.status_code == 403, "Only admin can calibrate"
+
+    response = client.get("/admin/calibrate", headers={"Authorization": admin_token})
+    assert response.status_code == 200, "Failed to get the calibrations"
+
+
+def test_admin_get_docker_metrics(client, admin_token, user_token):
+    response = client.get(
+        "/admin/docker-metrics", headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 200, "Failed to get the docker metrics"
+    assert {"connected", "reconnects", "calls"} <= set(response.json)
+
+    response = client.get(
+        "/admin/docker-metrics", headers={"Authorization": user_token}
+    )
+    assert response.status_code == 403, "Only admin can get the docker metrics"
+
+
+def test_failed_rejudge_batch_restores_the_submissions(client, monkeypatch):
+    import types
+
+    import apis.rejudge
+    from apis.rejudge import start_rejudge
+    from config import db
+    from tables import Submission, SubmissionStatusEnum
+
+    def broken(problem_id, user_ids=None):
+        raise RuntimeError("rebuild failed")
+
+    monkeypatch.setattr(apis.rejudge, "rebuild", broken)
+    # run each batch at once, as a judge worker would
+    judge_queue = types.SimpleNamespace(submit_task=lambda task: task(None))
+
+    app = client.application
+    with app.app_context():
+        submission = Submission.query.filter_by(
+            problem_id=1, status=SubmissionStatusEnum.finished
+        ).first()
+        before = (submission.status, submission.results, submission.is_pass)
+        job = start_rejudge(judge_queue, 1, [submission.submission_id])
+
+    progress = job.to_dict()
+    assert progress["status"] == "finished", "The job still advances"
+    assert progress["failed"] == 1
+
+    with app.app_context():
+        after = db.session.get(Submission, submission.submission_id)
+        assert (after.status, after.results, after.is_pass) == before
@@ -0,0 +1,23 @@
+import pytest
+
+from tests.utils.queries import capture_queries
+
+# (url, queries, the rows of the listing): the user of the token, the listing,
+# and one query for the problems or the users of all its rows
+LISTINGS = [
+    ("/submission/all", 3, lambda data: data),
+    ("/profile/recent-challenges", 3, lambda data: data),
+    ("/comment/problem/1", 2, lambda data: data["comments"]),
+    ("/comment/user/2", 3, lambda data: data["comments"]),
+]
+
+
+@pytest.mark.parametrize("url, queries, rows", LISTINGS)
+def test_listings_cost_a_constant_number_of_queries(
+    client, user_token, url, queries, rows
+):
+    engine, statements = capture_queries(client, url, user_token)
+    response = client.get(url, headers={"Authorization": user_token})
+
+    assert len(rows(response.json)) > 1, "A listing of several rows"
+    assert len(statements) == queries, f"{url} runs a query per row"
@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+from migrations import LATEST, stamp, upgrade
+from tests.utils.queries import capture_queries
+
+# the endpoints of every page view, none of their queries may scan a table
+HOT_ENDPOINTS = [
+    "/submission/all",
+    "/submission/user/1",
+    "/submission/ranking/1",
+    "/profile/recent-challenges",
+    "/profile/submission/summary",
+    "/profile/submission/frequency",
+    "/profile/solved",
+    "/comment/problem/1",
+    "/comment/user/2",
+    "/leaderboard/",
+]
+
+
+@pytest.mark.parametrize("url", HOT_ENDPOINTS)
+def test_hot_endpoints_use_indexes(client, user_token, url):
+    engine, statements = capture_queries(client, url, user_token)
+    assert statements, f"No query captured for {url}"
+
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            ).fetchall()
+            # SEARCH is an index lookup, SCAN without an index reads the table
+            scans = [
+                row[-1]
+                for row in plan
+                if row[-1].startswith("SCAN") and "INDEX" not in row[-1]
+            ]
+            assert not scans, f"{url} scans a table: {statement} {scans}"
+
+
+def test_migrations_are_versioned_and_idempotent(tmp_path):
+    # a database of the schema before the migrations
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (user_id INTEGER PRIMARY KEY, username VARCHAR(50),
+            email VARCHAR(50), token VARCHAR(50));
+        CREATE TABLE problems (problem_id INTEGER PRIMARY KEY, topic VARCHAR(19),
+            difficulty VARCHAR(6));
+        CREATE TABLE submissions (submission_id INTEGER PRIMARY KEY,
+            problem_id INTEGER, user_id INTEGER, created_at DATETIME,
+            is_pass BOOLEAN, real_time FLOAT, ram FLOAT);
+        CREATE TABLE comments (comment_id INTEGER PRIMARY KEY, problem_id INTEGER,
+            user_id INTEGER);
+        CREATE TABLE ai_conversations (conversation_id INTEGER PRIMARY KEY,
+            problem_id INTEGER, created_at DATETIME);
+        INSERT INTO users VALUES (1, 'tom', 'tom@mail.com', NULL),
+            (2, 'amy', 'amy@mail.com', NULL);
+        INSERT INTO problems VALUES (1, 'array', 'hard');
+        INSERT INTO submissions VALUES
+            (1, 1, 1, '2025-03-18 16:01:53.000000', 1, 0.5, 2.0),
+            (2, 1, 1, '2025-03-19 16:01:53.000000', 1, 0.2, 3.0);
+        """)
+    conn.close()
+
+    assert upgrade(path) == LATEST
+    assert upgrade(path) == LATEST, "Nothing left to run"
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST
+    best = conn.execute(
+        "SELECT attempts, passes, best_time, best_ram FROM user_problem_best"
+    ).fetchall()
+    # the time and ram of the old submissions are of other units, not ranked
+    assert best == [(2, 2, None, None)], "Backfilled from the submissions"
+    assert conn.execute("SELECT metrics_version FROM submissions").fetchall() == [
+        (None,),
+        (None,),
+    ]
+    assert conn.execute(
+        "SELECT score FROM leaderboard_scores WHERE board = 'global'"
+    ).fetchall() == [(30,)]
+
+    # the unique constraints hold, NULL tokens do not collide
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO users VALUES (3, 'tom', 'new@mail.com', NULL)")
+    conn.execute("INSERT INTO users VALUES (3, 'bob', 'bob@mail.com', NULL)")
+
+
+def test_created_database_is_stamped(tmp_path):
+    from config import db
+    from flask import Flask
+
+    path = str(tmp_path / "new.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+
+    assert upgrade(path) == 0, "An empty database waits for db.create_all()"
+    with app.app_context():
+        import tables
+
+        db.create_all()
+        db.engine.dispose()
+    stamp(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST
+    conn.close()
+    assert upgrade(path) == LATEST, "No step to run on the latest schema"
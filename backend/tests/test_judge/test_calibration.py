@@ -0,0 +1,91 @@
+import json
+import types
+
+from apis.calibration import calibrate_problem, calibrate_task, derive_limits
+
+TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (n,), "expected": n * 2} for n in [1, 2, 3]]
+"""
+
+SOLUTION = """
+def solve(n):
+    return n * 2
+"""
+
+
+def test_derive_limits():
+    limits = derive_limits([0.001, 0.5, 3], timeout=5, factor=4, floor=0.2)
+    assert limits == [0.204, 2.2, 5], "k x reference + floor, at most the timeout"
+
+
+def test_calibrate_problem(client, tmp_path):
+    (tmp_path / "testcase.py").write_text(TESTCASE)
+    (tmp_path / "solution.py").write_text(SOLUTION)
+    (tmp_path / "judge.json").write_text(
+        json.dumps({"timeout": 2, "limits": {"stale": 0.001}})
+    )
+    problem = types.SimpleNamespace(problem_id=9999, folder_url=str(tmp_path))
+
+    with client.application.app_context():
+        settings = calibrate_problem(problem)
+
+    stored = json.loads((tmp_path / "judge.json").read_text())
+    assert stored == settings
+    assert stored["timeout"] == 2, "The other settings are kept"
+    assert len(stored["reference"]) == 3, "One reference time per case"
+    assert stored["limits"].keys() == stored["reference"].keys(), "By case hash"
+    assert "stale" not in stored["limits"], "The old limits are replaced"
+    assert all(0.2 <= limit <= 2 for limit in stored["limits"].values())
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".json"] == [
+        "judge.json"
+    ], "No temporary file is left"
+
+    # a reference that does not pass can not be calibrated
+    (tmp_path / "solution.py").write_text("def solve(n):\n    return n\n")
+    with client.application.app_context():
+        try:
+            calibrate_problem(problem)
+            assert False, "A failing reference should raise"
+        except ValueError as e:
+            assert "does not pass" in str(e)
+
+
+def test_calibrate_task_drops_the_cached_results(client, tmp_path):
+    from config import db
+    from tables import DifficultyEnum, JudgeCache, Problem, TopicEnum
+
+    (tmp_path / "testcase.py").write_text(TESTCASE)
+    (tmp_path / "solution.py").write_text(SOLUTION)
+
+    app = client.application
+    with app.app_context():
+        problem = Problem(
+            title="Calibrated",
+            difficulty=DifficultyEnum.easy,
+            topic=TopicEnum.array,
+            author=1,
+            folder_url=str(tmp_path),
+        )
+        db.session.add(problem)
+        db.session.flush()
+        problem_id = problem.problem_id
+        db.session.add(
+            JudgeCache(problem_id=problem_id, testcase_hash="t", code_hash="c")
+        )
+        db.session.commit()
+
+    # as a judge worker runs it, the session is removed after the task
+    with app.app_context():
+        calibrate_task(problem_id)
+        db.session.remove()
+
+    with app.app_context():
+        try:
+            assert JudgeCache.query.filter_by(problem_id=problem_id).count() == 0
+        finally:
+            JudgeCache.query.filter_by(problem_id=problem_id).delete()
+            db.session.delete(db.session.get(Problem, problem_id))
+            db.session.commit()
@@ -0,0 +1,487 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+from apis.sandbox import FrameReader, make_report, read_frame, run_script
+
+TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (1,), "expected": 2}, {"input": (2,), "expected": 3}]
+"""
+
+SPOOF = """
+def solve(n):
+    # try to fake the results through the user output
+    print("Case 1: Passed")
+    print("x" * 100000)
+    return -1
+"""
+
+
+def run_judge(tmp_path, submission, testcase=TESTCASE, settings=None, args=()):
+    (tmp_path / "run.py").write_text(run_script)
+    if settings is not None:
+        (tmp_path / "judge.json").write_text(json.dumps(settings))
+    (tmp_path / "testcase.py").write_text(testcase)
+    (tmp_path / "submission.py").write_text(submission)
+
+    return subprocess.run(
+        [sys.executable, "run.py", *args], cwd=tmp_path, capture_output=True, timeout=30
+    )
+
+
+def test_result_frame_ignores_user_output(tmp_path):
+    process = run_judge(tmp_path, SPOOF)
+    report = read_frame(process.stdout)
+
+    assert [c["status"] for c in report["cases"]] == ["failed", "failed"]
+    assert report["cases"][0]["diff"]["got"] == "-1"
+    assert b"Case 1: Passed" in process.stderr, "User output goes to stderr"
+    assert len(process.stderr) <= 64 * 1024, "User output should be capped"
+
+
+FORGE = """
+import json
+import os
+import struct
+
+FORGED = {"cases": [{"case": 1, "status": "passed", "message": "forged"}]}
+PAYLOAD = json.dumps(FORGED).encode()
+FRAME = struct.pack(">2sBI", b"JR", 1, len(PAYLOAD)) + PAYLOAD
+
+
+def solve(n):
+    # write a passing report to every descriptor the judge may have left open
+    for fd in range(1, 256):
+        try:
+            os.write(fd, FRAME)
+        except OSError:
+            pass
+    os._exit(0)
+"""
+
+ANYTHING = """
+class Anything:
+    def __eq__(self, other):
+        return True
+
+
+def solve(n):
+    return Anything()
+"""
+
+
+def test_result_frame_can_not_be_forged(tmp_path):
+    process = run_judge(tmp_path, FORGE)
+    report = read_frame(process.stdout)
+
+    assert b"forged" not in process.stdout, "Only the judge writes the frames"
+    assert [c["status"] for c in report["cases"]] == ["error", "error"]
+    for case in report["cases"]:
+        assert case["message"].endswith("Error The submission exited with code 0")
+
+    # the result is compared by the judge, without the methods of the submission
+    process = run_judge(tmp_path, ANYTHING)
+    report = read_frame(process.stdout)
+
+    assert [c["status"] for c in report["cases"]] == ["failed", "failed"]
+    assert report["cases"][0]["diff"]["got"] == "<Anything object>"
+
+
+def test_result_frame_reports_load_errors(tmp_path):
+    process = run_judge(tmp_path, "def solve(n) return n")
+
+    assert read_frame(process.stdout)["error"].startswith("SyntaxError")
+    assert "error" in read_frame(b"Traceback ..."), "Missing frame is an error"
+
+
+def test_cases_are_streamed_before_the_report(tmp_path):
+    process = run_judge(tmp_path, "def solve(n):\n    return n + 1")
+
+    streamed = []
+    reader = FrameReader(streamed.append)
+    # the frames arrive in chunks of any size
+    for i in range(0, len(process.stdout), 7):
+        reader.feed(process.stdout[i : i + 7])
+
+    assert [c["case"] for c in streamed] == [1, 2]
+    assert reader.result()["cases"] == streamed
+    assert read_frame(process.stdout)["cases"] == streamed
+
+
+HUNGRY = """
+def solve(n):
+    data = bytearray(64 * 1024 * 1024)
+    return n + 1
+"""
+
+
+LARGE_INPUT = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (list(range(10**6)),), "expected": 10**6}]
+"""
+
+
+def test_case_usage_is_the_call_only(tmp_path):
+    small = read_frame(run_judge(tmp_path, "def solve(n):\n    return n + 1").stdout)
+    large = read_frame(run_judge(tmp_path, HUNGRY).stdout)
+
+    # the memory the call needed, not the interpreter
+    assert all(case["memory"] < 1024 * 1024 for case in small["cases"])
+    for before, after in zip(small["cases"], large["cases"]):
+        assert after["memory"] - before["memory"] > 60 * 1024 * 1024
+
+    # passing a large argument is not counted in the time nor in the memory
+    process = run_judge(tmp_path, "def solve(nums):\n    return len(nums)", LARGE_INPUT)
+    (case,) = read_frame(process.stdout)["cases"]
+    assert case["status"] == "passed"
+    assert case["time"] < 0.005 and case["memory"] < 1024 * 1024
+
+
+SLOW_TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (n,), "expected": n} for n in [1, 2, 3, 4]]
+"""
+
+SLOW = """
+import time
+
+def solve(n):
+    if n >= 2:
+        time.sleep(10)
+    return n
+"""
+
+
+def test_stop_on_first_failure(tmp_path):
+    settings = {"policy": "stop-on-first-failure", "timeout": 0.2}
+    process = run_judge(tmp_path, SLOW, SLOW_TESTCASE, settings)
+    cases = read_frame(process.stdout)["cases"]
+
+    assert [c["status"] for c in cases] == ["passed", "timeout", "skipped", "skipped"]
+
+
+def test_budget_is_split_across_cases(tmp_path):
+    settings = {"policy": "stop-after-timeouts", "max_timeouts": 2, "budget": 0.6}
+    process = run_judge(tmp_path, SLOW, SLOW_TESTCASE, settings)
+    cases = read_frame(process.stdout)["cases"]
+
+    assert [c["status"] for c in cases] == ["passed", "timeout", "timeout", "skipped"]
+    assert sum(c["time"] for c in cases) < 0.7, "The cases should fit the budget"
+
+
+def test_calibrated_limits_replace_the_timeout(tmp_path):
+    runner = load_runner()
+    test_cases = [{"input": (n,), "expected": n} for n in [1, 2, 3, 4]]
+    hashes = [runner.case_hash(test_cases, i) for i in range(4)]
+
+    # case 2 sleeps, its calibrated limit stops it long before the timeout,
+    # the limits are found by the hash of the case, not by its position
+    limits = {hashes[1]: 0.2, hashes[2]: 1, hashes[3]: 1, "removed case": 0.01}
+    settings = {"timeout": 5, "limits": limits}
+    start = time.perf_counter()
+    process = run_judge(tmp_path, SLOW, SLOW_TESTCASE, settings)
+    cases = read_frame(process.stdout)["cases"]
+
+    assert cases[1]["status"] == "timeout"
+    assert cases[1]["time"] < 1, "The case should stop at its limit"
+    assert time.perf_counter() - start < 10, "Every slow case should stop at its limit"
+
+
+GENERATED_TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (1,), "expected": 2}]
+
+
+def large(rng):
+    return ([rng.randint(0, 100) for _ in range(100000)],)
+
+
+generators = [{"generate": large, "seed": seed} for seed in [1, 2]]
+"""
+
+REFERENCE = """
+def solve(n):
+    return n + 1 if isinstance(n, int) else sum(n)
+"""
+
+CHEAT = """
+import os
+
+def solve(n):
+    # the reference solution must not be readable by the submission
+    assert not os.path.exists("solution.py")
+    return n + 1 if isinstance(n, int) else 0
+"""
+
+
+def test_generated_cases_use_the_reference(tmp_path):
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    process = run_judge(tmp_path, CHEAT, GENERATED_TESTCASE)
+    cases = read_frame(process.stdout)["cases"]
+
+    assert [c["status"] for c in cases] == ["passed", "failed", "failed"]
+    assert cases[1]["diff"]["expected"] != cases[2]["diff"]["expected"], "One seed each"
+    assert len(cases[1]["diff"]["input"]) <= 203, "The large input is truncated"
+
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    process = run_judge(tmp_path, REFERENCE, GENERATED_TESTCASE)
+    cases = read_frame(process.stdout)["cases"]
+    assert [c["status"] for c in cases] == ["passed"] * 3
+
+
+def test_samples_run_the_first_cases_and_custom_inputs(tmp_path):
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    (tmp_path / "inputs.json").write_text(json.dumps([[5], [[1, 2]], ["x"]]))
+    process = run_judge(tmp_path, CHEAT, GENERATED_TESTCASE, args=("--samples",))
+    report = read_frame(process.stdout)
+
+    assert [c["status"] for c in report["cases"]] == ["passed"], "No generated case"
+    custom = report["custom"]
+    assert [c["status"] for c in custom] == ["passed", "failed", "ok"]
+    assert custom[1]["expected"] == "3" and custom[1]["got"] == "0"
+    assert "expected" not in custom[2], "The reference fails on it too"
+
+
+LEAK = """
+try:
+    # read the reference solution at import time, before any case runs
+    with open("solution.py") as f:
+        SOLUTION = f.read()
+except OSError:
+    SOLUTION = None
+
+
+def solve(n):
+    assert SOLUTION is None, "The reference solution leaked"
+    return n + 1 if isinstance(n, int) else sum(n)
+"""
+
+
+def test_samples_hide_the_reference_from_the_import(tmp_path):
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    (tmp_path / "inputs.json").write_text(json.dumps([[5]]))
+    process = run_judge(tmp_path, LEAK, TESTCASE, args=("--samples",))
+    report = read_frame(process.stdout)
+
+    assert [c["status"] for c in report["cases"]] == ["passed", "passed"]
+    assert [c["status"] for c in report["custom"]] == ["passed"]
+
+
+def test_generated_cases_hide_the_reference_from_the_import(tmp_path):
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    process = run_judge(tmp_path, LEAK, GENERATED_TESTCASE)
+    cases = read_frame(process.stdout)["cases"]
+
+    assert [c["status"] for c in cases] == ["passed"] * 3
+
+
+def load_runner():
+    runner = types.ModuleType("run")
+    exec(compile(run_script, "run.py", "exec"), runner.__dict__)
+    return runner
+
+
+def sleepy(n):
+    time.sleep(0.2)
+    if n == 5:
+        os._exit(1)
+    return n if n != 2 else -1
+
+
+def test_parallel_cases_are_merged_in_order():
+    runner = load_runner()
+    settings = dict(runner.DEFAULT_SETTINGS, parallel=True)
+    test_cases = [{"input": (n,), "expected": n} for n in range(8)]
+
+    start = time.perf_counter()
+    host = runner.SubmissionHost(lambda: sleepy, test_cases, 5)
+    cases = runner.run_parallel(host, test_cases, settings, 4)
+    elapsed = time.perf_counter() - start
+
+    assert [c["case"] for c in cases] == list(range(1, 9))
+    assert cases[2]["status"] == "failed"
+    # case 6 crashed its host, the shard goes on with a new one
+    assert {c["case"] for c in cases if c["status"] == "error"} == {6}
+    assert elapsed < 8 * 0.2, "The shards should run at the same time"
+
+
+def picky(n):
+    if n == 0:
+        return -1
+    time.sleep(0.5)
+    return n
+
+
+def test_parallel_policy_stops_every_shard():
+    runner = load_runner()
+    settings = dict(
+        runner.DEFAULT_SETTINGS, parallel=True, policy="stop-on-first-failure"
+    )
+    test_cases = [{"input": (n,), "expected": n} for n in range(8)]
+
+    start = time.perf_counter()
+    host = runner.SubmissionHost(lambda: picky, test_cases, 5)
+    cases = runner.run_parallel(host, test_cases, settings, 4)
+    elapsed = time.perf_counter() - start
+
+    # case 1 failed at once, the other shards are stopped in their first case
+    assert [c["status"] for c in cases] == ["failed"] + ["skipped"] * 7
+    assert elapsed < 0.5
+
+
+def test_parallel_cases_are_streamed_and_share_the_budget():
+    runner = load_runner()
+    settings = dict(runner.DEFAULT_SETTINGS, parallel=True, budget=8)
+    test_cases = [{"input": (n,), "expected": n} for n in range(8)]
+
+    # the 4 shards of 2 cases spend 8 seconds together at most
+    shard = list(range(8))[0::4]
+    assert runner.shard_settings(settings, shard, 8)["budget"] == 2
+
+    streamed = []
+    start = time.perf_counter()
+    host = runner.SubmissionHost(lambda: sleepy, test_cases[:5], 5)
+    runner.run_parallel(
+        host,
+        test_cases[:5],
+        settings,
+        4,
+        lambda case: streamed.append(time.perf_counter() - start),
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(streamed) == 5
+    assert streamed[0] < elapsed - 0.1, "The first cases are sent before the last"
+
+
+def test_parallel_workers_are_capped_by_the_cores():
+    runner = load_runner()
+    settings = dict(runner.DEFAULT_SETTINGS, parallel=True, workers=64)
+
+    assert runner.parallel_workers(settings, 3) <= 3
+    assert runner.parallel_workers(settings, 100) <= len(os.sched_getaffinity(0))
+    assert runner.parallel_workers(runner.DEFAULT_SETTINGS, 100) == 1
+
+
+def test_batch_imports_testcase_once(tmp_path):
+    codes = {
+        "1": "def solve(n):\n    return n + 1",
+        "2": SPOOF,
+        "3": "while True:\n    pass",
+        "4": "def solve(n) return n",
+    }
+    (tmp_path / "submissions.json").write_text(json.dumps(codes))
+    # the test data is built once, the submissions only see the proxy
+    testcase = TESTCASE + "\nprint('testcase imported')\n"
+    process = run_judge(tmp_path, "", testcase, {"timeout": 0.5}, ["--batch"])
+    reports = read_frame(process.stdout)["submissions"]
+
+    assert [c["status"] for c in reports["1"]["cases"]] == ["passed", "passed"]
+    assert [c["status"] for c in reports["2"]["cases"]] == ["failed", "failed"]
+    assert reports["3"]["error"].startswith("TimeoutError")
+    assert reports["4"]["error"].startswith("SyntaxError")
+    assert process.stderr.count(b"testcase imported") == 1
+
+
+def test_batch_only_runs_the_changed_cases(tmp_path):
+    codes = {"1": "def solve(n):\n    return n + 1"}
+    (tmp_path / "submissions.json").write_text(json.dumps(codes))
+    process = run_judge(tmp_path, "", TESTCASE, args=["--batch"])
+    before = read_frame(process.stdout)["submissions"]["1"]["cases"]
+
+    # case 2 is fixed and a case is added in front, case 1 only moves
+    edited = TESTCASE.replace(
+        '[{"input": (1,), "expected": 2}, {"input": (2,), "expected": 3}]',
+        '[{"input": (0,), "expected": 1}, {"input": (1,), "expected": 2}, '
+        '{"input": (2,), "expected": 4}]',
+    )
+    known = {"1": {case["hash"]: case for case in before}}
+    (tmp_path / "known.json").write_text(json.dumps(known))
+    process = run_judge(tmp_path, "", edited, args=["--batch"])
+    cases = read_frame(process.stdout)["submissions"]["1"]["cases"]
+
+    assert [c.get("reused", False) for c in cases] == [False, True, False]
+    assert [c["status"] for c in cases] == ["passed", "passed", "failed"]
+    assert cases[1]["message"] == "Case 2: Passed", "The reused case is renumbered"
+    assert cases[1]["hash"] == before[0]["hash"]
+
+
+def test_batch_runs_again_the_cases_past_the_new_limit(tmp_path):
+    codes = {"1": "import time\n\ndef solve(n):\n    time.sleep(0.3)\n    return n + 1"}
+    (tmp_path / "submissions.json").write_text(json.dumps(codes))
+    process = run_judge(tmp_path, "", TESTCASE, args=["--batch"])
+    before = read_frame(process.stdout)["submissions"]["1"]["cases"]
+    assert [c["status"] for c in before] == ["passed", "passed"]
+
+    # the passes took longer than the limit of case 1 now
+    known = {"1": {case["hash"]: case for case in before}}
+    (tmp_path / "known.json").write_text(json.dumps(known))
+    settings = {"timeout": 5, "limits": {before[0]["hash"]: 0.1}}
+    process = run_judge(tmp_path, "", TESTCASE, settings, ["--batch"])
+    cases = read_frame(process.stdout)["submissions"]["1"]["cases"]
+
+    assert [c.get("reused", False) for c in cases] == [False, True]
+    assert [c["status"] for c in cases] == ["timeout", "passed"]
+
+
+def test_make_report_sums_the_cases():
+    cases = [
+        {
+            "case": 1,
+            "status": "passed",
+            "message": "Case 1: Passed",
+            "time": 0.25,
+            "memory": 1024 * 1024,
+        },
+        {
+            "case": 2,
+            "status": "timeout",
+            "message": "Case 2: Timeout!",
+            "time": 1.0,
+            "memory": 3 * 1024 * 1024,
+        },
+    ]
+
+    report = make_report(cases)
+
+    assert report["results"] == ["Case 1: Passed", "Case 2: Timeout!"]
+    assert report["cases"] == cases
+    assert report["real_time"] == 1.25, "real_time is the total time of the cases"
+    assert report["ram"] == 3.0, "ram is the largest memory of a case in MB"
+
+
+MANY_TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": (n,), "expected": n} for n in [1, 2, 3, 4, 5, 6, 7, 8]]
+"""
+
+
+def test_every_case_times_out_within_the_job_deadline(tmp_path):
+    from apis.sandbox import LocalExecutor, count_cases
+
+    (tmp_path / "testcase.py").write_text(MANY_TESTCASE)
+    (tmp_path / "judge.json").write_text(json.dumps({"timeout": 0.5}))
+    assert count_cases(MANY_TESTCASE) == 8
+
+    # the cases take longer than the fixed deadline, each one still has a verdict
+    executor = LocalExecutor({"SANDBOX_LOCAL_DEADLINE": 1})
+    is_success, report = executor.judge(
+        "def solve(n):\n    while True:\n        pass\n", str(tmp_path / "testcase.py")
+    )
+
+    assert is_success, report
+    assert [case["status"] for case in report["cases"]] == ["timeout"] * 8
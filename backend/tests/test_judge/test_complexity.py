@@ -0,0 +1,106 @@
+import types
+
+from apis.complexity import estimate, fit_class
+from apis.sandbox import read_frame
+from tests.test_judge.test_case_report import load_runner, run_judge
+
+SIZES = [1000, 2000, 4000, 8000, 16000, 32000, 64000]
+
+
+def test_fit_class():
+    # a little noise on top of the growth curves
+    noise = [1.02, 0.97, 1.01, 0.99, 1.03, 0.98, 1.0]
+
+    def curve(f):
+        return [f(n) * k for n, k in zip(SIZES, noise)]
+
+    assert fit_class(SIZES, curve(lambda n: 1e-7 * n)) == "O(n)"
+    assert fit_class(SIZES, curve(lambda n: 1e-9 * n * n)) == "O(n^2)"
+    assert fit_class(SIZES, curve(lambda n: 1e-12 * n**3)) == "O(n^3)"
+    assert fit_class(SIZES, [0.0001] * 7, noise=0.0005) == "O(1)"
+    assert fit_class(SIZES[:2], [1, 2]) is None, "Too few points to fit"
+
+
+TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [{"input": ([3, 1, 2],), "expected": [1, 2, 3]}]
+
+
+def numbers(rng, n=1000):
+    return ([rng.randint(0, 10**6) for _ in range(n)],)
+
+
+generators = [{"generate": numbers, "seed": 1}]
+"""
+
+REFERENCE = """
+def solve(nums):
+    return sorted(nums)
+"""
+
+QUADRATIC = """
+def solve(nums):
+    nums = list(nums)
+    for i in range(len(nums)):
+        for j in range(len(nums) - 1 - i):
+            if nums[j] > nums[j + 1]:
+                nums[j], nums[j + 1] = nums[j + 1], nums[j]
+    return nums
+"""
+
+
+def test_analysis_within_the_budget(tmp_path):
+    (tmp_path / "solution.py").write_text(REFERENCE)
+    settings = {"ladder": [100, 200, 400, 800, 100000], "analysis_budget": 3}
+    process = run_judge(tmp_path, QUADRATIC, TESTCASE, settings, ("--analyse",))
+    points = read_frame(process.stdout)["points"]
+
+    # the timings are real, only the shape of the points is certain
+    sizes = [p["n"] for p in points]
+    assert sizes and sizes == settings["ladder"][: len(sizes)]
+    assert 100000 not in sizes, "Past the budget"
+    assert all(p["time"] > 0 and p["reference_time"] > 0 for p in points)
+
+
+def test_analysis_stops_when_the_budget_is_spent():
+    runner = load_runner()
+    settings = dict(runner.DEFAULT_SETTINGS, ladder=[100, 200, 400, 800, 1600])
+    settings["analysis_budget"] = 4
+
+    # a fake clock: the submission takes n^2 / 10^6 s, the reference n / 10^5 s
+    clock = [0.0]
+
+    def measure_call(function, inputs, timeout, trace=False):
+        n = len(inputs[0])
+        seconds = n * n / 1e6 if function is solve else n / 1e5
+        if seconds > timeout:
+            clock[0] += timeout
+            raise TimeoutError("Timeout!")
+        clock[0] += seconds
+        return seconds, 64 * n
+
+    def solve(nums):
+        pass
+
+    runner.measure_call = measure_call
+    runner.time = types.SimpleNamespace(perf_counter=lambda: clock[0])
+    test_cases = runner.TestCases(
+        [], [{"generate": lambda rng, n=10: ([0] * n,), "seed": 1}], len
+    )
+
+    # the host measures the submission with the same clock
+    host = types.SimpleNamespace(
+        measure=lambda n, timeout: runner.measure_point(
+            solve, ([0] * n,), runner.time.perf_counter() + timeout
+        )
+    )
+    points = runner.run_analysis(host, test_cases, settings)
+
+    # the sizes up to 800 take 3.5 s of the 4 s, a call of 2.56 s at 1600 does not fit
+    assert [p["n"] for p in points] == [100, 200, 400, 800], "Past the budget"
+    result = estimate(points)
+    assert result["time"] == "O(n^2)"
+    assert result["reference_time"] == "O(n)"
+    assert result["space"] == "O(n)"
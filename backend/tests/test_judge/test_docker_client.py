@@ -0,0 +1,56 @@
+import pytest
+import requests
+
+from apis import docker_client
+from apis.docker_client import DockerClientManager
+
+
+class FakeClient:
+    def __init__(self, alive):
+        self.alive = alive
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise requests.exceptions.ConnectionError("daemon restarted")
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+def test_client_is_shared_and_reconnects(monkeypatch):
+    clients = []
+
+    def from_env(**kwargs):
+        # the first connection breaks, the next ones are fine
+        clients.append(FakeClient(alive=bool(clients)))
+        return clients[-1]
+
+    monkeypatch.setattr(docker_client.docker, "from_env", from_env)
+    manager = DockerClientManager(health_interval=0)
+
+    first = manager.client()
+    assert manager.client() is not first, "A client that lost the daemon is replaced"
+    assert first.closed, "The broken client is closed"
+
+    # the healthy one is kept
+    second = manager.client()
+    assert manager.client() is second
+    assert len(clients) == 2
+    assert manager.stats()["reconnects"] == 1
+
+
+def test_calls_are_timed():
+    manager = DockerClientManager()
+
+    with manager.call("create"):
+        pass
+    with pytest.raises(requests.exceptions.ConnectionError):
+        with manager.call("create"):
+            raise requests.exceptions.ConnectionError("broken pipe")
+
+    stats = manager.stats()["calls"]["create"]
+    assert stats["count"] == 2
+    assert stats["errors"] == 1
+    assert stats["max"] >= stats["mean"] >= 0
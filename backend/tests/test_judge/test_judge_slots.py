@@ -0,0 +1,78 @@
+from apis import judge_queue
+from apis.judge_queue import plan_slots
+from apis.docker_client import DockerClientManager
+
+
+class FakeDocker:
+    def info(self):
+        # 4 cores and 3 GB on the docker host
+        return {"NCPU": 4, "MemTotal": 3 * 1024 * 1024 * 1024}
+
+
+class FakeManager(DockerClientManager):
+    def client(self):
+        return FakeDocker()
+
+
+def test_slots_are_pinned_to_dedicated_cores(monkeypatch):
+    monkeypatch.setattr(judge_queue, "get_docker", lambda config: FakeManager())
+
+    config = {"JUDGE_WORKERS": 2, "JUDGE_RESERVED_CPUS": 1, "JUDGE_SLOT_MEMORY": "1g"}
+    slots = plan_slots(config)
+
+    assert [s.cpus for s in slots] == ["1", "2"], "Each slot should own one core"
+    assert all(s.mem_limit == "1g" for s in slots), "Each slot has its memory limit"
+
+
+def test_slots_do_not_oversubscribe(monkeypatch):
+    monkeypatch.setattr(judge_queue, "get_docker", lambda config: FakeManager())
+
+    # 3 cores left after the reserved one, and 3 GB for 1 GB slots
+    config = {"JUDGE_WORKERS": 8, "JUDGE_RESERVED_CPUS": 1, "JUDGE_SLOT_MEMORY": "1g"}
+    slots = plan_slots(config)
+    assert len(slots) == 3, "Should not run more sandboxes than dedicated cores"
+
+    # memory is the limit now
+    config["JUDGE_SLOT_MEMORY"] = "2g"
+    slots = plan_slots(config)
+    assert len(slots) == 1, "Should not run more sandboxes than the host memory"
+
+
+def test_slots_without_pinning():
+    config = {"JUDGE_WORKERS": 3, "JUDGE_PIN_CPUS": False}
+    slots = plan_slots(config)
+
+    assert len(slots) == 3, "Should keep the configured number of workers"
+    assert all(s.cpus is None for s in slots), "Slots should not be pinned"
+
+
+def test_slots_with_several_cores(monkeypatch):
+    monkeypatch.setattr(judge_queue, "get_docker", lambda config: FakeManager())
+
+    # 3 cores left, only one full slot of 2 cores
+    config = {"JUDGE_WORKERS": 4, "JUDGE_RESERVED_CPUS": 1, "JUDGE_SLOT_CPUS": 2}
+    slots = plan_slots(config)
+
+    assert [s.cpus for s in slots] == ["1,2"], "Each slot should own two cores"
+
+
+def test_sample_runs_go_ahead_of_the_submissions():
+    queue = judge_queue.JudgeQueue()
+    queue.put(1)
+    queue.put(2)
+    queue.put("sample run", judge_queue.URGENT)
+
+    items = [queue.queue.get()[-1] for _ in range(3)]
+    assert items == ["sample run", 1, 2], "Same priority in the order queued"
+
+
+def test_dropped_task_never_runs():
+    task = judge_queue.QueuedTask(lambda slot: slot.cpus)
+    assert task.cancel(), "Not started yet"
+    task(judge_queue.JudgeSlot("1"))
+    assert not task.finished.is_set()
+
+    task = judge_queue.QueuedTask(lambda slot: slot.cpus)
+    task(judge_queue.JudgeSlot("1"))
+    assert not task.cancel(), "Already run on a slot"
+    assert task.result == "1"
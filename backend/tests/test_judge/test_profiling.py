@@ -0,0 +1,79 @@
+import time
+
+from apis.sandbox import read_frame
+from tests.test_judge.test_case_report import run_judge
+
+TESTCASE = """
+from submission import solve
+
+user_submission = solve
+test_cases = [
+    {"input": (10,), "expected": 45},
+    {"input": ([0] * 300,), "expected": 44850},
+    {"input": (20,), "expected": 190},
+]
+"""
+
+SUBMISSION = """
+def solve(n):
+    n = n if isinstance(n, int) else len(n)
+    squares = [i * i for i in range(n * 1000)]
+    total = 0
+    for i in range(n):
+        for j in range(i):
+            total += 1
+    return total
+"""
+
+
+def test_profile_of_the_largest_case(tmp_path):
+    process = run_judge(tmp_path, SUBMISSION, TESTCASE, args=("--profile",))
+    profile = read_frame(process.stdout)["profile"]
+
+    assert profile["case"] == 2, "The case with the largest input"
+    assert profile["complete"] is True
+
+    # the inner loop runs n (n - 1) / 2 times
+    hot = {line["code"]: line for line in profile["lines"]}
+    assert hot["total += 1"]["hits"] == 44850
+    assert profile["lines"][0]["share"] > 0.2
+    assert all(0 <= line["share"] <= 1 for line in profile["lines"])
+
+    # the list of squares is the biggest allocation
+    assert profile["allocations"][0]["code"].startswith("squares = ")
+    assert profile["peak_memory"] >= profile["allocations"][0]["size"] > 300000 * 8
+
+
+def test_profile_budget_gives_a_partial_profile(tmp_path):
+    settings = {"profile_budget": 0.2}
+    slow = "def solve(n):\n    count = 0\n    while True:\n        count += 1\n"
+    process = run_judge(tmp_path, slow, TESTCASE, settings, ("--profile",))
+    profile = read_frame(process.stdout)["profile"]
+
+    assert profile["complete"] is False
+    assert profile["lines"][0]["code"] == "count += 1"
+
+
+def test_passed_submission_is_profiled(client, user_token):
+    with open("uploads/problems/p1/solution.py") as f:
+        code = f.read() + f"\n\nprofiled_at = {time.time()}\n"
+
+    response = client.post(
+        "/submission/1", json={"code": code}, headers={"Authorization": user_token}
+    )
+    submission_id = response.json["submission_id"]
+
+    # the profile runs in the background, after the verdict
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        response = client.get(
+            f"/submission/ranking/{submission_id}",
+            headers={"Authorization": user_token},
+        )
+        if response.status_code == 200 and response.json["profile"]:
+            break
+        time.sleep(0.1)
+
+    profile = response.json["profile"]
+    assert "error" not in profile, profile
+    assert profile["lines"], "The hot lines of findTwoSum"
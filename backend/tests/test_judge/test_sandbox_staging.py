@@ -0,0 +1,49 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from apis.sandbox_staging import staged_job, remove_stale_jobs
+
+
+def test_staged_jobs_do_not_collide(tmp_path):
+    def stage(i):
+        with staged_job({"submission.py": f"x = {i}"}, str(tmp_path)) as folder:
+            with open(os.path.join(folder, "submission.py")) as f:
+                return folder, f.read()
+
+    # many jobs in the same second must get their own folders
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        jobs = list(executor.map(stage, range(100)))
+
+    assert len({folder for folder, _ in jobs}) == 100, "Job folders should be unique"
+    assert all(code == f"x = {i}" for i, (_, code) in enumerate(jobs))
+    assert os.listdir(tmp_path) == [], "Job folders should be removed"
+
+
+def test_staged_job_is_removed_on_error(tmp_path):
+    try:
+        with staged_job({"run.py": ""}, str(tmp_path)) as folder:
+            raise RuntimeError("sandbox failed")
+    except RuntimeError:
+        pass
+
+    assert not os.path.exists(folder), "Job folder should be removed on error"
+
+
+def test_remove_stale_jobs(tmp_path):
+    stale = tmp_path / "judge-stale"
+    stale.mkdir()
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+
+    fresh = tmp_path / "judge-fresh"
+    fresh.mkdir()
+    other = tmp_path / "other"
+    other.mkdir()
+    os.utime(other, (old, old))
+
+    remove_stale_jobs(str(tmp_path), max_age=3600)
+
+    assert not stale.exists(), "Stale job folder should be removed"
+    assert fresh.exists(), "Running job folder should be kept"
+    assert other.exists(), "Other folders should be kept"
@@ -0,0 +1,92 @@
+def read_all(client, url, limit):
+    entries, cursor = [], None
+    while True:
+        query = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url + query)
+        assert response.status_code == 200, "Failed to get the leaderboard"
+
+        data = response.json
+        entries += data["entries"]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return entries
+
+
+def test_global_leaderboard_pages(client):
+    first = client.get("/leaderboard/").json
+    assert first["board"] == "global"
+
+    entries = first["entries"]
+    assert len(entries) > 0, "The sample users have solved problems"
+    order = [(-e["score"], e["user_id"]) for e in entries]
+    assert order == sorted(order), "In order of score, then user_id"
+
+    # the cursors go through every entry once, ties of score included
+    assert read_all(client, "/leaderboard/", 2) == entries
+
+
+def test_topic_difficulty_and_weekly_leaderboards(client):
+    for url in [
+        "/leaderboard/topic/array",
+        "/leaderboard/difficulty/easy",
+        "/leaderboard/weekly?week=2025-W03",
+    ]:
+        response = client.get(url)
+        assert response.status_code == 200, f"Failed to get {url}"
+        assert len(response.json["entries"]) > 0, f"No entry on {url}"
+
+    assert client.get("/leaderboard/weekly").status_code == 200
+    assert client.get("/leaderboard/topic/poetry").status_code == 400
+    assert client.get("/leaderboard/weekly?week=last").status_code == 400
+    assert client.get("/leaderboard/?cursor=top").status_code == 400
+
+
+def test_first_solve_scores_once(client):
+    from apis.leaderboard import POINTS, rebuild_scores
+    from apis.user_best import record_result
+    from config import db
+    from tables import (
+        LeaderboardScore,
+        Problem,
+        Submission,
+        SubmissionStatusEnum,
+        UserProblemBest,
+    )
+
+    with client.application.app_context():
+        # a problem the user has not solved yet
+        solved = {
+            best.problem_id
+            for best in UserProblemBest.query.filter(
+                UserProblemBest.user_id == 2,
+                UserProblemBest.first_solved_at.isnot(None),
+            )
+        }
+        problem = Problem.query.filter(Problem.problem_id.notin_(solved)).first()
+        before = db.session.get(LeaderboardScore, ("global", 2)).score
+
+        for _ in range(2):
+            submission = Submission(
+                user_id=2,
+                problem_id=problem.problem_id,
+                code="",
+                status=SubmissionStatusEnum.finished,
+                is_pass=True,
+                real_time=0.1,
+                ram=1.0,
+            )
+            db.session.add(submission)
+            db.session.flush()
+            record_result(submission)
+
+        db.session.expire_all()
+        after = db.session.get(LeaderboardScore, ("global", 2)).score
+        assert after == before + POINTS[problem.difficulty], "Scored once"
+
+        # the rebuild from the best results gives the same score
+        rebuild_scores([2])
+        db.session.expire_all()
+        assert db.session.get(LeaderboardScore, ("global", 2)).score == after
+
+        # nothing is stored
+        db.session.rollback()
@@ -49,3 +49,31 @@ def test_post_problem_missing_files(client, admin_token):
         response.json["message"]
         == "Missing files, please check all the required files and filenames"
     )
+
+
+# post a problem with an unknown execution policy, should return 400
+def test_post_problem_invalid_judge_settings(client, admin_token):
+    data = {
+        "title": "Sample Problem Title",
+        "difficulty": "easy",
+        "topic": "string",
+        "status": "draft",
+        "submission_template": (
+            BytesIO(b"Here is the submission_template.py"),
+            "submission_template.py",
+        ),
+        "solution": (BytesIO(b"Here is the solution.py"), "solution.py"),
+        "testcase": (BytesIO(b"Here is the testcase.py"), "testcase.py"),
+        "description": (BytesIO(b"# Problem description"), "description.md"),
+        "judge": (BytesIO(b'{"policy": "fastest"}'), "judge.json"),
+    }
+
+    response = client.post(
+        "/problem",
+        data=data,
+        content_type="multipart/form-data",
+        headers={"Authorization": admin_token},
+    )
+
+    assert response.status_code == 400
+    assert response.json["message"].startswith("Invalid judge.json")
@@ -57,3 +57,23 @@ def test_user_submission_summary(client, user_token):
     assert (
         "total_passed_7_days" in data
     ), "total_passed_7_days not found in the submission summary data"
+
+
+def test_user_solved_problems(client, user_token):
+    response = client.get("/profile/solved", headers={"Authorization": user_token})
+    assert response.status_code == 200, "Failed to get the solved problems"
+
+    solved = response.json
+    assert isinstance(solved, list), "Solved problems is not a list"
+    assert solved == sorted(set(solved)), "Each problem id once, in order"
+
+    response = client.get(
+        "/profile/submission/summary", headers={"Authorization": user_token}
+    )
+    summary = response.json
+    assert summary["total_solved"] == len(solved)
+
+    # the counts of the last 7 days are part of the totals
+    assert summary["total_submission_7_days"] <= summary["total_submission"]
+    assert summary["total_passed_7_days"] <= summary["total_passed"]
+    assert summary["total_solved"] <= summary["total_passed"]
@@ -1,3 +1,7 @@
+import json
+import time
+
+
 def test_post_submission_no_function_signature(client, user_token):
     problem_id = 1
     code = "nothing"
@@ -52,3 +56,378 @@ def test_post_submission_syntax_error_2(client, user_token):
     assert response.status_code == 400, "Should return 400 for invalid submission"
     message = response.json["message"]
     assert message.startswith("Syntax Error"), "Should return Syntax Error message"
+
+
+def test_post_submission_is_queued(client, user_token):
+    problem_id = 1
+    # new code on every run, the judge cache would answer a code judged before,
+    # a comment is not enough: the cache ignores comments and formatting
+    code = f"RUN = {time.time()}\n\ndef findTwoSum(nums, target):\n    return [0, 1]"
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+
+    # the submission is judged in the background
+    assert response.status_code == 202, "Should return 202 for a queued submission"
+    submission = response.json
+    assert submission["status"] == "pending", "New submission should be pending"
+    assert "submission_id" in submission, "submission_id not found in the response"
+
+    # the submission can be polled
+    response = client.get(
+        f"/submission/{submission['submission_id']}",
+        headers={"Authorization": user_token},
+    )
+    assert response.status_code == 200, "Failed to poll the submission"
+    assert response.json["submission"]["status"] in [
+        "pending",
+        "running",
+        "finished",
+        "error",
+    ]
+    assert "queue_position" in response.json, "queue_position not found"
+
+
+def test_post_submission_cache_hit(client, user_token):
+    problem_id = 1
+    code = "def findTwoSum(nums, target):\n    return [0, 2]"
+
+    # the same code was judged before, with other comments and formatting
+    with client.application.app_context():
+        from apis.judge_cache import cache_key, store_result
+        from tables import Problem, Submission
+
+        key = cache_key(Problem.query.get(problem_id), "# v1\n" + code + "  \n")
+        store_result(
+            key,
+            Submission(
+                problem_id=problem_id,
+                results=["Case 1: Passed"],
+                is_pass=True,
+                real_time=0.01,
+                ram=1.5,
+            ),
+        )
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+
+    assert response.status_code == 201, "Should be judged from the cache"
+    assert response.json["status"] == "finished"
+    assert response.json["results"] == ["Case 1: Passed"]
+    assert response.json["is_pass"] is True
+
+
+def test_timed_out_result_is_not_cached(client):
+    code = f"RUN = {time.time()}\n\ndef findTwoSum(nums, target):\n    return [0, 1]"
+
+    with client.application.app_context():
+        from apis.judge_cache import cache_key, store_result
+        from tables import JudgeCache, Problem, Submission
+
+        key = cache_key(Problem.query.get(1), code)
+        store_result(
+            key,
+            Submission(
+                problem_id=1,
+                results=["Case 1: Passed", "Case 2: Timeout"],
+                case_results=[{"status": "passed"}, {"status": "timeout"}],
+                is_pass=False,
+            ),
+        )
+        testcase_key, code_key = key
+        entry = JudgeCache.query.filter_by(
+            testcase_hash=testcase_key, code_hash=code_key
+        ).first()
+        assert entry is None, "A timeout may pass on a less loaded host"
+
+
+def test_passed_cache_hit_is_measured_again(client, user_token):
+    problem_id = 1
+    with open("uploads/problems/p1/solution.py") as f:
+        code = f.read() + f"\n\nmeasured_at = {time.time()}\n"
+
+    # judged before, on a slow host
+    with client.application.app_context():
+        from apis.judge_cache import cache_key, store_result
+        from tables import Problem, Submission
+
+        store_result(
+            cache_key(Problem.query.get(problem_id), code),
+            Submission(
+                problem_id=problem_id,
+                results=["Case 1: Passed"],
+                is_pass=True,
+                real_time=100.0,
+                ram=100.0,
+            ),
+        )
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+    assert response.status_code == 201, "Should be judged from the cache"
+    assert response.json["is_pass"] is True
+    # the numbers of the other run are not ranked
+    assert response.json["metrics_version"] is None
+    submission_id = response.json["submission_id"]
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        response = client.get(
+            f"/submission/{submission_id}", headers={"Authorization": user_token}
+        )
+        submission = response.json["submission"]
+        if submission["metrics_version"] is not None:
+            break
+        time.sleep(0.1)
+
+    assert submission["metrics_version"] is not None, "Should be measured again"
+    assert submission["real_time"] < 100.0
+    assert submission["results"] == ["Case 1: Passed"], "The verdict is kept"
+
+
+def test_post_submission_is_judged(client, user_token):
+    problem_id = 1
+    with open("uploads/problems/p1/solution.py") as f:
+        # a new statement every run keeps it out of the judge cache
+        code = f.read() + f"\n\njudged_at = {time.time()}\n"
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+    assert response.status_code == 202, "Should be queued"
+    submission_id = response.json["submission_id"]
+
+    # the test config judges with the local executor, no docker needed
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        response = client.get(
+            f"/submission/{submission_id}", headers={"Authorization": user_token}
+        )
+        submission = response.json["submission"]
+        if submission["status"] not in ["pending", "running"]:
+            break
+        time.sleep(0.1)
+
+    assert submission["status"] == "finished", submission["results"]
+    assert submission["is_pass"] is True
+    assert len(submission["case_results"]) == len(submission["results"])
+    assert submission["real_time"] is not None
+
+
+def wait_for(client, token, submission_id, statuses, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = client.get(
+            f"/submission/{submission_id}", headers={"Authorization": token}
+        )
+        submission = response.json["submission"]
+        if submission["status"] in statuses:
+            break
+        time.sleep(0.05)
+    return submission
+
+
+def test_submission_stream(client, user_token):
+    problem_id = 1
+    with open("uploads/problems/p1/solution.py") as f:
+        code = f.read() + f"\n\nstreamed_at = {time.time()}\n"
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+    submission_id = response.json["submission_id"]
+
+    # EventSource can not set headers, the token goes in the query
+    response = client.get(f"/submission/{submission_id}/stream?token={user_token}")
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    events = [
+        (lines[0][len("event: ") :], json.loads(lines[1][len("data: ") :]))
+        for lines in (
+            block.split("\n")
+            for block in response.get_data(as_text=True).split("\n\n")
+            if block.startswith("event: ")
+        )
+    ]
+    response.close()
+    cases = [data for event, data in events if event == "case"]
+    assert sorted(case["case"] for case in cases) == list(range(1, 11))
+    assert events[-1][0] == "done"
+    assert events[-1][1]["status"] == "finished"
+
+    response = client.get(f"/submission/{submission_id}/stream")
+    assert response.status_code == 401, "The stream needs a token"
+
+
+def test_streams_are_capped(client, user_token):
+    from apis.submission import held_slots
+
+    # every stream slot taken, e.g. by other open tabs
+    with client.application.app_context():
+        slots = held_slots("streams", "STREAM_WORKERS")
+    taken = 0
+    while slots.acquire(blocking=False):
+        taken += 1
+
+    try:
+        response = client.get(f"/submission/1/stream?token={user_token}")
+        assert response.status_code == 503, "A stream past the cap holds no thread"
+    finally:
+        for _ in range(taken):
+            slots.release()
+
+    # a closed stream gives its slot back
+    response = client.get(f"/submission/1/stream?token={user_token}")
+    assert response.status_code == 200
+    response.get_data()
+    response.close()
+    free = 0
+    while slots.acquire(blocking=False):
+        free += 1
+    for _ in range(free):
+        slots.release()
+    assert free == taken
+
+
+def test_cancel_running_submission(client, user_token):
+    problem_id = 1
+    # ten slow cases, about ten seconds when it is not cancelled
+    code = (
+        "import time\n\n"
+        "def findTwoSum(nums, target):\n"
+        f"    time.sleep(1)  # {time.time()}\n"
+        "    return [0, 1]\n"
+        f"\ncancelled_at = {time.time()}\n"
+    )
+
+    response = client.post(
+        f"/submission/{problem_id}",
+        json={"code": code},
+        headers={"Authorization": user_token},
+    )
+    submission_id = response.json["submission_id"]
+    wait_for(client, user_token, submission_id, ["running"])
+
+    start = time.time()
+    response = client.post(
+        f"/submission/{submission_id}/cancel", headers={"Authorization": user_token}
+    )
+    assert response.status_code in [200, 202]
+
+    submission = wait_for(client, user_token, submission_id, ["cancelled"])
+    assert submission["status"] == "cancelled"
+    assert submission["results"] == ["Cancelled"]
+    assert time.time() - start < 5, "The sandbox should be killed at once"
+
+    response = client.post(
+        f"/submission/{submission_id}/cancel", headers={"Authorization": user_token}
+    )
+    assert response.status_code == 400, "A cancelled submission is done"
+
+
+def test_cancel_without_a_stream(client, user_token):
+    from apis.judge_stream import get_stream
+    from config import db
+    from tables import Submission, SubmissionStatusEnum
+
+    # running in a re-judge batch, no worker opened a stream for it
+    with client.application.app_context():
+        submission = Submission(
+            problem_id=1,
+            user_id=2,
+            code="def findTwoSum(nums, target):\n    return [0, 1]",
+            results=[],
+            status=SubmissionStatusEnum.running,
+        )
+        db.session.add(submission)
+        db.session.commit()
+        submission_id = submission.submission_id
+
+    response = client.post(
+        f"/submission/{submission_id}/cancel", headers={"Authorization": user_token}
+    )
+    assert response.status_code == 409
+    assert get_stream(submission_id) is None, "No stream is left behind"
+
+    with client.application.app_context():
+        db.session.delete(db.session.get(Submission, submission_id))
+        db.session.commit()
+
+
+def test_run_samples_stores_nothing(client, user_token):
+    problem_id = 1
+    with open("uploads/problems/p1/solution.py") as f:
+        code = f.read()
+
+    with client.application.app_context():
+        from tables import Submission
+
+        count = Submission.query.count()
+
+    response = client.post(
+        f"/submission/run/{problem_id}",
+        json={"code": code, "inputs": [[[1, 5, 9], 14]]},
+        headers={"Authorization": user_token},
+    )
+
+    assert response.status_code == 200, response.json
+    assert [c["status"] for c in response.json["cases"]] == ["passed"] * 3
+    assert response.json["custom"][0]["status"] == "passed"
+    assert response.json["custom"][0]["got"] == "[1, 2]"
+
+    with client.application.app_context():
+        assert Submission.query.count() == count, "A sample run is not stored"
+
+    response = client.post(
+        f"/submission/run/{problem_id}",
+        json={"code": code, "inputs": [[1]]},
+        headers={"Authorization": user_token},
+    )
+    assert response.status_code == 400, "findTwoSum takes two arguments"
+
+
+def test_worker_failure_marks_the_submission_error(client, monkeypatch):
+    import apis.judge_queue
+    from config import db
+    from tables import Submission, SubmissionStatusEnum
+
+    app = client.application
+    with app.app_context():
+        submission = Submission(
+            problem_id=1,
+            user_id=2,
+            code="def findTwoSum(nums, target):\n    return [0, 1]",
+            results=[],
+        )
+        db.session.add(submission)
+        db.session.commit()
+        submission_id = submission.submission_id
+
+    def fail(submission, is_success, report):
+        raise RuntimeError("database is locked")
+
+    # the verdict can not be stored
+    monkeypatch.setattr(apis.judge_queue, "sandbox_eval", lambda *args: (False, "x"))
+    monkeypatch.setattr(apis.judge_queue, "apply_report", fail)
+    app.extensions["judge_queue"].run_item(submission_id, None)
+
+    with app.app_context():
+        submission = db.session.get(Submission, submission_id)
+        assert submission.status == SubmissionStatusEnum.error, "Left running"
+        assert submission.results == ["Error The judge failed"]
+        assert submission.is_pass is False
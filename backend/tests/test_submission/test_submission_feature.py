@@ -40,6 +40,17 @@ def test_get_one_user_submission(client, user_token):
     assert "real_time" in submission, "real_time not found in the submission item"
     assert "ram" in submission, "ram not found in the submission item"
     assert "created_at" in submission, "created_at not found in the submission item"
+    assert "case_results" in submission, "case_results not found in the submission item"
+
+    # the listings keep the verdict, the time and the memory, not the large reports
+    for item in data["previous"] + [
+        entry["submission"]
+        for entry in client.get(
+            "/submission/all", headers={"Authorization": user_token}
+        ).json
+    ]:
+        assert "real_time" in item and "ram" in item and "is_pass" in item
+        assert not {"case_results", "profile", "complexity"} & item.keys()
 
 
 def test_get_non_existing_user_submission(client, user_token):
@@ -60,7 +71,7 @@ def test_submission_ranking(client, user_token):
     data = response.json
     assert isinstance(data, dict), "Response is not a dictionary"
 
-    # ram_percentile, time_percentile, total_passed_submissions
+    # ram_percentile, time_percentile, total_passed_submissions, total_solved_users
     # totl_submissions, total_participants
     assert "ram_percentile" in data, "ram_percentile not found in the response"
     assert "time_percentile" in data, "time_percentile not found in the response"
@@ -69,3 +80,135 @@ def test_submission_ranking(client, user_token):
     ), "total_passed_submissions not found in the response"
     assert "total_submissions" in data, "total_submissions not found in the response"
     assert "total_participants" in data, "total_participants not found in the response"
+    assert "profile" in data, "profile not found in the response"
+
+
+def test_submission_ranking_counts_each_user_once(client, admin_token):
+    from apis.ranking import solved_query
+    from apis.user_best import rebuild, record_result
+    from config import db
+    from tables import METRICS_VERSION, Submission, SubmissionStatusEnum
+    from tables import UserProblemBest
+
+    # the sample submissions were measured with the older judge, they are not ranked
+    response = client.get(
+        "/submission/ranking/1", headers={"Authorization": admin_token}
+    )
+    legacy = response.json
+    assert legacy["ram_percentile"] is None and legacy["time_percentile"] is None
+
+    # the ram of the resubmitted solutions of three users in the current units
+    rams = [(2, 5.0), (2, 4.0), (3, 3.0), (4, 6.0)]
+    with client.application.app_context():
+        passed = Submission.query.filter_by(problem_id=1, is_pass=True).count()
+        submissions = [
+            Submission(
+                user_id=user_id,
+                problem_id=1,
+                code="",
+                status=SubmissionStatusEnum.finished,
+                is_pass=True,
+                real_time=ram / 10,
+                ram=ram,
+                metrics_version=METRICS_VERSION,
+            )
+            for user_id, ram in rams
+        ]
+        db.session.add_all(submissions)
+        db.session.flush()
+        for submission in submissions:
+            record_result(submission)
+        db.session.commit()
+        ids = [submission.submission_id for submission in submissions]
+
+        # the count reads the index of the best results, not the submissions
+        query = solved_query(1).filter(UserProblemBest.best_ram < 4.0)
+        plan = db.session.execute(
+            db.text(f"EXPLAIN QUERY PLAN {query.statement}"),
+            query.statement.compile().params,
+        ).fetchall()
+
+    try:
+        response = client.get(
+            f"/submission/ranking/{ids[1]}", headers={"Authorization": admin_token}
+        )
+        data = response.json
+    finally:
+        with client.application.app_context():
+            Submission.query.filter(Submission.submission_id.in_(ids)).delete()
+            rebuild(1, [2, 3, 4])
+            db.session.commit()
+
+    # user 3 is better, users 2 and 4 count once each
+    assert data["ram_percentile"] == round(100 * (1 - 1 / 3), 2)
+    assert data["time_percentile"] == data["ram_percentile"]
+    assert data["total_passed_submissions"] == passed + len(rams)
+    assert data["total_solved_users"] == legacy["total_solved_users"]
+    assert "ix_user_problem_best_ram" in plan[0][-1]
+
+
+def test_best_result_is_updated_with_the_verdict(client):
+    from apis.user_best import rebuild, record_result
+    from config import db
+    from tables import METRICS_VERSION, Submission, SubmissionStatusEnum
+    from tables import UserProblemBest
+
+    with client.application.app_context():
+        before = db.session.get(UserProblemBest, (2, 1))
+        attempts, passes = before.attempts, before.passes
+        # the earlier tests may have judged a submission in the current units
+        # (a call that needed no memory of its own is measured 0)
+        best_time = min(x for x in [before.best_time, 0.05] if x is not None)
+        best_ram = min(x for x in [before.best_ram, 0.5] if x is not None)
+
+        measured = Submission(
+            user_id=2,
+            problem_id=1,
+            code="",
+            status=SubmissionStatusEnum.finished,
+            is_pass=True,
+            real_time=0.05,
+            ram=0.5,
+            metrics_version=METRICS_VERSION,
+        )
+        # measured with the older judge, its smaller values are of other units
+        legacy = Submission(
+            user_id=2,
+            problem_id=1,
+            code="",
+            status=SubmissionStatusEnum.finished,
+            is_pass=True,
+            real_time=0.001,
+            ram=0.1,
+        )
+        failed = Submission(
+            user_id=2,
+            problem_id=1,
+            code="",
+            status=SubmissionStatusEnum.finished,
+            is_pass=False,
+        )
+        db.session.add_all([measured, legacy, failed])
+        db.session.flush()
+        for submission in [measured, legacy, failed]:
+            record_result(submission)
+
+        db.session.expire_all()
+        after = db.session.get(UserProblemBest, (2, 1))
+        assert after.attempts == attempts + 3
+        assert after.passes == passes + 2
+        assert (after.best_time, after.best_ram) == (best_time, best_ram)
+        assert after.first_solved_at == before.first_solved_at, "Solved before"
+
+        # the rebuild from the submissions gives the same row
+        rebuild(1, [2])
+        db.session.expire_all()
+        rebuilt = db.session.get(UserProblemBest, (2, 1))
+        assert (rebuilt.attempts, rebuilt.passes, rebuilt.best_ram) == (
+            attempts + 3,
+            passes + 2,
+            best_ram,
+        )
+
+        # nothing is stored
+        db.session.rollback()
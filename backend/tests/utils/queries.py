@@ -0,0 +1,25 @@
+from sqlalchemy import event
+
+from config import db
+
+
+def capture_queries(client, url, token=None):
+    """GET url, return the engine and the (statement, parameters) of its SELECTs"""
+
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        headers = {"Authorization": token} if token else {}
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+
+    assert response.status_code == 200, f"Failed to get {url}"
+    return engine, statements
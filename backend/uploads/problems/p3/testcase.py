@@ -20,3 +20,16 @@ test_cases = [
     },
     {"input": ([1, 2, 3, 4, 5, 6], 6, [], 0), "expected": [1, 2, 3, 4, 5, 6]},
 ]
+
+
+# Large inputs, generated in the sandbox, so an O((m + n)^2) merge runs out of time.
+# The expected outputs come from solution.py, and the complexity analysis grows n
+def large_arrays(rng, n=100000):
+    m = n
+    values = range(-(10**9), 10**9 + 1)
+    nums1 = sorted(rng.choices(values, k=m)) + [0] * n
+    nums2 = sorted(rng.choices(values, k=n))
+    return nums1, m, nums2, n
+
+
+generators = [{"generate": large_arrays, "seed": seed} for seed in [1, 2]]
@@ -18,6 +18,15 @@ export default function SubmissionRanking({ ranking }) {
   } = ranking;
 
   const renderProgressWithAnimatedStar = (percentile) => {
+    // judged before the current measurements, re-judging ranks it again
+    if (percentile === null || percentile === undefined) {
+      return (
+        <div className="mt-2 text-muted" style={{ fontSize: "0.85rem" }}>
+          Not ranked, measured with an older judge
+        </div>
+      );
+    }
+
     return (
       <div style={{ position: "relative", marginTop: "12px" }}>
         {/* Star Icon */}
@@ -25,6 +25,8 @@ export default function ChallengeSubmissionPage() {
   const [rankingData, setRankingData] = useState(null);
 
   useEffect(() => {
+    let timer = null;
+
     const fetchSubmission = async () => {
       try {
         const url = `${BACKEND}/submission/${submissionId}`;
@@ -33,6 +35,12 @@ export default function ChallengeSubmissionPage() {
         const response = await axios.get(url, config);
         setSubmissionData(response.data);
         setIsPass(response.data.submission.is_pass);
+
+        // the submission is judged in the background, poll until it is done
+        const { status } = response.data.submission;
+        if (status === "pending" || status === "running") {
+          timer = setTimeout(fetchSubmission, 1000);
+        }
       } catch (error) {
         console.error("Error fetching submission:", error);
         navigate("/404");
@@ -42,6 +50,7 @@ export default function ChallengeSubmissionPage() {
     };
 
     fetchSubmission();
+    return () => clearTimeout(timer);
   }, [submissionId]); // eslint-disable-line react-hooks/exhaustive-deps
 
   // when the submission is successful, fetch the ranking data
@@ -71,7 +80,8 @@ export default function ChallengeSubmissionPage() {
     );
   }
 
-  const { submission, problem, previous } = submissionData;
+  const { submission, problem, previous, queue_position } = submissionData;
+  const isJudging = submission.status === "pending" || submission.status === "running";
   const { problem_id, title } = problem;
 
   return (
@@ -88,7 +98,14 @@ export default function ChallengeSubmissionPage() {
         <Col md={6}>
           <h5>{`Test Results: ${isPass ? "✅" : "❌"}`}</h5>
           <div className="border rounded p-3 bg-light">
-            {submission.results && submission.results.length > 0 ? (
+            {isJudging ? (
+              <p className="text-muted mb-0">
+                <Spinner animation="border" size="sm" className="me-2" />
+                {submission.status === "pending" && queue_position > 0
+                  ? `Waiting in the queue, ${queue_position} submission(s) ahead...`
+                  : "Judging..."}
+              </p>
+            ) : submission.results && submission.results.length > 0 ? (
               <ul className="mb-0">
                 {submission.results.map((line, index) => (
                   <li key={index} className={line.includes("Passed") ? "text-success" : "text-danger"}>